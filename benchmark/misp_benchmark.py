@@ -0,0 +1,678 @@
+"""
+Benchmark for the OpenDXL MISP service.
+
+The service runs in this process, as it would under ``python -m
+dxlmispservice``, except that:
+
+* Calls to the MISP API are answered by a stand-in (using ``requests_mock``,
+  as in ``tests/test_samples.py``) which returns generated MISP events.
+* MISP ZeroMQ notifications are sent from a local ``zmq.PUB`` socket.
+* The DXL client is replaced by one which delivers requests to the service's
+  request callbacks from a pool of ``threadCount`` threads (as the incoming
+  message pool of the DXL client does) and records the responses and events
+  which the service sends, so that no DXL broker is needed.
+
+The benchmark therefore measures the overhead of the service itself (PyMISP,
+JSON encoding and decoding, caching, and so on), not that of the DXL fabric or
+of a real MISP server. The results are written as JSON for comparison
+between runs.
+
+Example::
+
+    python benchmark/misp_benchmark.py --attribute-counts 10,1000 \\
+        --thread-counts 1,10 --output results.json
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from configparser import ConfigParser
+except ImportError:
+    from ConfigParser import ConfigParser  # pylint: disable=import-error
+
+import requests_mock
+import zmq
+from dxlclient.message import ErrorResponse, Request
+
+# Allow the benchmark to be run from a checkout of the repository.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir)))
+
+# pylint: disable=wrong-import-position
+import dxlmispservice
+from dxlmispservice._compression import COMPRESSION_FIELD, decompress
+from dxlmispservice._serialization import BACKEND as JSON_BACKEND
+
+# Use a monotonic clock for measuring durations where available (Python 3.3+).
+_now = getattr(time, "monotonic", time.time)
+
+_HOST = "127.0.0.1"
+_API_PORT = "443"
+_API_KEY = "benchmarkkey"
+
+#: The ZeroMQ topic on which notifications are published.
+_NOTIFICATION_TOPIC = "misp_json"
+
+#: Functions which build the parameters of the `index`-th request for each
+#: supported API name.
+_REQUEST_ARGS = {
+    "search": lambda index: {"eventinfo": "Benchmark {}".format(index)},
+    "get_event": lambda index: {"event_id": index + 1},
+}
+
+#: The MISP describeTypes result returned by the stand-in.
+_DESCRIBE_TYPES = {
+    "result": {
+        "categories": ["Network activity", "Other"],
+        "sane_defaults": {
+            "ip-dst": {"default_category": "Network activity", "to_ids": 1},
+            "comment": {"default_category": "Other", "to_ids": 0}},
+        "types": ["ip-dst", "comment"],
+        "category_type_mappings": {
+            "Network activity": ["ip-dst"],
+            "Other": ["comment"]}}}
+
+# Configure local logger
+logger = logging.getLogger(__name__)
+
+
+def make_event(event_id, attribute_count):
+    """
+    Generate a MISP event.
+
+    :param int event_id: The id of the event.
+    :param int attribute_count: The number of attributes in the event.
+    :return: The event, as it would be returned by the MISP API.
+    :rtype: dict
+    """
+    return {"Event": {
+        "id": str(event_id),
+        "orgc_id": "1",
+        "org_id": "1",
+        "info": "Benchmark event {}".format(event_id),
+        "threat_level_id": "2",
+        "distribution": "1",
+        "analysis": "1",
+        "published": False,
+        "timestamp": "1523287869",
+        "uuid": "5acb873d-a914-4f9f-92b9-{:012d}".format(event_id),
+        "Tag": [{"id": "1", "name": "tlp:green"}],
+        "Attribute": [{
+            "id": str(index + 1),
+            "event_id": str(event_id),
+            "type": "ip-dst",
+            "category": "Network activity",
+            "value": "10.{}.{}.{}".format(index >> 16 & 255,
+                                          index >> 8 & 255, index & 255),
+            "to_ids": True,
+            "distribution": "5",
+            "comment": "",
+            "timestamp": "1523287869",
+            "uuid": "5acb873d-0000-4f9f-92b9-{:012d}".format(index)}
+                      for index in range(attribute_count)]}}
+
+
+def percentile(sorted_values, fraction):
+    """
+    :param list sorted_values: Values, in ascending order.
+    :param float fraction: The percentile, as a fraction (for example,
+        `0.99`).
+    :return: The value at the percentile, using the nearest-rank method.
+    """
+    if not sorted_values:
+        return None
+    rank = max(int(-(-fraction * len(sorted_values) // 1)), 1)
+    return sorted_values[rank - 1]
+
+
+class MispStandIn(object):
+    """
+    Answers the calls made by PyMISP to the MISP API with generated events.
+
+    Constructor parameters:
+
+    :param float latency: Number of seconds to wait before answering each
+        call, to simulate the processing time of a MISP server.
+    """
+    def __init__(self, latency=0):
+        self._latency = latency
+        self._event_body = None
+        self._search_body = None
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def set_attribute_count(self, attribute_count):
+        """
+        Set the number of attributes in each returned event.
+        """
+        event = make_event(1, attribute_count)
+        self._event_body = json.dumps(event)
+        self._search_body = json.dumps({"response": [event]})
+
+    def install(self, req_mock):
+        """
+        Register the stand-in with a `requests_mock` mocker.
+        """
+        base_url = "https://{}:{}/".format(_HOST, _API_PORT)
+        # Mocks registered later take precedence, so register the catch-all
+        # first.
+        req_mock.register_uri(requests_mock.ANY,
+                              re.compile(re.escape(base_url) + ".*"),
+                              text=self._respond)
+        req_mock.get(base_url + "servers/getPyMISPVersion.json",
+                     text='{"version": "2.4.111"}')
+        req_mock.get(base_url + "attributes/describeTypes.json",
+                     text=json.dumps(_DESCRIBE_TYPES))
+
+    def _respond(self, request, context):
+        del context
+        with self._lock:
+            self.calls += 1
+        if self._latency:
+            time.sleep(self._latency)
+        if "restSearch" in request.path:
+            return self._search_body
+        return self._event_body
+
+
+class BenchmarkDxlClient(object):
+    """
+    Stand-in for the DXL client of the service, which records the responses
+    and events sent by the service.
+    """
+    def __init__(self):
+        self.services = []
+        self._lock = threading.Lock()
+        self._waiters = {}
+        self._events = []
+        self._events_condition = threading.Condition()
+
+    def register_service_sync(self, service, timeout):
+        del timeout
+        self.services.append(service)
+
+    def unregister_service_sync(self, service, timeout):
+        del timeout
+        self.services.remove(service)
+
+    def destroy(self):
+        pass
+
+    def request_callbacks(self):
+        """
+        :return: The request callbacks of the registered services, keyed by
+            DXL topic.
+        :rtype: dict
+        """
+        callbacks = {}
+        for service in self.services:
+            # pylint: disable=protected-access
+            for topic, topic_callbacks in \
+                    service._callbacks_by_topic.items():
+                callbacks[topic] = next(iter(topic_callbacks))
+        return callbacks
+
+    def expect_response(self, request):
+        """
+        Prepare to wait for the response to a request.
+
+        :return: An object with a `wait(timeout)` method which returns the
+            response, or `None` if the response was not sent in time.
+        """
+        waiter = _ResponseWaiter()
+        with self._lock:
+            self._waiters[request.message_id] = waiter
+        return waiter
+
+    def send_response(self, response):
+        with self._lock:
+            waiter = self._waiters.pop(response.request_message_id, None)
+        if waiter is not None:
+            waiter.set(response)
+
+    def send_event(self, event):
+        with self._events_condition:
+            self._events.append((_now(), event))
+            self._events_condition.notify_all()
+
+    def take_events(self):
+        """
+        :return: The events sent since the last call, as tuples of the time
+            at which each was sent and the event.
+        :rtype: list
+        """
+        with self._events_condition:
+            events, self._events = self._events, []
+        return events
+
+    def wait_for_events(self, timeout):
+        """
+        Wait until an event is sent or a timeout elapses.
+
+        :return: Whether or not any events are waiting to be taken.
+        :rtype: bool
+        """
+        with self._events_condition:
+            if not self._events:
+                self._events_condition.wait(timeout)
+            return bool(self._events)
+
+
+class _ResponseWaiter(object):
+    def __init__(self):
+        self._event = threading.Event()
+        self.response = None
+
+    def set(self, response):
+        self.response = response
+        self._event.set()
+
+    def wait(self, timeout):
+        self._event.wait(timeout)
+        return self.response
+
+
+class ServiceUnderTest(object):
+    """
+    The MISP service, running in this process against the stand-ins.
+
+    Constructor parameters:
+
+    :param str base_config: Path to an application configuration file whose
+        settings to use, or `None` to use the default settings. The
+        connection settings and API names are always overridden.
+    :param list api_names: The names of the MISP APIs to expose.
+    :param int zeromq_port: The port of the ZeroMQ publisher.
+    """
+    def __init__(self, base_config, api_names, zeromq_port):
+        self._config_dir = tempfile.mkdtemp(prefix="mispbenchmark")
+        config = ConfigParser()
+        config.optionxform = str
+        if base_config:
+            config.read(base_config)
+        if not config.has_section("General"):
+            config.add_section("General")
+        for setting, value in (("host", _HOST), ("apiPort", _API_PORT),
+                               ("apiKey", _API_KEY),
+                               ("apiNames", ",".join(api_names)),
+                               ("zeroMqPort", str(zeromq_port)),
+                               ("zeroMqNotificationTopics",
+                                _NOTIFICATION_TOPIC)):
+            config.set("General", setting, value)
+        config_path = os.path.join(self._config_dir,
+                                   "dxlmispservice.config")
+        with open(config_path, "w") as config_file:
+            config.write(config_file)
+        # The DXL client configuration is required to exist but is not read.
+        open(os.path.join(self._config_dir, "dxlclient.config"), "w").close()
+
+        self.client = BenchmarkDxlClient()
+        self.app = dxlmispservice.MispService(self._config_dir)
+        # pylint: disable=protected-access
+        # This also invokes on_load_configuration.
+        self.app._load_configuration()
+        self.app._dxl_client = self.client
+        self.app._running = True
+        self.app.on_register_services()
+        self.callbacks = self.client.request_callbacks()
+
+    def topic_for(self, api_name):
+        """
+        :return: The DXL topic of the request callback for an API name.
+        :rtype: str
+        """
+        for topic in self.callbacks:
+            if topic.rsplit("/", 1)[-1] == api_name:
+                return topic
+        raise ValueError("No request callback for API: {}".format(api_name))
+
+    def close(self):
+        """
+        Shut down the service.
+        """
+        self.app.destroy()
+        shutil.rmtree(self._config_dir, ignore_errors=True)
+
+
+def run_request_scenario(service, api_name, thread_count, request_count,
+                         timeout):
+    """
+    Send requests for an API to the service from `thread_count` threads.
+
+    :return: The results of the scenario.
+    :rtype: dict
+    """
+    topic = service.topic_for(api_name)
+    callback = service.callbacks[topic]
+    args_fn = _REQUEST_ARGS[api_name]
+    lock = threading.Lock()
+    state = {"next": 0, "errors": 0, "timeouts": 0, "bytes": 0}
+    latencies = []
+
+    def send(index):
+        request = Request(topic)
+        request.payload = json.dumps(args_fn(index)).encode("utf-8")
+        waiter = service.client.expect_response(request)
+        start = _now()
+        callback.on_request(request)
+        response = waiter.wait(timeout)
+        return _now() - start, response
+
+    def worker():
+        while True:
+            with lock:
+                index = state["next"]
+                if index >= request_count:
+                    return
+                state["next"] += 1
+            latency, response = send(index)
+            with lock:
+                if response is None:
+                    state["timeouts"] += 1
+                    continue
+                if isinstance(response, ErrorResponse):
+                    state["errors"] += 1
+                latencies.append(latency)
+                state["bytes"] += len(response.payload or b"")
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(thread_count)]
+    start = _now()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = _now() - start
+    latencies.sort()
+    completed = len(latencies)
+    return {
+        "requests": request_count,
+        "completed": completed,
+        "errors": state["errors"],
+        "timeouts": state["timeouts"],
+        "response_bytes": state["bytes"] // completed if completed else 0,
+        "seconds": round(elapsed, 6),
+        "throughput": round(completed / elapsed, 3) if elapsed else None,
+        "latency_ms": dict(
+            (name, round(value * 1000, 3) if value is not None else None)
+            for name, value in (
+                ("mean", sum(latencies) / completed if completed else None),
+                ("p50", percentile(latencies, 0.5)),
+                ("p99", percentile(latencies, 0.99)),
+                ("max", latencies[-1] if latencies else None)))}
+
+
+def count_notifications(event):
+    """
+    :return: The number of notifications forwarded in an event, which may
+        be compressed and may hold a batch of notifications.
+    :rtype: int
+    """
+    payload = event.payload
+    codec = event.other_fields.get(COMPRESSION_FIELD)
+    if codec:
+        payload = decompress(payload, codec)
+    if isinstance(payload, memoryview):
+        payload = payload.tobytes()
+    return len(json.loads(payload.decode("utf-8"))) \
+        if payload.startswith(b"[") else 1
+
+
+def run_notification_scenario(service, publisher, payload, count, rate,
+                              idle_timeout):
+    """
+    Publish notifications and count those forwarded by the service.
+
+    :param bytes payload: The JSON payload of each notification.
+    :param int count: The number of notifications to publish.
+    :param float rate: The number of notifications to publish per second, or
+        `0` to publish as fast as possible.
+    :param float idle_timeout: Number of seconds after which to stop waiting
+        for forwarded notifications once none are forwarded.
+    :return: The results of the scenario.
+    :rtype: dict
+    """
+    message = _NOTIFICATION_TOPIC.encode("utf-8") + b" " + payload
+    service.client.take_events()
+    start = _now()
+    for index in range(count):
+        if rate:
+            delay = start + index / rate - _now()
+            if delay > 0:
+                time.sleep(delay)
+        publisher.send(message)
+    published = _now()
+    forwarded = 0
+    last = published
+    while forwarded < count and \
+            service.client.wait_for_events(idle_timeout):
+        for sent, event in service.client.take_events():
+            forwarded += count_notifications(event)
+            last = max(last, sent)
+    elapsed = last - start
+    dropped = max(count - forwarded, 0)
+    return {
+        "notifications": count,
+        "payload_bytes": len(payload),
+        "forwarded": forwarded,
+        "dropped": dropped,
+        "drop_rate": round(float(dropped) / count, 6) if count else 0,
+        "publish_seconds": round(published - start, 6),
+        "seconds": round(elapsed, 6),
+        "forwarding_rate": round(forwarded / elapsed, 3) if elapsed else None}
+
+
+def wait_for_subscription(service, publisher, timeout=10):
+    """
+    Publish probe notifications until the service forwards one, since a
+    ZeroMQ subscriber does not receive messages published before its
+    subscription reaches the publisher.
+    """
+    probe = _NOTIFICATION_TOPIC.encode("utf-8") + b" " + json.dumps(
+        make_event(0, 0)).encode("utf-8")
+    deadline = _now() + timeout
+    while _now() < deadline:
+        publisher.send(probe)
+        if service.client.wait_for_events(0.1):
+            # Let any remaining probes be forwarded before starting.
+            time.sleep(0.5)
+            service.client.take_events()
+            return
+    raise RuntimeError("Service did not receive ZeroMQ notifications")
+
+
+def environment():
+    """
+    :return: Details of the environment in which the benchmark ran.
+    :rtype: dict
+    """
+    versions = {"dxlmispservice": dxlmispservice.get_version()}
+    for name in ("dxlbootstrap", "dxlclient", "pymisp",
+                 "pyzmq", "requests"):
+        try:
+            import pkg_resources
+            versions[name] = pkg_resources.get_distribution(name).version
+        except Exception:  # pylint: disable=broad-except
+            versions[name] = None
+    return {"python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": _cpu_count(),
+            "json_backend": JSON_BACKEND,
+            "versions": versions}
+
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the OpenDXL MISP service against local "
+                    "stand-ins for MISP and the DXL fabric.")
+    parser.add_argument(
+        "--config", help="application configuration file whose settings "
+                         "(for example, [ResponseCache] or [RequestExecution])"
+                         " to benchmark")
+    parser.add_argument(
+        "--api-names", default="search,get_event",
+        help="comma-delimited MISP APIs to benchmark (supported: {}; "
+             "default: %(default)s)".format(", ".join(sorted(_REQUEST_ARGS))))
+    parser.add_argument(
+        "--attribute-counts", type=_int_list, default=[10, 1000],
+        help="comma-delimited numbers of attributes per MISP event, which "
+             "determine the payload sizes (default: 10,1000)")
+    parser.add_argument(
+        "--thread-counts", type=_int_list, default=[1, 10],
+        help="comma-delimited numbers of threads delivering requests to "
+             "the service, as the threadCount of the [IncomingMessagePool] "
+             "would (default: 1,10)")
+    parser.add_argument(
+        "--requests", type=int, default=200,
+        help="requests per API, attribute count, and thread count "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--warmup-requests", type=int, default=10,
+        help="requests per scenario which are not measured "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--misp-latency", type=float, default=0,
+        help="milliseconds the MISP stand-in waits before answering each "
+             "call (default: %(default)s)")
+    parser.add_argument(
+        "--notifications", type=int, default=2000,
+        help="notifications to publish per attribute count, or 0 to skip "
+             "the notification benchmark (default: %(default)s)")
+    parser.add_argument(
+        "--notification-rate", type=float, default=0,
+        help="notifications to publish per second, or 0 to publish as fast "
+             "as possible (default: %(default)s)")
+    parser.add_argument(
+        "--timeout", type=float, default=30,
+        help="seconds to wait for each response (default: %(default)s)")
+    parser.add_argument(
+        "--output", default="benchmark-results.json",
+        help="file to which to write the results as JSON "
+             "(default: %(default)s)")
+    args = parser.parse_args(argv)
+    args.api_names = [name.strip() for name in args.api_names.split(",")
+                      if name.strip()]
+    for api_name in args.api_names:
+        if api_name not in _REQUEST_ARGS:
+            parser.error("Unsupported API name: {}".format(api_name))
+    return args
+
+
+def run(args):
+    """
+    Run the benchmark.
+
+    :return: The results.
+    :rtype: dict
+    """
+    results = {"timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+               "environment": environment(),
+               "settings": dict((name, value)
+                                for name, value in vars(args).items()),
+               "requests": [],
+               "notifications": []}
+    misp = MispStandIn(args.misp_latency / 1000.0)
+    misp.set_attribute_count(1)
+    context = zmq.Context()
+    publisher = context.socket(zmq.PUB)  # pylint: disable=no-member
+    publisher.setsockopt(zmq.LINGER, 0)  # pylint: disable=no-member
+    # Queue every notification published in a burst, so that drops are
+    # those of the service rather than of the publisher.
+    publisher.setsockopt(zmq.SNDHWM, 0)  # pylint: disable=no-member
+    zeromq_port = publisher.bind_to_random_port("tcp://" + _HOST)
+    try:
+        with requests_mock.mock() as req_mock:
+            misp.install(req_mock)
+            service = ServiceUnderTest(args.config, args.api_names,
+                                       zeromq_port)
+            try:
+                for attribute_count in args.attribute_counts:
+                    misp.set_attribute_count(attribute_count)
+                    for api_name in args.api_names:
+                        for thread_count in args.thread_counts:
+                            if args.warmup_requests:
+                                run_request_scenario(
+                                    service, api_name, thread_count,
+                                    args.warmup_requests, args.timeout)
+                            result = run_request_scenario(
+                                service, api_name, thread_count,
+                                args.requests, args.timeout)
+                            result.update({"api": api_name,
+                                           "attributes": attribute_count,
+                                           "thread_count": thread_count})
+                            results["requests"].append(result)
+                            _print_request_result(result)
+
+                if args.notifications:
+                    wait_for_subscription(service, publisher)
+                    for attribute_count in args.attribute_counts:
+                        payload = json.dumps(make_event(
+                            1, attribute_count)).encode("utf-8")
+                        result = run_notification_scenario(
+                            service, publisher, payload, args.notifications,
+                            args.notification_rate, idle_timeout=2)
+                        result["attributes"] = attribute_count
+                        results["notifications"].append(result)
+                        _print_notification_result(result)
+            finally:
+                service.close()
+    finally:
+        publisher.close()
+        context.term()
+    results["misp_calls"] = misp.calls
+    return results
+
+
+def _print_request_result(result):
+    latency = result["latency_ms"]
+    print("{api:<10} attributes={attributes:<6} threads={thread_count:<4} "
+          "{throughput:>10} req/s  p50={p50} ms  p99={p99} ms  "
+          "errors={errors} timeouts={timeouts}".format(
+              p50=latency["p50"], p99=latency["p99"], **result))
+    sys.stdout.flush()
+
+
+def _print_notification_result(result):
+    print("notifications attributes={attributes:<6} "
+          "{forwarding_rate:>10} notifications/s  forwarded={forwarded}/"
+          "{notifications}  drop_rate={drop_rate}".format(**result))
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING)
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    results = run(args)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=4, sort_keys=True)
+    print("Results written to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
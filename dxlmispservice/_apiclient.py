@@ -0,0 +1,297 @@
+from __future__ import absolute_import
+import functools
+import json
+import logging
+import sys
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+# pylint: disable=import-error
+from requests.packages.urllib3.util.retry import Retry
+from pymisp import PyMISP, PyMISPError, __version__ as pymisp_version
+from pymisp.abstract import MISPEncode
+
+from dxlmispservice._serialization import response_json
+
+# Configure local logger
+logger = logging.getLogger(__name__)
+
+
+def create_session(pool_size, max_retries=0, retry_backoff_factor=0,
+                   keep_alive=True):
+    """
+    Create an HTTP session whose connections to the MISP server are pooled and
+    shared by every thread which makes API calls through the session.
+
+    :param int pool_size: Maximum number of connections to keep open to the
+        MISP server.
+    :param int max_retries: Number of times to retry a failed attempt to
+        establish a connection. Requests which have already been sent to the
+        MISP server are not retried, since MISP API calls may not be
+        idempotent.
+    :param float retry_backoff_factor: Factor used to calculate the delay
+        between retries: `retry_backoff_factor * (2 ** (retry_number - 1))`
+        seconds.
+    :param bool keep_alive: Whether or not to keep connections open for reuse
+        after a request completes.
+    :return: The session.
+    :rtype: requests.Session
+    """
+    if pool_size < 1:
+        raise ValueError(
+            "Connection pool size must be greater than 0: {}".format(
+                pool_size))
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=max_retries, read=0, redirect=0, status=0,
+                          backoff_factor=retry_backoff_factor))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+class MispApiClient(PyMISP):
+    """
+    PyMISP client which sends all requests through a single, shared HTTP
+    session rather than creating a new session (and, therefore, a new TLS
+    connection) for each request.
+
+    Unlike :class:`pymisp.PyMISP`, the constructor does not contact the MISP
+    server. The checks which PyMISP makes against the server (of the
+    recommended PyMISP version and of the attribute types which the server
+    supports) are made by :meth:`connect`, or by a background thread started
+    with :meth:`connect_in_background`. API calls made before these checks
+    have completed wait for up to `ready_timeout` seconds for them to
+    complete.
+
+    Constructor parameters:
+
+    :param requests.Session session: The session through which requests
+        should be sent. See :func:`create_session`.
+    :param float timeout: Number of seconds to wait for the MISP server to
+        respond before abandoning a request. If `None`, wait indefinitely.
+    :param bool check_server: Whether or not to make the checks against the
+        MISP server. If `False`, the attribute types bundled with PyMISP are
+        used and the client is ready as soon as it is constructed.
+    :param float ready_timeout: Number of seconds for which API calls wait for
+        the checks against the MISP server to complete.
+
+    All other parameters are passed through to :class:`pymisp.PyMISP`.
+    """
+    #: Methods which manage the client rather than call the MISP API, and
+    #: which must therefore not be exposed as DXL service APIs.
+    MANAGEMENT_METHODS = frozenset(("connect", "connect_in_background",
+                                    "close"))
+
+    def __init__(self, url, key, session, timeout=None, check_server=True,
+                 ready_timeout=10, **kwargs):
+        self._session = session
+        self._timeout = timeout
+        self._check_server = check_server
+        self._ready_timeout = ready_timeout
+        self._ready = threading.Event()
+        self._closed = threading.Event()
+        self._connect_thread = None
+        # Skip the calls which the base class constructor makes to the MISP
+        # server. These are made by connect() instead.
+        self._constructing = True
+        try:
+            super(MispApiClient, self).__init__(url, key, **kwargs)
+        finally:
+            self._constructing = False
+        if not check_server:
+            self._ready.set()
+
+    @property
+    def ready(self):
+        """
+        Whether or not the checks against the MISP server have completed.
+        """
+        return self._ready.is_set() and not self._closed.is_set()
+
+    def get_recommended_api_version(self):
+        if self._constructing:
+            return {"version": ".".join(pymisp_version.split(".")[:3])}
+        return super(MispApiClient, self).get_recommended_api_version()
+
+    def get_live_describe_types(self):
+        if self._constructing:
+            return self.get_local_describe_types()
+        return super(MispApiClient, self).get_live_describe_types()
+
+    def connect(self):
+        """
+        Make the checks against the MISP server, if these have not already
+        been made, as :class:`pymisp.PyMISP` does on construction.
+
+        :raises pymisp.PyMISPError: If the MISP server cannot be reached.
+        """
+        if self._ready.is_set():
+            return
+        self._connect_thread = threading.current_thread()
+        try:
+            try:
+                response = self.get_recommended_api_version()
+            except Exception as ex:
+                raise PyMISPError(
+                    "Unable to connect to MISP ({}). Please make sure the API "
+                    "key and the URL are correct (http/https is required): "
+                    "{}".format(self.root_url, ex))
+            self._check_recommended_version(response)
+            try:
+                describe_types = self.get_live_describe_types()
+            except Exception:  # pylint: disable=broad-except
+                describe_types = self.get_local_describe_types()
+            self.describe_types = describe_types
+            self.categories = describe_types["categories"]
+            self.types = describe_types["types"]
+            self.category_type_mapping = \
+                describe_types["category_type_mappings"]
+            self.sane_default = describe_types["sane_defaults"]
+        finally:
+            self._connect_thread = None
+        self._ready.set()
+
+    @staticmethod
+    def _check_recommended_version(response):
+        """
+        Compare the version of PyMISP which the MISP server recommends with
+        the version in use, logging a warning as :class:`pymisp.PyMISP` does
+        on construction if they differ.
+
+        :param dict response: The response to the request for the recommended
+            PyMISP version.
+        """
+        if response.get("errors"):
+            logger.warning(response["errors"][0])
+            return
+        recommended_version = response.get("version")
+        if not recommended_version:
+            logger.warning("Unable to check the recommended PyMISP version "
+                           "(MISP <2.4.60), please upgrade.")
+            return
+        try:
+            pymisp_version_tup = tuple(
+                int(part) for part in pymisp_version.split("."))[:3]
+            recommended_version_tup = tuple(
+                int(part) for part in recommended_version.split("."))
+        except ValueError:
+            logger.debug("Unable to compare PyMISP version %s with the "
+                         "version recommended by the MISP server: %s",
+                         pymisp_version, recommended_version)
+            return
+        if recommended_version_tup < pymisp_version_tup:
+            logger.info(
+                "The version of PyMISP recommended by the MISP server (%s) is "
+                "older than the one in use (%s). If you have a problem, "
+                "please upgrade the MISP server or use an older PyMISP "
+                "version.", recommended_version, pymisp_version)
+        elif pymisp_version_tup < recommended_version_tup:
+            logger.warning(
+                "The version of PyMISP recommended by the MISP server (%s) is "
+                "newer than the one in use (%s). Please upgrade PyMISP.",
+                recommended_version, pymisp_version)
+
+    def connect_in_background(self, retry_delay):
+        """
+        Make the checks against the MISP server on a background thread,
+        retrying until they succeed or the client is closed.
+
+        :param float retry_delay: Number of seconds to wait between attempts.
+        """
+        def run():
+            while not self._closed.is_set():
+                try:
+                    self.connect()
+                    logger.info("Connected to MISP API URL: %s",
+                                self.root_url)
+                    return
+                except Exception as ex:  # pylint: disable=broad-except
+                    logger.error("%s. Retrying in %s seconds.", ex,
+                                 retry_delay)
+                self._closed.wait(retry_delay)
+
+        thread = threading.Thread(target=run, name="MispApiConnect")
+        thread.daemon = True
+        thread.start()
+
+    def _wait_until_ready(self):
+        """
+        Wait for the checks against the MISP server to complete, unless they
+        are being made on the current thread.
+
+        :raises pymisp.PyMISPError: If the checks do not complete within the
+            `ready_timeout` or the client is closed.
+        """
+        if not self._ready.is_set() and \
+                self._connect_thread is not threading.current_thread():
+            logger.debug("Waiting for connection to MISP server ...")
+            self._ready.wait(self._ready_timeout)
+        if self._closed.is_set():
+            raise PyMISPError("MISP API client is closed")
+        if not self._ready.is_set() and \
+                self._connect_thread is not threading.current_thread():
+            raise PyMISPError(
+                "Not yet connected to MISP ({}) after {} seconds".format(
+                    self.root_url, self._ready_timeout))
+
+    def _prepare_request(self, request_type, url, data=None,
+                         background_callback=None, output_type='json'):
+        """
+        Send a request to the MISP server. This mirrors
+        :meth:`pymisp.PyMISP._prepare_request`, except that the shared
+        session is used.
+        """
+        self._wait_until_ready()
+        if self.asynch and background_callback is not None:
+            return super(MispApiClient, self)._prepare_request(
+                request_type, url, data, background_callback, output_type)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s - %s", request_type, url)
+            if data is not None:
+                logger.debug(data)
+        if data is None:
+            req = requests.Request(request_type, url)
+        else:
+            if not isinstance(data, str):
+                if isinstance(data, dict):
+                    # Remove None values.
+                    data = {k: v for k, v in data.items() if v is not None}
+                data = json.dumps(data, cls=MISPEncode)
+            req = requests.Request(request_type, url, data=data)
+        req.auth = self.auth
+        prepped = self._session.prepare_request(req)
+        prepped.headers.update({
+            "Authorization": self.key,
+            "Accept": "application/{}".format(output_type),
+            "content-type": "application/{}".format(output_type),
+            "User-Agent": "PyMISP {} - Python {}.{}.{}{}".format(
+                pymisp_version, sys.version_info[0], sys.version_info[1],
+                sys.version_info[2],
+                " - {}".format(self.tool) if self.tool else "")})
+        if logger.isEnabledFor(logging.DEBUG):
+            # Log the headers as PyMISP does, but without the API key.
+            logger.debug(dict(prepped.headers, Authorization="<redacted>"))
+        settings = self._session.merge_environment_settings(
+            req.url, proxies=self.proxies or {}, stream=None,
+            verify=self.ssl, cert=self.cert)
+        response = self._session.send(prepped, timeout=self._timeout,
+                                      **settings)
+        # PyMISP decodes the response body through this method.
+        response.json = functools.partial(response_json, response)
+        return response
+
+    def close(self):
+        """
+        Close the connections held by the shared session and stop any attempts
+        to connect to the MISP server.
+        """
+        self._closed.set()
+        # Release API calls waiting for the client to be ready.
+        self._ready.set()
+        self._session.close()
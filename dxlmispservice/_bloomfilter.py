@@ -0,0 +1,140 @@
+from __future__ import absolute_import
+import hashlib
+import math
+import struct
+import threading
+
+
+class BloomFilter(object):
+    """
+    Compact, probabilistic set of strings. A string which has been added is
+    always reported as present. A string which has not been added is reported
+    as absent, except for a fraction (the false positive rate) of strings
+    which are wrongly reported as present. Strings cannot be removed.
+
+    Constructor parameters:
+
+    :param int capacity: The number of strings which the filter is sized to
+        hold. The false positive rate rises above `error_rate` if more
+        strings are added.
+    :param float error_rate: The false positive rate when `capacity`
+        strings have been added, between `0` and `1`.
+    """
+    def __init__(self, capacity, error_rate):
+        if capacity < 1:
+            raise ValueError(
+                "Bloom filter capacity must be greater than 0: {}".format(
+                    capacity))
+        if not 0 < error_rate < 1:
+            raise ValueError(
+                "Bloom filter error rate must be between 0 and 1: {}".format(
+                    error_rate))
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._bit_count = int(math.ceil(
+            -capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self._hash_count = max(1, int(round(
+            float(self._bit_count) / capacity * math.log(2))))
+        self._bits = bytearray((self._bit_count + 7) // 8)
+        self._count = 0
+        # Setting a bit is a read-modify-write of its byte, so concurrent
+        # adds could otherwise lose bits.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        :return: The number of strings added to the filter (counting any
+            which were added more than once).
+        :rtype: int
+        """
+        return self._count
+
+    @property
+    def capacity(self):
+        """
+        The number of strings which the filter is sized to hold.
+        """
+        return self._capacity
+
+    @property
+    def error_rate(self):
+        """
+        The false positive rate when `capacity` strings have been added.
+        """
+        return self._error_rate
+
+    @property
+    def size(self):
+        """
+        The size of the filter, in bytes.
+        """
+        return len(self._bits)
+
+    def to_bytes(self):
+        """
+        :return: The bits of the filter, from which it can be recreated with
+            :meth:`from_bytes`.
+        :rtype: bytes
+        """
+        with self._lock:
+            return bytes(self._bits)
+
+    @classmethod
+    def from_bytes(cls, capacity, error_rate, count, data):
+        """
+        Recreate a filter from its bits.
+
+        :param int capacity: The capacity of the filter.
+        :param float error_rate: The error rate of the filter.
+        :param int count: The number of strings added to the filter.
+        :param bytes data: The bits of the filter, as returned by
+            :meth:`to_bytes`.
+        :return: The filter.
+        :rtype: BloomFilter
+        :raises ValueError: If the size of the bits does not match the
+            capacity and error rate.
+        """
+        bloom_filter = cls(capacity, error_rate)
+        if len(data) != len(bloom_filter._bits):
+            raise ValueError(
+                "Bloom filter data must be {} bytes: {}".format(
+                    len(bloom_filter._bits), len(data)))
+        bloom_filter._bits = bytearray(data)
+        bloom_filter._count = count
+        return bloom_filter
+
+    def _positions(self, value):
+        """
+        :return: The positions of the bits for a string, derived from two
+            64-bit hashes of the string by double hashing.
+        :rtype: list(int)
+        """
+        digest = hashlib.sha256(value.encode("utf-8")).digest()
+        hash1, hash2 = struct.unpack("<QQ", digest[:16])
+        return [(hash1 + index * hash2) % self._bit_count
+                for index in range(self._hash_count)]
+
+    def add(self, value):
+        """
+        Add a string to the filter.
+
+        :param str value: The string.
+        """
+        positions = self._positions(value)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self._count += 1
+
+    def __contains__(self, value):
+        """
+        :param str value: The string.
+        :return: `False` if the string has definitely not been added to the
+            filter, otherwise `True`.
+        :rtype: bool
+        """
+        bits = self._bits
+        for position in self._positions(value):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
@@ -0,0 +1,136 @@
+from __future__ import absolute_import
+import sys
+import zlib
+
+try:
+    import zstandard  # pylint: disable=import-error
+except ImportError:
+    zstandard = None
+
+#: Reserved request parameter which holds the name of the codec with which to
+#: compress the response to a request.
+COMPRESSION_PARAM = "dxl_compression"
+#: Name of the field (in the `other_fields` of a DXL message) which holds the
+#: name of the codec with which the payload of the message is compressed.
+COMPRESSION_FIELD = "dxl_compression"
+
+#: The name of the zlib codec, which is always available.
+ZLIB = "zlib"
+#: The name of the Zstandard codec, which is only available if the
+#: `zstandard` package is installed.
+ZSTD = "zstd"
+
+# Compression levels which favour speed, since payloads are compressed on the
+# path of each response and notification.
+_ZLIB_LEVEL = 1
+_ZSTD_LEVEL = 3
+
+
+def available_codecs():
+    """
+    :return: The names of the codecs which can be used in this environment.
+    :rtype: list(str)
+    """
+    codecs = [ZLIB]
+    if zstandard is not None:
+        codecs.append(ZSTD)
+    return codecs
+
+
+def check_codec(codec):
+    """
+    Check that a codec can be used.
+
+    :param str codec: The name of the codec.
+    :return: The name of the codec.
+    :rtype: str
+    :raises ValueError: If the codec is unknown or not available.
+    """
+    if codec not in available_codecs():
+        raise ValueError(
+            "Unsupported compression, expected one of {}: {}".format(
+                ", ".join(available_codecs()), codec))
+    return codec
+
+
+def compress(data, codec):
+    """
+    Compress data.
+
+    :param data: The data, as a bytes-like object.
+    :param str codec: The name of the codec.
+    :return: The compressed data.
+    :rtype: bytes
+    """
+    if codec == ZLIB:
+        if sys.version_info[0] < 3 and isinstance(data, memoryview):
+            data = data.tobytes()
+        return zlib.compress(data, _ZLIB_LEVEL)
+    check_codec(codec)
+    # Compressor objects must not be shared between threads.
+    return zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+
+
+def decompress(data, codec):
+    """
+    Decompress data.
+
+    :param data: The compressed data, as a bytes-like object.
+    :param str codec: The name of the codec.
+    :return: The decompressed data.
+    :rtype: bytes
+    :raises ValueError: If the data cannot be decompressed.
+    """
+    if codec == ZLIB:
+        try:
+            return zlib.decompress(data)
+        except zlib.error as ex:
+            raise ValueError("Unable to decompress payload: {}".format(ex))
+    check_codec(codec)
+    try:
+        return zstandard.ZstdDecompressor().decompress(data)
+    except zstandard.ZstdError as ex:
+        raise ValueError("Unable to decompress payload: {}".format(ex))
+
+
+def pop_compression_option(request_dict):
+    """
+    Remove the reserved compression parameter from the parameters of a
+    request.
+
+    :param dict request_dict: The decoded request payload.
+    :return: The name of the codec with which to compress the response, or
+        `None` if the response should not be compressed.
+    :rtype: str
+    :raises ValueError: If the codec is not available.
+    """
+    codec = request_dict.pop(COMPRESSION_PARAM, None)
+    return None if codec is None else check_codec(codec)
+
+
+def compress_message(message, codec):
+    """
+    Compress the payload of a DXL message, recording the codec in the
+    `other_fields` of the message.
+
+    :param dxlclient.message.Message message: The message.
+    :param str codec: The name of the codec. If `None`, the message is left
+        as is.
+    """
+    if codec is not None:
+        message.payload = compress(message.payload, codec)
+        message.other_fields[COMPRESSION_FIELD] = codec
+
+
+def decompress_message(message):
+    """
+    Decompress the payload of a DXL message whose `other_fields` record that
+    it was compressed.
+
+    :param dxlclient.message.Message message: The message.
+    :raises ValueError: If the codec is not available or the payload cannot
+        be decompressed.
+    """
+    codec = message.other_fields.pop(COMPRESSION_FIELD, None)
+    if codec is not None:
+        message.payload = decompress(message.payload, check_codec(codec))
@@ -0,0 +1,207 @@
+from __future__ import absolute_import
+from collections import deque
+import logging
+import threading
+
+# Configure local logger
+logger = logging.getLogger(__name__)
+
+
+class RejectedError(Exception):
+    """
+    Raised when a call cannot be accepted for execution.
+    """
+
+
+class ApiExecutor(object):
+    """
+    Runs calls to MISP API methods on a shared pool of worker threads,
+    limiting the number of calls in flight for each API name. Calls for an API
+    name which is at its limit wait in a queue for that API name, without
+    occupying a worker thread, so that slow calls for one API (for example,
+    `search`) cannot starve calls for other APIs of worker threads.
+
+    When a worker thread becomes available, the queue with the highest
+    priority which holds a call that is below its limit is served. Queues
+    with the same priority are served in round-robin order. A call is rejected
+    if the queue for its API name is already full.
+
+    Constructor parameters:
+
+    :param int worker_count: Number of worker threads.
+    :param int default_limit: Maximum number of calls in flight for an API
+        name which has no entry in `limits`.
+    :param dict limits: Maximum number of calls in flight, keyed by API name.
+    :param dict priorities: Priority of the calls for each API name. Calls
+        for API names with higher priorities are executed first. API names
+        which have no entry have a priority of `0`.
+    :param int default_max_queue_size: Maximum number of calls to queue for
+        an API name which has no entry in `max_queue_sizes`. If `0`, the
+        number of queued calls is not limited.
+    :param dict max_queue_sizes: Maximum number of calls to queue, keyed by
+        API name. A value of `0` means the number of queued calls is not
+        limited.
+    """
+    def __init__(self, worker_count, default_limit, limits=None,
+                 priorities=None, default_max_queue_size=0,
+                 max_queue_sizes=None):
+        if worker_count < 1:
+            raise ValueError(
+                "Worker count must be greater than 0: {}".format(
+                    worker_count))
+        limits = dict(limits or {})
+        for api_name, limit in [(None, default_limit)] + \
+                sorted(limits.items()):
+            if limit < 1:
+                raise ValueError(
+                    "Concurrency limit{} must be greater than 0: {}".format(
+                        " for {}".format(api_name) if api_name else "",
+                        limit))
+        max_queue_sizes = dict(max_queue_sizes or {})
+        for api_name, max_queue_size in \
+                [(None, default_max_queue_size)] + \
+                sorted(max_queue_sizes.items()):
+            if max_queue_size < 0:
+                raise ValueError(
+                    "Maximum queue size{} must not be negative: {}".format(
+                        " for {}".format(api_name) if api_name else "",
+                        max_queue_size))
+        self._default_limit = default_limit
+        self._limits = limits
+        self._priorities = dict(priorities or {})
+        self._default_max_queue_size = default_max_queue_size
+        self._max_queue_sizes = max_queue_sizes
+        self._condition = threading.Condition()
+        self._queues = {}
+        self._in_flight = {}
+        self._api_names = []
+        self._next_index = 0
+        self._pending = 0
+        self._closed = False
+        self._workers = []
+        for worker_index in range(worker_count):
+            worker = threading.Thread(
+                target=self._run_worker,
+                name="ApiWorker-{}".format(worker_index))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, api_name, fn, *args):
+        """
+        Queue a call for execution.
+
+        :param str api_name: The name of the API for which the call is made.
+        :param fn: Function to invoke on a worker thread.
+        :param args: Arguments to pass to the function.
+        :raises RejectedError: If the executor has been closed or the queue
+            for the API name is full.
+        """
+        with self._condition:
+            if self._closed:
+                raise RejectedError("Service is shutting down")
+            queue = self._queues.get(api_name)
+            if queue is None:
+                queue = deque()
+                self._queues[api_name] = queue
+                self._in_flight[api_name] = 0
+                self._api_names.append(api_name)
+            max_queue_size = self._max_queue_sizes.get(
+                api_name, self._default_max_queue_size)
+            if max_queue_size and len(queue) >= max_queue_size:
+                raise RejectedError(
+                    "Service is busy, too many requests queued for {}: "
+                    "{}".format(api_name, len(queue)))
+            queue.append((fn, args))
+            self._pending += 1
+            self._condition.notify()
+
+    def qsize(self, api_name=None):
+        """
+        :param str api_name: The API name. If `None`, count the queued calls
+            for all API names.
+        :return: The number of calls waiting to be executed.
+        :rtype: int
+        """
+        with self._condition:
+            if api_name is None:
+                return self._pending
+            return len(self._queues.get(api_name, ()))
+
+    def stats(self):
+        """
+        :return: The number of queued calls and the number of calls in
+            flight, as a tuple, keyed by API name.
+        :rtype: dict(str, (int, int))
+        """
+        with self._condition:
+            return dict((api_name, (len(self._queues[api_name]),
+                                    self._in_flight[api_name]))
+                        for api_name in self._api_names)
+
+    def close(self):
+        """
+        Stop accepting calls, wait for queued calls to be executed, and stop
+        the worker threads.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def _next_api_name(self):
+        """
+        Select the API name with the highest priority which has a queued call
+        that is below its limit, in round-robin order among API names with
+        the same priority. Must be called with the lock held.
+
+        :return: The API name, or `None` if no call can be executed.
+        """
+        count = len(self._api_names)
+        selected_index = None
+        selected_priority = None
+        for offset in range(count):
+            index = (self._next_index + offset) % count
+            api_name = self._api_names[index]
+            if self._queues[api_name] and self._in_flight[api_name] < \
+                    self._limits.get(api_name, self._default_limit):
+                priority = self._priorities.get(api_name, 0)
+                if selected_index is None or priority > selected_priority:
+                    selected_index = index
+                    selected_priority = priority
+        if selected_index is None:
+            return None
+        self._next_index = (selected_index + 1) % count
+        return self._api_names[selected_index]
+
+    def _run_worker(self):
+        """
+        Execute queued calls until the executor is closed and no calls are
+        queued.
+        """
+        while True:
+            with self._condition:
+                api_name = self._next_api_name()
+                while api_name is None:
+                    if self._closed and not self._pending:
+                        # Pass the wake-up on so that the other waiting
+                        # workers also stop.
+                        self._condition.notify()
+                        return
+                    self._condition.wait()
+                    api_name = self._next_api_name()
+                fn, args = self._queues[api_name].popleft()
+                self._pending -= 1
+                self._in_flight[api_name] += 1
+            try:
+                fn(*args)
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.exception("Error executing call for %s: %s",
+                                 api_name, ex)
+            finally:
+                with self._condition:
+                    self._in_flight[api_name] -= 1
+                    # A call which was held back by the limit may now be
+                    # executed.
+                    self._condition.notify()
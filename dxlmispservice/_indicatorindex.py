@@ -0,0 +1,821 @@
+from __future__ import absolute_import
+import abc
+import logging
+import threading
+
+from dxlmispservice._bloomfilter import BloomFilter
+from dxlmispservice._serialization import dumps, loads
+from dxlmispservice._snapshot import read_snapshot, write_snapshot
+from dxlmispservice._streaming import find_stream_items
+
+# Configure local logger
+logger = logging.getLogger(__name__)
+
+#: The members of a MISP attribute which are returned for each match.
+_SUMMARY_FIELDS = ("id", "event_id", "type", "category", "value", "to_ids",
+                   "uuid", "timestamp")
+
+#: Attribute types whose values are matched regardless of case.
+_CASE_INSENSITIVE_TYPES = frozenset((
+    "md5", "sha1", "sha224", "sha256", "sha384", "sha512", "sha512/224",
+    "sha512/256", "imphash", "authentihash", "pehash", "impfuzzy", "tlsh",
+    "ssdeep", "domain", "hostname", "ip-src", "ip-dst", "email-src",
+    "email-dst", "target-email", "whois-registrant-email", "mac-address"))
+
+#: Prefix of the Bloom filter keys of values of types which are matched
+#: regardless of case, which keeps them apart from the keys of values which
+#: are matched as is.
+_FOLDED_KEY_PREFIX = "\x00"
+
+#: Base class for abstract classes, which can be declared in the same way
+#: under Python 2 and 3.
+_AbstractBase = abc.ABCMeta("_AbstractBase", (object,), {})
+
+#: Actions in MISP ZeroMQ notifications which remove attributes or events.
+_DELETE_ACTIONS = frozenset(("delete", "soft-delete"))
+
+
+def _is_true(value):
+    """
+    :return: Whether or not a MISP boolean (which may be sent as a boolean,
+        an integer, or a string) is set.
+    :rtype: bool
+    """
+    return value in (True, 1, "1", "true", "True")
+
+
+def _text(value):
+    """
+    :return: A value as a string, leaving strings (including, on Python 2,
+        `unicode` strings) as they are.
+    """
+    if value is None:
+        return ""
+    if type(value).__name__ in ("str", "unicode"):
+        return value
+    return str(value)
+
+
+def _index_keys(attribute_type, value, types):
+    """
+    Determine the keys under which to index an attribute value.
+
+    Composite attributes (for example, `filename|md5` or `domain|ip`) are
+    indexed under their whole value and under each of their components, so
+    that a lookup of, for example, the hash alone matches them.
+
+    :param str attribute_type: The type of the attribute.
+    :param str value: The value of the attribute.
+    :param set types: The attribute types to index. If empty, all types are
+        indexed.
+    :return: A tuple containing the keys of the values which are matched as
+        is and, as the second element, the (lower case) keys of the values
+        which are matched regardless of case.
+    :rtype: (set(str), set(str))
+    """
+    pairs = [(attribute_type, value)]
+    if "|" in attribute_type:
+        sub_types = attribute_type.split("|")
+        sub_values = value.split("|", len(sub_types) - 1)
+        if len(sub_types) == len(sub_values):
+            pairs.extend(zip(sub_types, sub_values))
+    keys = set()
+    folded_keys = set()
+    for pair_type, pair_value in pairs:
+        if types and pair_type not in types:
+            continue
+        pair_value = pair_value.strip()
+        if not pair_value:
+            continue
+        if pair_type in _CASE_INSENSITIVE_TYPES:
+            folded_keys.add(pair_value.lower())
+        else:
+            keys.add(pair_value)
+    return keys, folded_keys
+
+
+def _timestamp(attribute):
+    """
+    :return: The modification timestamp of an attribute, or `0` if it does
+        not have a valid one.
+    :rtype: int
+    """
+    try:
+        return int(attribute.get("timestamp", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _summarize(attribute):
+    """
+    :return: The summary of an attribute which is returned for a match.
+    :rtype: dict
+    """
+    return dict((field, attribute[field]) for field in _SUMMARY_FIELDS
+                if field in attribute)
+
+
+def _lookup_keys(value):
+    """
+    :return: A tuple containing the key which matches a looked up value as
+        is and, as the second element, the key which matches it regardless of
+        case.
+    :rtype: (str, str)
+    """
+    value = value.strip()
+    return value, value.lower()
+
+
+def _keys_match(keys, lookup_keys):
+    """
+    :param tuple keys: The keys of an attribute, as returned by
+        :func:`_index_keys`.
+    :param tuple lookup_keys: The keys of a looked up value, as returned by
+        :func:`_lookup_keys`.
+    :return: Whether or not the attribute matches the looked up value.
+    :rtype: bool
+    """
+    return lookup_keys[0] in keys[0] or lookup_keys[1] in keys[1]
+
+
+class _IndicatorStore(_AbstractBase):
+    """
+    Base class for the local stores of MISP attribute values, which are
+    loaded from a search of the MISP server for attributes (see :meth:`load`)
+    and kept current from MISP ZeroMQ notifications (see
+    :meth:`apply_notification`).
+
+    The store can be saved to a snapshot file (see :meth:`save_snapshot`),
+    from which it is restored when the application is restarted (see
+    :meth:`restore_snapshot`), so that only the attributes which have changed
+    since need to be loaded from the MISP server.
+
+    Constructor parameters:
+
+    :param set types: The attribute types to store. If empty or `None`, all
+        types are stored.
+    :param bool to_ids_only: Whether or not to store only attributes whose
+        `to_ids` flag is set.
+    """
+    #: The kind of store, recorded in snapshots so that a snapshot is only
+    #: restored into the same kind of store.
+    _SNAPSHOT_KIND = None
+
+    def __init__(self, types=None, to_ids_only=False):
+        self._types = frozenset(types or ())
+        self._to_ids_only = to_ids_only
+        self._lock = threading.Lock()
+        self._last_timestamp = 0
+        self._complete = False
+
+    @property
+    def complete(self):
+        """
+        Whether or not the store has been fully loaded from the MISP server.
+        """
+        return self._complete
+
+    @property
+    def last_timestamp(self):
+        """
+        The latest modification timestamp of any attribute found by a load
+        of the store from the MISP server (or restored from a snapshot), or
+        `0` if none has been found. Attributes added from notifications do
+        not advance it, since notifications for older changes may have been
+        dropped.
+        """
+        return self._last_timestamp
+
+    def search_params(self):
+        """
+        :return: The parameters (other than the `controller`, `limit`, and
+            `page`) for the search of the MISP server for the attributes to
+            store.
+        :rtype: dict
+        """
+        params = {}
+        if self._types:
+            params["type_attribute"] = sorted(self._types)
+        if self._to_ids_only:
+            params["to_ids"] = True
+        return params
+
+    def delta_search_params(self):
+        """
+        :return: The parameters for a search of the MISP server for the
+            attributes to store which have been modified since the latest
+            modification timestamp of any attribute found by a load of the
+            store (see :attr:`last_timestamp`).
+        :rtype: dict
+        """
+        params = self.search_params()
+        params["timestamp"] = self._last_timestamp
+        return params
+
+    def load(self, paginator, params=None):
+        """
+        Add the attributes found by a paged search of the MISP server.
+
+        :param dxlmispservice._pagination.SearchPaginator paginator: Pages
+            through the results of a search for attributes.
+        :param dict params: The search parameters. If `None`, those returned
+            by :meth:`search_params` are used.
+        :return: The number of attributes found.
+        :rtype: int
+        :raises ValueError: If a page of results does not hold a list of
+            attributes (for example, because the MISP server reported an
+            error).
+        """
+        count = 0
+        last_timestamp = 0
+        for data in paginator.pages(
+                self.search_params() if params is None else params):
+            for attribute in self._find_attributes(data):
+                self.add_attribute(attribute)
+                last_timestamp = max(last_timestamp, _timestamp(attribute))
+                count += 1
+        # Only a load which has found every attribute advances the
+        # timestamp from which a later delta load starts.
+        with self._lock:
+            self._last_timestamp = max(self._last_timestamp, last_timestamp)
+        return count
+
+    def rebuild(self, paginator):
+        """
+        Reload the store from a paged search of the MISP server, so that
+        changes which were not applied from notifications (for example,
+        because notifications were dropped) are reflected in it. The store
+        remains available for lookups, and notifications continue to be
+        applied, while it is rebuilt.
+
+        :param dxlmispservice._pagination.SearchPaginator paginator: Pages
+            through the results of a search for attributes.
+        :return: The number of attributes found.
+        :rtype: int
+        """
+        self._begin_rebuild()
+        try:
+            count = self.load(paginator)
+        except Exception:
+            self._end_rebuild(False)
+            raise
+        self._end_rebuild(True)
+        return count
+
+    @abc.abstractmethod
+    def _begin_rebuild(self):
+        """
+        Prepare to rebuild the store.
+        """
+
+    @abc.abstractmethod
+    def _end_rebuild(self, succeeded):
+        """
+        Finish rebuilding the store.
+
+        :param bool succeeded: Whether or not all of the attributes were
+            loaded from the MISP server.
+        """
+
+    @staticmethod
+    def _find_attributes(data):
+        """
+        :param data: The result of a search for attributes.
+        :return: The attributes in the result.
+        :rtype: list(dict)
+        :raises ValueError: If the result does not hold a list of
+            attributes.
+        """
+        attributes = find_stream_items(data)
+        if attributes is None:
+            raise ValueError(
+                "Unexpected search result: {}".format(
+                    data.get("errors", data)
+                    if isinstance(data, dict) else data))
+        return [attribute.get("Attribute", attribute)
+                for attribute in attributes if isinstance(attribute, dict)]
+
+    def mark_complete(self):
+        """
+        Record that the store has been fully loaded from the MISP server.
+        """
+        self._complete = True
+
+    def _snapshot_settings(self):
+        """
+        :return: The settings of the store, which must match those recorded
+            in a snapshot for the snapshot to be restored.
+        :rtype: dict
+        """
+        return {"kind": self._SNAPSHOT_KIND, "types": sorted(self._types),
+                "to_ids_only": self._to_ids_only}
+
+    def save_snapshot(self, path):
+        """
+        Save the store to a snapshot file. A store which is not complete
+        (see :attr:`complete`) is not saved, since a later delta load from
+        its :attr:`last_timestamp` would miss attributes.
+
+        :param str path: The path of the file.
+        :return: The number of items saved, or `None` if the store is not
+            complete.
+        :rtype: int
+        """
+        if not self._complete:
+            return None
+        with self._lock:
+            meta, rows = self._snapshot_items()
+            meta["last_timestamp"] = self._last_timestamp
+        meta["settings"] = self._snapshot_settings()
+        return write_snapshot(path, meta, rows)
+
+    def restore_snapshot(self, path):
+        """
+        Restore the store from a snapshot file written by
+        :meth:`save_snapshot`. Notifications may be applied while the store
+        is restored. The restored store is not complete: the attributes
+        modified since the store was last loaded before the snapshot was
+        saved should then be loaded (see :meth:`delta_search_params`).
+        Attributes deleted since the snapshot was saved remain in the store
+        until it is rebuilt.
+
+        :param str path: The path of the file.
+        :return: The number of items restored.
+        :rtype: int
+        :raises ValueError: If the file cannot be read or was saved from a
+            store with different settings.
+        """
+        def restore(meta, rows):
+            if meta.get("settings") != self._snapshot_settings():
+                raise ValueError(
+                    "Snapshot was saved with different settings: {}".format(
+                        meta.get("settings")))
+            count = self._restore_items(meta, rows)
+            with self._lock:
+                self._last_timestamp = max(self._last_timestamp,
+                                           int(meta.get("last_timestamp", 0)))
+            return count
+        return read_snapshot(path, restore)
+
+    @abc.abstractmethod
+    def _snapshot_items(self):
+        """
+        Copy the contents of the store for a snapshot. Called with the lock
+        held.
+
+        :return: A tuple containing the `meta` values of the snapshot as the
+            first element and an iterable of its items (as bytes, which may
+            be produced after the lock is released) as the second element.
+        :rtype: (dict, iterable)
+        """
+
+    @abc.abstractmethod
+    def _restore_items(self, meta, rows):
+        """
+        Restore the contents of the store from a snapshot.
+
+        :param dict meta: The `meta` values of the snapshot.
+        :param rows: An iterator of the items in the snapshot, as bytes.
+        :return: The number of items restored.
+        :rtype: int
+        :raises ValueError: If the snapshot does not match the store.
+        """
+
+    def _attribute_keys(self, attribute):
+        """
+        :param dict attribute: The attribute, as returned by the MISP server.
+        :return: The keys under which to store the attribute (see
+            :func:`_index_keys`), which are empty if the attribute is deleted
+            or should not be stored.
+        :rtype: (set(str), set(str))
+        """
+        if _is_true(attribute.get("deleted")) or \
+                (self._to_ids_only and not _is_true(attribute.get("to_ids"))):
+            return set(), set()
+        return _index_keys(_text(attribute.get("type")),
+                           _text(attribute.get("value")), self._types)
+
+    @abc.abstractmethod
+    def add_attribute(self, attribute):
+        """
+        Add an attribute to the store, replacing any previous version of it.
+
+        :param dict attribute: The attribute, as returned by the MISP server.
+        :return: Whether or not the attribute is in the store.
+        :rtype: bool
+        """
+
+    @abc.abstractmethod
+    def remove_attribute(self, attribute_id):
+        """
+        Remove an attribute from the store.
+
+        :param str attribute_id: The id of the attribute.
+        """
+
+    @abc.abstractmethod
+    def remove_event(self, event_id):
+        """
+        Remove the attributes of an event from the store.
+
+        :param str event_id: The id of the event.
+        """
+
+    def apply_notification(self, data):
+        """
+        Apply the changes described by a MISP ZeroMQ notification for an
+        attribute (`misp_json_attribute`) or an event (`misp_json`).
+
+        :param data: The content of the notification (as decoded from JSON).
+        :return: Whether or not the notification described any attributes.
+        :rtype: bool
+        """
+        if not isinstance(data, dict):
+            return False
+        action = data.get("action")
+        attribute = data.get("Attribute")
+        if isinstance(attribute, dict):
+            if action in _DELETE_ACTIONS and "id" in attribute:
+                self.remove_attribute(attribute["id"])
+            else:
+                self.add_attribute(attribute)
+            return True
+        event = data.get("Event")
+        if isinstance(event, dict):
+            if action in _DELETE_ACTIONS and "id" in event:
+                self.remove_event(event["id"])
+                return True
+            attributes = list(event.get("Attribute") or [])
+            for obj in event.get("Object") or []:
+                if isinstance(obj, dict):
+                    attributes.extend(obj.get("Attribute") or [])
+            for attribute in attributes:
+                if isinstance(attribute, dict):
+                    self.add_attribute(attribute)
+            return bool(attributes)
+        return False
+
+    @abc.abstractmethod
+    def lookup_values(self, values):
+        """
+        Find the attributes whose value (or, for composite attributes, one
+        of whose component values) matches each of several values. Values of
+        types such as hashes, domains, and IP addresses are matched
+        regardless of case.
+
+        :param list(str) values: The values.
+        :return: A list with a summary (holding the `id`, `event_id`, `type`,
+            `category`, `value`, `to_ids`, `uuid`, and `timestamp`) of each
+            matching attribute, keyed by value.
+        :rtype: dict
+        """
+
+
+class IndicatorIndex(_IndicatorStore):
+    """
+    In-memory index of the values of MISP attributes (indicators such as
+    hashes, IP addresses, domains, and URLs), which answers whether a value
+    is known to MISP without a call to the MISP server.
+
+    Constructor parameters:
+
+    :param set types: The attribute types to index. If empty or `None`, all
+        types are indexed.
+    :param bool to_ids_only: Whether or not to index only attributes whose
+        `to_ids` flag is set.
+    """
+    _SNAPSHOT_KIND = "index"
+
+    def __init__(self, types=None, to_ids_only=False):
+        super(IndicatorIndex, self).__init__(types, to_ids_only)
+        # Index key -> {attribute id -> attribute summary}, for values which
+        # are matched as is
+        self._keys = {}
+        # Lower case index key -> {attribute id -> attribute summary}, for
+        # values of types which are matched regardless of case
+        self._folded_keys = {}
+        # Attribute id -> (index keys, attribute summary, event id)
+        self._attributes = {}
+        # Event id -> set of attribute ids
+        self._events = {}
+        # Ids of the attributes added since a rebuild began, or `None` if the
+        # index is not being rebuilt.
+        self._rebuild_ids = None
+        # Ids of the attributes and of the events changed since a restore
+        # from a snapshot began, or `None` if the index is not being
+        # restored.
+        self._restore_changes = None
+
+    def __len__(self):
+        """
+        :return: The number of attributes in the index.
+        :rtype: int
+        """
+        return len(self._attributes)
+
+    def _begin_rebuild(self):
+        with self._lock:
+            self._rebuild_ids = set()
+
+    def _end_rebuild(self, succeeded):
+        with self._lock:
+            rebuild_ids, self._rebuild_ids = self._rebuild_ids, None
+            if succeeded:
+                # Remove the attributes which were neither found by the
+                # search nor added from notifications during the rebuild.
+                for attribute_id in set(self._attributes) - rebuild_ids:
+                    self._remove_attribute(attribute_id)
+
+    def _snapshot_items(self):
+        # Summaries are replaced rather than modified when attributes
+        # change, so they can be encoded after the lock is released.
+        summaries = [summary for _, summary, _ in self._attributes.values()]
+        return {}, (dumps(summary) for summary in summaries)
+
+    def _restore_items(self, meta, rows):
+        # Notifications may be applied while the index is restored. The
+        # restored version of an attribute (or event) which has been changed
+        # by a notification is older, so it is skipped.
+        with self._lock:
+            self._restore_changes = (set(), set())
+        try:
+            count = 0
+            for row in rows:
+                if self._add_attribute(loads(row), restoring=True):
+                    count += 1
+            return count
+        finally:
+            with self._lock:
+                self._restore_changes = None
+
+    def add_attribute(self, attribute):
+        """
+        Add an attribute to the index, replacing any previous version of it.
+        Deleted attributes, and attributes of types which are not indexed,
+        are removed.
+
+        :param dict attribute: The attribute, as returned by the MISP server.
+        :return: Whether or not the attribute is in the index.
+        :rtype: bool
+        """
+        return self._add_attribute(attribute)
+
+    def _add_attribute(self, attribute, restoring=False):
+        """
+        Add an attribute to the index. See :meth:`add_attribute`.
+
+        :param bool restoring: Whether or not the attribute is being restored
+            from a snapshot, in which case it is skipped if it has been
+            changed since the restore began.
+        """
+        attribute_id = attribute.get("id")
+        if attribute_id is None:
+            return False
+        attribute_id = str(attribute_id)
+        keys = self._attribute_keys(attribute)
+        if not any(keys):
+            if not restoring:
+                self.remove_attribute(attribute_id)
+            return False
+        summary = _summarize(attribute)
+        event_id = str(attribute.get("event_id"))
+        with self._lock:
+            if self._restore_changes is not None:
+                changed_ids, changed_event_ids = self._restore_changes
+                if not restoring:
+                    changed_ids.add(attribute_id)
+                elif attribute_id in changed_ids or \
+                        event_id in changed_event_ids:
+                    return False
+            self._remove_attribute(attribute_id)
+            for key_map, map_keys in zip((self._keys, self._folded_keys),
+                                         keys):
+                for key in map_keys:
+                    key_map.setdefault(key, {})[attribute_id] = summary
+            self._attributes[attribute_id] = (keys, summary, event_id)
+            self._events.setdefault(event_id, set()).add(attribute_id)
+            if self._rebuild_ids is not None:
+                self._rebuild_ids.add(attribute_id)
+        return True
+
+    def remove_attribute(self, attribute_id):
+        with self._lock:
+            if self._restore_changes is not None:
+                self._restore_changes[0].add(str(attribute_id))
+            self._remove_attribute(str(attribute_id))
+
+    def remove_event(self, event_id):
+        with self._lock:
+            if self._restore_changes is not None:
+                self._restore_changes[1].add(str(event_id))
+            for attribute_id in list(self._events.get(str(event_id), ())):
+                self._remove_attribute(attribute_id)
+
+    def _remove_attribute(self, attribute_id):
+        """
+        Remove an attribute from the index. Must be called with the lock
+        held.
+        """
+        entry = self._attributes.pop(attribute_id, None)
+        if entry is None:
+            return
+        keys, _, event_id = entry
+        for key_map, map_keys in zip((self._keys, self._folded_keys), keys):
+            for key in map_keys:
+                matches = key_map.get(key)
+                if matches is not None:
+                    matches.pop(attribute_id, None)
+                    if not matches:
+                        del key_map[key]
+        event_attributes = self._events.get(event_id)
+        if event_attributes is not None:
+            event_attributes.discard(attribute_id)
+            if not event_attributes:
+                del self._events[event_id]
+
+    def lookup(self, value):
+        """
+        Find the attributes which match a value. See :meth:`lookup_values`.
+
+        :param str value: The value.
+        :return: A summary of each matching attribute.
+        :rtype: list(dict)
+        """
+        key, folded_key = _lookup_keys(value)
+        matches = {}
+        with self._lock:
+            matches.update(self._keys.get(key, {}))
+            matches.update(self._folded_keys.get(folded_key, {}))
+        return list(matches.values())
+
+    def lookup_values(self, values):
+        return dict((value, self.lookup(value)) for value in values)
+
+
+class IndicatorFilter(_IndicatorStore):
+    """
+    Bloom filter of the values of MISP attributes (indicators such as hashes,
+    IP addresses, domains, and URLs), which answers that a value is not known
+    to MISP without a call to the MISP server. Values which may be known to
+    MISP are searched for on the MISP server.
+
+    A Bloom filter takes far less memory than an :class:`IndicatorIndex`,
+    but values cannot be removed from it. Values of deleted attributes
+    therefore remain in the filter (and are searched for on the MISP server)
+    until it is rebuilt (see :meth:`rebuild`).
+
+    Constructor parameters:
+
+    :param search_fn: Function which searches the MISP server for
+        attributes, invoked with the `values` to search for and the
+        parameters returned by :meth:`search_params`.
+    :param int capacity: The number of values which the filter is sized to
+        hold. When the filter is rebuilt, it is sized to hold at least as
+        many values as it did before.
+    :param float error_rate: The fraction of unknown values which are
+        searched for on the MISP server when the filter holds `capacity`
+        values.
+    :param set types: The attribute types to add to the filter. If empty or
+        `None`, all types are added.
+    :param bool to_ids_only: Whether or not to add only attributes whose
+        `to_ids` flag is set.
+    """
+    _SNAPSHOT_KIND = "bloom"
+
+    def __init__(self, search_fn, capacity, error_rate, types=None,
+                 to_ids_only=False):
+        super(IndicatorFilter, self).__init__(types, to_ids_only)
+        self._search_fn = search_fn
+        self._error_rate = error_rate
+        self._filter = BloomFilter(capacity, error_rate)
+        # The filter being rebuilt, or `None` if the filter is not being
+        # rebuilt.
+        self._next_filter = None
+
+    def __len__(self):
+        """
+        :return: The number of values added to the filter.
+        :rtype: int
+        """
+        return len(self._filter)
+
+    @property
+    def size(self):
+        """
+        The size of the filter, in bytes.
+        """
+        return self._filter.size
+
+    def _begin_rebuild(self):
+        with self._lock:
+            self._next_filter = BloomFilter(
+                max(self._filter.capacity, len(self._filter)),
+                self._error_rate)
+
+    def _end_rebuild(self, succeeded):
+        with self._lock:
+            if succeeded:
+                self._filter = self._next_filter
+            self._next_filter = None
+
+    def _snapshot_settings(self):
+        settings = super(IndicatorFilter, self)._snapshot_settings()
+        settings["error_rate"] = self._error_rate
+        return settings
+
+    def _snapshot_items(self):
+        bloom_filter = self._filter
+        return ({"capacity": bloom_filter.capacity,
+                 "count": len(bloom_filter)},
+                [bloom_filter.to_bytes()])
+
+    def _restore_items(self, meta, rows):
+        capacity = meta.get("capacity", 0)
+        if capacity < self._filter.capacity:
+            raise ValueError(
+                "Snapshot Bloom filter capacity is less than {}: {}".format(
+                    self._filter.capacity, capacity))
+        data = next(rows, None)
+        if data is None:
+            raise ValueError("Snapshot does not hold a Bloom filter")
+        bloom_filter = BloomFilter.from_bytes(
+            capacity, self._error_rate, meta.get("count", 0), data)
+        # Values added from notifications while the filter was restored are
+        # replaced, but they are newer than the snapshot, so the delta load
+        # which follows the restore adds them again.
+        with self._lock:
+            self._filter = bloom_filter
+        return len(bloom_filter)
+
+    def add_attribute(self, attribute):
+        """
+        Add the value of an attribute to the filter. Deleted attributes, and
+        attributes of types which are not added, are ignored.
+
+        :param dict attribute: The attribute, as returned by the MISP server.
+        :return: Whether or not the value was added.
+        :rtype: bool
+        """
+        keys, folded_keys = self._attribute_keys(attribute)
+        if not keys and not folded_keys:
+            return False
+        keys = keys.union(_FOLDED_KEY_PREFIX + key for key in folded_keys)
+        with self._lock:
+            filters = [self._filter]
+            if self._next_filter is not None:
+                filters.append(self._next_filter)
+            for bloom_filter in filters:
+                for key in keys:
+                    bloom_filter.add(key)
+        return True
+
+    def remove_attribute(self, attribute_id):
+        # Values cannot be removed from a Bloom filter. They are dropped when
+        # the filter is rebuilt.
+        pass
+
+    def remove_event(self, event_id):
+        pass
+
+    def might_contain(self, value):
+        """
+        :param str value: The value.
+        :return: `False` if the value is definitely not known to MISP,
+            otherwise `True`.
+        :rtype: bool
+        """
+        if not self._complete:
+            return True
+        key, folded_key = _lookup_keys(value)
+        bloom_filter = self._filter
+        return key in bloom_filter or \
+            _FOLDED_KEY_PREFIX + folded_key in bloom_filter
+
+    def lookup_values(self, values):
+        """
+        Find the attributes which match each of several values. See
+        :meth:`_IndicatorStore.lookup_values`. Values which may be known to
+        MISP are searched for, in a single call, on the MISP server.
+
+        :raises ValueError: If the MISP server reported an error.
+        """
+        results = dict((value, []) for value in values)
+        candidates = [value for value in results if self.might_contain(value)]
+        if candidates:
+            logger.debug("Searching MISP server for %d of %d lookup values",
+                         len(candidates), len(results))
+            params = self.search_params()
+            params["values"] = candidates
+            data = self._search_fn(**params)
+            candidate_keys = dict((value, _lookup_keys(value))
+                                  for value in candidates)
+            for attribute in self._find_attributes(data):
+                keys = self._attribute_keys(attribute)
+                if not any(keys):
+                    continue
+                summary = None
+                for value in candidates:
+                    if _keys_match(keys, candidate_keys[value]):
+                        summary = summary or _summarize(attribute)
+                        results[value].append(summary)
+        return results
@@ -0,0 +1,351 @@
+from __future__ import absolute_import
+import logging
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    # pylint: disable=import-error
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+# Configure local logger
+logger = logging.getLogger(__name__)
+
+# Use a monotonic clock for measuring durations where available (Python 3.3+).
+_now = getattr(time, "monotonic", time.time)
+
+#: Content type of the Prometheus text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+#: Default upper bounds, in seconds, of the buckets for duration histograms.
+#: The upper buckets accommodate slow searches on large MISP instances.
+DEFAULT_DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                            0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_value(value):
+    """
+    Format a sample value or bucket bound in the Prometheus text format.
+    """
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(label_names, label_values, extra=()):
+    """
+    Format a set of labels in the Prometheus text format.
+    """
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace(
+            '"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs) + "}"
+
+
+class _Metric(object):
+    """
+    Base class for a metric with a fixed set of label names. Each distinct
+    combination of label values has its own sample.
+    """
+    _TYPE = None
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def _label_values(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(
+                "Expected labels {} for metric {}: {}".format(
+                    ", ".join(self.label_names), self.name, labels))
+        return tuple(str(value) for value in labels)
+
+    def render(self):
+        """
+        :return: The lines describing the metric in the Prometheus text
+            format.
+        :rtype: list(str)
+        """
+        lines = ["# HELP {} {}".format(self.name, self.description),
+                 "# TYPE {} {}".format(self.name, self._TYPE)]
+        with self._lock:
+            samples = sorted(self._samples.items())
+        for label_values, sample in samples:
+            lines.extend(self._render_sample(label_values, sample))
+        return lines
+
+    def _render_sample(self, label_values, sample):
+        return ["{}{} {}".format(
+            self.name, _format_labels(self.label_names, label_values),
+            _format_value(sample))]
+
+
+class Counter(_Metric):
+    """
+    Metric whose value only ever increases, for example the number of
+    requests handled.
+    """
+    _TYPE = "counter"
+
+    def inc(self, *labels, **kwargs):
+        """
+        Increment the counter.
+
+        :param labels: The label values, in the order of the label names.
+        :param amount: Keyword argument with the amount by which to increment
+            the counter. Defaults to `1`.
+        """
+        label_values = self._label_values(labels)
+        amount = kwargs.get("amount", 1)
+        with self._lock:
+            self._samples[label_values] = \
+                self._samples.get(label_values, 0) + amount
+
+    def value(self, *labels):
+        """
+        :param labels: The label values, in the order of the label names.
+        :return: The current value of the counter.
+        """
+        label_values = self._label_values(labels)
+        with self._lock:
+            return self._samples.get(label_values, 0)
+
+
+class Gauge(_Metric):
+    """
+    Metric whose value is read, when the metrics are rendered, from a
+    function. The function returns either a single value (if the gauge has no
+    labels) or a `dict` mapping tuples of label values to values.
+    """
+    _TYPE = "gauge"
+
+    def __init__(self, name, description, value_fn, label_names=()):
+        super(Gauge, self).__init__(name, description, label_names)
+        self._value_fn = value_fn
+
+    def render(self):
+        try:
+            values = self._value_fn()
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.warning("Unable to read value for metric %s: %s",
+                           self.name, ex)
+            values = {}
+        if not isinstance(values, dict):
+            values = {(): values}
+        with self._lock:
+            self._samples = dict(
+                (self._label_values(labels), value)
+                for labels, value in values.items())
+        return super(Gauge, self).render()
+
+
+class Histogram(_Metric):
+    """
+    Metric which counts observed values, for example request durations, in
+    buckets with fixed upper bounds.
+    """
+    _TYPE = "histogram"
+
+    def __init__(self, name, description, label_names=(),
+                 buckets=DEFAULT_DURATION_BUCKETS):
+        super(Histogram, self).__init__(name, description, label_names)
+        self._buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, *labels):
+        """
+        Record an observed value.
+
+        :param value: The observed value.
+        :param labels: The label values, in the order of the label names.
+        """
+        label_values = self._label_values(labels)
+        with self._lock:
+            sample = self._samples.get(label_values)
+            if sample is None:
+                # Per-bucket counts, followed by the sum and the count.
+                sample = [0] * len(self._buckets) + [0.0, 0]
+                self._samples[label_values] = sample
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    sample[index] += 1
+                    break
+            sample[-2] += value
+            sample[-1] += 1
+
+    def _render_sample(self, label_values, sample):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets, sample):
+            cumulative += count
+            lines.append("{}_bucket{} {}".format(
+                self.name,
+                _format_labels(self.label_names, label_values,
+                               [("le", _format_value(bound))]),
+                cumulative))
+        labels = _format_labels(self.label_names, label_values)
+        lines.append("{}_sum{} {}".format(self.name, labels,
+                                          _format_value(sample[-2])))
+        lines.append("{}_count{} {}".format(self.name, labels, sample[-1]))
+        return lines
+
+
+class Timer(object):
+    """
+    Measures the time elapsed between consecutive calls to :meth:`lap` and
+    since the timer was created.
+    """
+    def __init__(self):
+        self._created = self._start = _now()
+
+    def lap(self):
+        """
+        :return: The number of seconds elapsed since the timer was created or
+            since the previous call to this method.
+        :rtype: float
+        """
+        now = _now()
+        elapsed = now - self._start
+        self._start = now
+        return elapsed
+
+    def total(self):
+        """
+        :return: The number of seconds elapsed since the timer was created.
+        :rtype: float
+        """
+        return _now() - self._created
+
+
+class MetricsRegistry(object):
+    """
+    Collection of metrics which can be rendered in the Prometheus text
+    exposition format.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self._metrics_by_name = {}
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics_by_name.get(name)
+            if metric is None:
+                metric = metric_class(name, *args, **kwargs)
+                self._metrics.append(metric)
+                self._metrics_by_name[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(
+                    "Metric already registered with a different type: "
+                    "{}".format(name))
+            return metric
+
+    def counter(self, name, description, label_names=()):
+        """
+        Get the counter with the supplied name, registering it if necessary.
+
+        :param str name: The metric name.
+        :param str description: The help text for the metric.
+        :param label_names: The label names for the metric.
+        :rtype: Counter
+        """
+        return self._register(Counter, name, description, label_names)
+
+    def gauge(self, name, description, value_fn, label_names=()):
+        """
+        Get the gauge with the supplied name, registering it if necessary.
+
+        :param str name: The metric name.
+        :param str description: The help text for the metric.
+        :param value_fn: Function which returns the value(s) of the gauge.
+            See :class:`Gauge`.
+        :param label_names: The label names for the metric.
+        :rtype: Gauge
+        """
+        return self._register(Gauge, name, description, value_fn,
+                              label_names)
+
+    def histogram(self, name, description, label_names=(),
+                  buckets=DEFAULT_DURATION_BUCKETS):
+        """
+        Get the histogram with the supplied name, registering it if
+        necessary.
+
+        :param str name: The metric name.
+        :param str description: The help text for the metric.
+        :param label_names: The label names for the metric.
+        :param buckets: The upper bounds of the histogram buckets.
+        :rtype: Histogram
+        """
+        return self._register(Histogram, name, description, label_names,
+                              buckets)
+
+    def render(self):
+        """
+        :return: All of the metrics in the Prometheus text exposition format.
+        :rtype: str
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHttpServer(object):
+    """
+    HTTP server, running on a background thread, from which the metrics in
+    a registry can be scraped.
+
+    Constructor parameters:
+
+    :param MetricsRegistry registry: The registry.
+    :param str host: The host name or IP address on which to listen.
+    :param int port: The port on which to listen.
+    """
+    def __init__(self, registry, host, port):
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                logger.debug("Metrics request from %s: %s",
+                             self.address_string(), format % args)
+
+        self._server = HTTPServer((host, port), _Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="MetricsHttpServer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def port(self):
+        """
+        The port on which the server is listening.
+        """
+        return self._server.server_address[1]
+
+    def close(self):
+        """
+        Stop the server.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
@@ -0,0 +1,624 @@
+from __future__ import absolute_import
+from collections import deque, namedtuple
+import functools
+import logging
+import sys
+import threading
+import time
+
+from dxlmispservice._responsecache import visit_misp_objects
+from dxlmispservice._serialization import loads
+
+# Configure local logger
+logger = logging.getLogger(__name__)
+
+# Use a monotonic clock for batch deadlines where available (Python 3.3+).
+_now = getattr(time, "monotonic", time.time)
+
+
+#: How a MISP ZeroMQ notification for a topic should be processed:
+#:
+#: * `zeromq_topic` - The ZeroMQ topic, as a `str`.
+#: * `event_topic` - The DXL topic to which notifications should be forwarded,
+#:   or `None` if they should not be forwarded.
+#: * `invalidate_cache` - Whether or not cached responses should be evicted
+#:   for the MISP data included in notifications.
+#: * `update_index` - Whether or not the attributes included in notifications
+#:   should be applied to the indicator index.
+NotificationRoute = namedtuple(
+    "NotificationRoute", ["zeromq_topic", "event_topic", "invalidate_cache",
+                          "update_index"])
+
+
+def split_notification(message, max_topic_length):
+    """
+    Split a raw MISP ZeroMQ message into its topic and payload without
+    copying the payload.
+
+    :param message: The message, as received from the ZeroMQ socket with
+        `copy=False`.
+    :type message: zmq.Frame
+    :param int max_topic_length: Length, in bytes, of the longest topic of
+        interest. Only this many bytes (plus one for the delimiter) are
+        examined for the delimiter between the topic and the payload.
+    :return: A tuple containing the topic (as `bytes`) as the first element
+        and the payload (as a `memoryview` over the message) as the second
+        element, or `None` if no topic of up to `max_topic_length` bytes could
+        be found.
+    :rtype: (bytes, memoryview)
+    """
+    buf = message.buffer
+    topic_length = buf[:max_topic_length + 1].tobytes().find(b" ")
+    if topic_length < 0:
+        return None
+    return buf[:topic_length].tobytes(), buf[topic_length + 1:]
+
+
+def decode_json_payload(payload):
+    """
+    Decode a JSON notification payload.
+
+    :param payload: The JSON payload as `str`, `bytes`, or `memoryview`.
+    :return: The decoded payload.
+    """
+    return loads(payload)
+
+
+def is_empty_payload(payload):
+    """
+    Determine whether a notification payload is empty (or holds only
+    whitespace), in which case it does not hold a JSON document.
+
+    :param payload: The payload as `str`, `bytes`, or `memoryview`.
+    :return: True if the payload is empty.
+    :rtype: bool
+    """
+    if not len(payload):
+        return True
+    first = payload[:1]
+    if isinstance(first, memoryview):
+        first = first.tobytes()
+    if not first.isspace():
+        return False
+    if isinstance(payload, memoryview):
+        payload = payload.tobytes()
+    return not payload.strip()
+
+
+def join_json_payloads(payloads):
+    """
+    Combine JSON documents into a single JSON array without decoding them.
+
+    :param list payloads: The JSON documents, all either `str` or bytes-like
+        objects (`bytes` or `memoryview`).
+    :return: The JSON array, as `str` if the documents are `str`, else as
+        `bytes`.
+    """
+    if isinstance(payloads[0], (bytes, memoryview)):
+        if sys.version_info[0] < 3:
+            payloads = [payload.tobytes()
+                        if isinstance(payload, memoryview) else payload
+                        for payload in payloads]
+        return b"[" + b",".join(payloads) + b"]"
+    return "[" + ",".join(payloads) + "]"
+
+
+def _add_filter_values(values, object_type, obj):
+    """
+    Add the values which notification filters can match for a single MISP
+    object (event, attribute, etc.) to the supplied `dict` of sets.
+    """
+    if object_type == "Event":
+        for field in ("org_id", "orgc_id"):
+            if obj.get(field):
+                values["orgs"].add(str(obj[field]))
+        if obj.get("threat_level_id") is not None:
+            values["threat_levels"].add(str(obj["threat_level_id"]))
+        if obj.get("distribution") is not None:
+            values["distributions"].add(str(obj["distribution"]))
+    elif object_type in ("Org", "Orgc"):
+        for field in ("id", "name", "uuid"):
+            if obj.get(field):
+                values["orgs"].add(str(obj[field]))
+    elif object_type == "Attribute":
+        if obj.get("type"):
+            values["attribute_types"].add(obj["type"])
+        if obj.get("distribution") is not None:
+            values["distributions"].add(str(obj["distribution"]))
+    elif object_type == "Tag":
+        if obj.get("name"):
+            values["tags"].add(obj["name"])
+
+
+def extract_filter_values(data):
+    """
+    Extract the values which notification filters can match from MISP data,
+    for example the content of a MISP ZeroMQ notification.
+
+    :param data: The MISP data (as decoded from JSON).
+    :return: The values, keyed by the name of the corresponding
+        :class:`NotificationFilter` constructor parameter.
+    :rtype: dict(str, set(str))
+    """
+    values = dict((name, set()) for name in NotificationFilter.CRITERIA)
+    visit_misp_objects(data, functools.partial(_add_filter_values, values))
+    return values
+
+
+class NotificationFilter(object):
+    """
+    Determines which MISP ZeroMQ notifications should be forwarded to the
+    DXL fabric. A notification matches the filter if, for each criterion for
+    which values were supplied, the notification includes at least one of
+    those values. Notifications which do not include any value for a
+    criterion, for example an attribute notification which does not include
+    the threat level of its event, do not match that criterion.
+
+    Constructor parameters:
+
+    :param orgs: Names, ids, or UUIDs of the organisations which own or
+        created the MISP event.
+    :param tags: Names of tags on the MISP event or any of its attributes.
+    :param threat_levels: Threat level ids of the MISP event.
+    :param distributions: Distribution levels of the MISP event or any of its
+        attributes.
+    :param attribute_types: Types of any of the MISP attributes.
+    """
+
+    #: Names of the criteria by which notifications can be filtered.
+    CRITERIA = ("orgs", "tags", "threat_levels", "distributions",
+                "attribute_types")
+
+    def __init__(self, orgs=None, tags=None, threat_levels=None,
+                 distributions=None, attribute_types=None):
+        criteria = (orgs, tags, threat_levels, distributions, attribute_types)
+        self._criteria = [(name, frozenset(str(value) for value in values))
+                          for name, values in zip(self.CRITERIA, criteria)
+                          if values]
+
+    def __bool__(self):
+        return bool(self._criteria)
+
+    __nonzero__ = __bool__
+
+    def __str__(self):
+        return ", ".join("{}: {}".format(name, ", ".join(sorted(values)))
+                         for name, values in self._criteria)
+
+    def matches(self, data):
+        """
+        Determine whether or not a notification matches the filter.
+
+        :param data: The content of the notification (as decoded from JSON).
+        :return: `True` if the notification matches the filter.
+        :rtype: bool
+        """
+        if not self._criteria:
+            return True
+        values = extract_filter_values(data)
+        for name, accepted in self._criteria:
+            if accepted.isdisjoint(values[name]):
+                return False
+        return True
+
+
+class NotificationBatcher(object):
+    """
+    Collects notification payloads per DXL topic and sends each collection as
+    a single JSON array payload once it holds `max_size` payloads or once its
+    first payload has been held for `window` seconds, whichever comes first.
+
+    Constructor parameters:
+
+    :param send_fn: Function invoked with the DXL topic and JSON array payload
+        for each batch to send.
+    :param int max_size: Maximum number of payloads to include in a batch.
+    :param float window: Maximum number of seconds to hold a payload before
+        sending the batch which contains it.
+    """
+    def __init__(self, send_fn, max_size, window):
+        if max_size < 2:
+            raise ValueError(
+                "Batch size must be greater than 1: {}".format(max_size))
+        if window <= 0:
+            raise ValueError(
+                "Batch window must be greater than 0: {}".format(window))
+        self._send_fn = send_fn
+        self._max_size = max_size
+        self._window = window
+        self._condition = threading.Condition()
+        self._batches = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._flush_expired_batches)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add(self, topic, payload):
+        """
+        Add a payload to the batch for a topic, sending the batch if it is
+        full.
+
+        :param str topic: The DXL topic.
+        :param payload: The JSON payload.
+        """
+        if is_empty_payload(payload):
+            # An empty payload would make the JSON array of the batch invalid.
+            logger.warning("Dropping empty notification for %s", topic)
+            return
+        with self._condition:
+            if self._closed:
+                logger.debug("Batcher closed, dropping notification for %s",
+                             topic)
+                return
+            batch = self._batches.get(topic)
+            if batch is None:
+                batch = (_now() + self._window, [])
+                self._batches[topic] = batch
+                self._condition.notify()
+            batch[1].append(payload)
+            if len(batch[1]) < self._max_size:
+                return
+            del self._batches[topic]
+        self._send(topic, batch[1])
+
+    def close(self):
+        """
+        Send any pending batches and stop the thread which sends batches whose
+        window has elapsed.
+        """
+        with self._condition:
+            self._closed = True
+            batches = self._batches
+            self._batches = {}
+            self._condition.notify()
+        for topic, (_, payloads) in batches.items():
+            self._send(topic, payloads)
+        self._thread.join()
+
+    def _send(self, topic, payloads):
+        """
+        Send a batch of payloads.
+        """
+        logger.debug("Sending batch of %d notifications to %s ...",
+                     len(payloads), topic)
+        try:
+            self._send_fn(topic, join_json_payloads(payloads))
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.exception("Error sending batch of notifications to %s: %s",
+                             topic, ex)
+
+    def _flush_expired_batches(self):
+        """
+        Send batches whose window has elapsed. Runs until the batcher is
+        closed.
+        """
+        while True:
+            with self._condition:
+                while not self._closed:
+                    now = _now()
+                    expired = [topic for topic, (deadline, _)
+                               in self._batches.items() if deadline <= now]
+                    if expired:
+                        break
+                    next_deadline = min(
+                        deadline for deadline, _ in self._batches.values()) \
+                        if self._batches else None
+                    self._condition.wait(
+                        None if next_deadline is None
+                        else next_deadline - now)
+                if self._closed:
+                    return
+                batches = [(topic, self._batches.pop(topic)[1])
+                           for topic in expired]
+            for topic, payloads in batches:
+                self._send(topic, payloads)
+
+
+class NotificationDispatcher(object):
+    """
+    Bounded queue of notifications which is drained by a pool of worker
+    threads. This decouples the thread which receives notifications from
+    the (potentially slow) processing of each notification.
+
+    When the queue is full, the `overflow_policy` determines what happens to
+    a newly received notification:
+
+    * :attr:`OVERFLOW_BLOCK` - The caller of :meth:`put` waits until space
+      is available in the queue.
+    * :attr:`OVERFLOW_DROP_OLDEST` - The oldest queued notification is
+      dropped to make room for the new notification.
+    * :attr:`OVERFLOW_DROP_NEWEST` - The new notification is dropped.
+
+    Constructor parameters:
+
+    :param handler_fn: Function invoked on a worker thread with the arguments
+        of each call to :meth:`put`.
+    :param int queue_size: Maximum number of notifications to queue.
+    :param int worker_count: Number of worker threads. Notifications are
+        handled in the order in which they were queued only if this is `1`.
+    :param str overflow_policy: The overflow policy.
+    :param drop_fn: Optional function invoked with the arguments of each
+        call to :meth:`put` whose notification is dropped.
+    """
+
+    #: Overflow policy which blocks until space is available in the queue.
+    OVERFLOW_BLOCK = "block"
+    #: Overflow policy which drops the oldest queued notification.
+    OVERFLOW_DROP_OLDEST = "drop-oldest"
+    #: Overflow policy which drops the newly received notification.
+    OVERFLOW_DROP_NEWEST = "drop-newest"
+    #: All supported overflow policies.
+    OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST,
+                         OVERFLOW_DROP_NEWEST)
+
+    #: Number of dropped notifications between warning messages.
+    _DROP_LOG_INTERVAL = 1000
+
+    def __init__(self, handler_fn, queue_size, worker_count,
+                 overflow_policy=OVERFLOW_BLOCK, drop_fn=None):
+        if queue_size < 1:
+            raise ValueError(
+                "Queue size must be greater than 0: {}".format(queue_size))
+        if worker_count < 1:
+            raise ValueError(
+                "Worker count must be greater than 0: {}".format(
+                    worker_count))
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(
+                "Overflow policy must be one of {}: {}".format(
+                    ", ".join(self.OVERFLOW_POLICIES), overflow_policy))
+        self._handler_fn = handler_fn
+        self._drop_fn = drop_fn
+        self._queue_size = queue_size
+        self._overflow_policy = overflow_policy
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+        self._counters = dict.fromkeys(
+            ("queued", "handled", "failed", "blocked", "dropped_oldest",
+             "dropped_newest"), 0)
+        self._workers = []
+        for worker_index in range(worker_count):
+            worker = threading.Thread(
+                target=self._run_worker,
+                name="NotificationWorker-{}".format(worker_index))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    @property
+    def counters(self):
+        """
+        A snapshot of the counters maintained by the dispatcher, as a `dict`:
+
+        * `queued` - Number of notifications added to the queue.
+        * `handled` - Number of notifications handled successfully.
+        * `failed` - Number of notifications whose handler raised an error.
+        * `blocked` - Number of calls to :meth:`put` which had to wait for
+          space in the queue.
+        * `dropped_oldest` - Number of queued notifications dropped to make
+          room for a newer one.
+        * `dropped_newest` - Number of new notifications dropped because the
+          queue was full.
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def qsize(self):
+        """
+        :return: The number of notifications currently queued.
+        :rtype: int
+        """
+        with self._lock:
+            return len(self._queue)
+
+    def put(self, *args):
+        """
+        Queue a notification, applying the overflow policy if the queue is
+        full.
+
+        :param args: Arguments to pass to the handler function.
+        :return: Whether or not the notification was queued.
+        :rtype: bool
+        """
+        dropped = None
+        with self._lock:
+            if self._closed:
+                return False
+            if len(self._queue) >= self._queue_size:
+                if self._overflow_policy == self.OVERFLOW_DROP_NEWEST:
+                    self._counters["dropped_newest"] += 1
+                    dropped = args
+                elif self._overflow_policy == self.OVERFLOW_DROP_OLDEST:
+                    self._counters["dropped_oldest"] += 1
+                    dropped = self._queue.popleft()
+                else:
+                    self._counters["blocked"] += 1
+                    while len(self._queue) >= self._queue_size and \
+                            not self._closed:
+                        self._not_full.wait()
+                    if self._closed:
+                        return False
+            if dropped is not args:
+                self._queue.append(args)
+                self._counters["queued"] += 1
+                self._not_empty.notify()
+            dropped_total = self._counters["dropped_oldest"] + \
+                self._counters["dropped_newest"]
+        if dropped is not None:
+            self._on_drop(dropped, dropped_total)
+        return dropped is not args
+
+    def close(self):
+        """
+        Stop accepting notifications, wait for the workers to handle the
+        notifications remaining in the queue, and stop the workers.
+        """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        for worker in self._workers:
+            worker.join()
+        logger.info("Notification dispatcher counters: %s",
+                    ", ".join("{}={}".format(name, value) for name, value
+                              in sorted(self.counters.items())))
+
+    def _on_drop(self, args, dropped_total):
+        """
+        Report a dropped notification.
+        """
+        if dropped_total == 1 or \
+                dropped_total % self._DROP_LOG_INTERVAL == 0:
+            logger.warning(
+                "Notification queue full (size: %d, policy: %s), %d "
+                "notifications dropped so far", self._queue_size,
+                self._overflow_policy, dropped_total)
+        if self._drop_fn:
+            try:
+                self._drop_fn(*args)
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.exception("Error handling dropped notification: %s",
+                                 ex)
+
+    def _run_worker(self):
+        """
+        Handle queued notifications until the dispatcher is closed and the
+        queue is empty.
+        """
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._not_empty.wait()
+                if not self._queue:
+                    return
+                args = self._queue.popleft()
+                self._not_full.notify()
+            try:
+                self._handler_fn(*args)
+                succeeded = True
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.exception("Error handling notification: %s", ex)
+                succeeded = False
+            with self._lock:
+                self._counters["handled" if succeeded else "failed"] += 1
+
+
+class NotificationGapDetector(object):
+    """
+    Detects gaps in the stream of MISP ZeroMQ notifications, during which
+    notifications may have been lost. ZeroMQ PUB/SUB sockets reconnect
+    silently and drop messages which cannot be delivered, so the loss of
+    notifications is inferred from:
+
+    * A stall - no message (including the `misp_json_self` heartbeats which
+      the MISP ZeroMQ server publishes periodically) has been received for
+      `stall_timeout` seconds, for example because the connection to the
+      MISP ZeroMQ server was lost.
+    * A restart of the MISP ZeroMQ server - the `uptime` in a heartbeat is
+      less than that in the previous heartbeat.
+    * A dropped notification - see :meth:`add_gap`.
+
+    A gap is reported by :meth:`take_gap` once messages are being received
+    again.
+
+    Constructor parameters:
+
+    :param float stall_timeout: The number of seconds without any message
+        after which the stream is considered to have stalled.
+    :param time_fn: Function which returns the current time, in seconds since
+        the epoch.
+    """
+    def __init__(self, stall_timeout, time_fn=time.time):
+        if stall_timeout <= 0:
+            raise ValueError(
+                "Stall timeout must be greater than 0: {}".format(
+                    stall_timeout))
+        self._stall_timeout = stall_timeout
+        self._time_fn = time_fn
+        self._lock = threading.Lock()
+        self._last_seen = time_fn()
+        self._last_uptime = None
+        self._gap_start = None
+
+    @property
+    def stalled(self):
+        """
+        Whether or not no message has been received for `stall_timeout`
+        seconds.
+        """
+        return self._time_fn() - self._last_seen > self._stall_timeout
+
+    def received(self):
+        """
+        Record the receipt of a message.
+        """
+        with self._lock:
+            self._received(self._time_fn())
+
+    def heartbeat(self, data):
+        """
+        Record the receipt of a `misp_json_self` heartbeat.
+
+        :param data: The content of the heartbeat (as decoded from JSON).
+        """
+        uptime = data.get("uptime") if isinstance(data, dict) else None
+        try:
+            uptime = None if uptime is None else float(uptime)
+        except (TypeError, ValueError):
+            uptime = None
+        with self._lock:
+            if uptime is not None:
+                if self._last_uptime is not None and \
+                        uptime < self._last_uptime:
+                    logger.warning("MISP ZeroMQ server restarted, "
+                                   "notifications may have been lost")
+                    self._add_gap(self._last_seen)
+                self._last_uptime = uptime
+            self._received(self._time_fn())
+
+    def _received(self, now):
+        """
+        Record the receipt of a message. Must be called with the lock held.
+        """
+        if now - self._last_seen > self._stall_timeout:
+            self._add_gap(self._last_seen)
+        self._last_seen = now
+
+    def add_gap(self, start=None):
+        """
+        Record that notifications may have been lost.
+
+        :param float start: The time (in seconds since the epoch) from which
+            notifications may have been lost. If `None`, the current time is
+            used.
+        """
+        with self._lock:
+            self._add_gap(self._time_fn() if start is None else start)
+
+    def _add_gap(self, start):
+        """
+        Record that notifications may have been lost. Must be called with
+        the lock held.
+        """
+        if self._gap_start is None or start < self._gap_start:
+            self._gap_start = start
+
+    def take_gap(self):
+        """
+        Take the gap which has been detected, if any, unless the stream is
+        still stalled.
+
+        :return: The time (in seconds since the epoch) from which
+            notifications may have been lost, or `None` if there is no gap
+            (or the stream is stalled).
+        :rtype: float
+        """
+        with self._lock:
+            if self._gap_start is None or \
+                    self._time_fn() - self._last_seen > self._stall_timeout:
+                return None
+            gap_start, self._gap_start = self._gap_start, None
+            return gap_start
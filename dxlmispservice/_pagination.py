@@ -0,0 +1,171 @@
+from __future__ import absolute_import
+import logging
+import threading
+
+from dxlmispservice._streaming import find_stream_items
+
+# Configure local logger
+logger = logging.getLogger(__name__)
+
+#: Request parameters which, if present, disable automatic pagination since
+#: the caller is paging through the results itself.
+_PAGING_PARAMS = ("limit", "page")
+
+#: Field set to `True` in the result of a search whose results were cut off
+#: after `max_pages` pages.
+TRUNCATED_FIELD = "truncated"
+
+
+class SearchPaginator(object):
+    """
+    Pages through the results of a MISP search using its `limit` and `page`
+    parameters, so that no single call to the MISP server has to return all
+    of the results at once.
+
+    Constructor parameters:
+
+    :param search_fn: The search function, invoked with the parameters of
+        the request plus `limit` and `page`.
+    :param int page_size: The number of results to request in each page.
+    :param int parallel_pages: The maximum number of pages to request from
+        the MISP server at the same time.
+    :param int max_pages: The maximum number of pages to request. If `0`,
+        pages are requested until one is not full.
+    """
+    def __init__(self, search_fn, page_size, parallel_pages=1, max_pages=0):
+        if page_size < 1:
+            raise ValueError(
+                "Page size must be greater than 0: {}".format(page_size))
+        if parallel_pages < 1:
+            raise ValueError(
+                "Number of parallel pages must be greater than 0: {}".format(
+                    parallel_pages))
+        if max_pages < 0:
+            raise ValueError(
+                "Maximum number of pages must not be negative: {}".format(
+                    max_pages))
+        self._search_fn = search_fn
+        self._page_size = page_size
+        self._parallel_pages = parallel_pages
+        self._max_pages = max_pages
+
+    @staticmethod
+    def applies_to(request_dict):
+        """
+        :param dict request_dict: The parameters of a search request.
+        :return: Whether or not the results of the request should be paged
+            automatically.
+        :rtype: bool
+        """
+        return not any(param in request_dict for param in _PAGING_PARAMS)
+
+    def pages(self, request_dict):
+        """
+        Request the pages of results for a search, in order. Pages are
+        requested until one is not full, `max_pages` have been requested, or
+        one does not contain a list of results (for example, because the MISP
+        server reported an error). Up to `parallel_pages` pages are requested
+        at the same time, so up to `parallel_pages - 1` pages beyond the last
+        one may be requested, but these are discarded.
+
+        If the page at `max_pages` is full, so that there may be more
+        results, :data:`TRUNCATED_FIELD` is set to `True` in its data.
+
+        :param dict request_dict: The parameters of the search.
+        :return: A generator which yields the data returned for each page.
+        """
+        page = 1
+        while True:
+            batch_size = self._parallel_pages
+            if self._max_pages:
+                batch_size = min(batch_size, self._max_pages - page + 1)
+            results = self._fetch(request_dict, page, batch_size)
+            for data in results:
+                items = find_stream_items(data)
+                full = items is not None and len(items) >= self._page_size
+                if full and page == self._max_pages:
+                    logger.warning(
+                        "Stopped paging through search results after %d "
+                        "pages", self._max_pages)
+                    data[TRUNCATED_FIELD] = True
+                yield data
+                if not full:
+                    return
+                page += 1
+            if self._max_pages and page > self._max_pages:
+                return
+
+    def search(self, request_dict):
+        """
+        Request all of the pages of results for a search and merge them into
+        a single result, of the same form as the result for an unpaged
+        search. If the results were cut off after `max_pages` pages,
+        :data:`TRUNCATED_FIELD` is set to `True` in the merged result.
+
+        :param dict request_dict: The parameters of the search.
+        :return: The merged result.
+        """
+        merged = None
+        merged_items = None
+        for data in self.pages(request_dict):
+            items = find_stream_items(data)
+            if merged is None:
+                merged, merged_items = data, items
+            elif items is None:
+                # A later page failed, so the merged result would be
+                # incomplete.
+                return data
+            else:
+                merged_items.extend(items)
+                if data.get(TRUNCATED_FIELD):
+                    merged[TRUNCATED_FIELD] = True
+        return merged
+
+    def _fetch(self, request_dict, first_page, count):
+        """
+        Request a batch of consecutive pages, at the same time if there is
+        more than one.
+
+        :return: The data returned for each page, in page order.
+        :rtype: list
+        """
+        if count == 1:
+            return [self._fetch_page(request_dict, first_page)]
+        results = [None] * count
+        errors = [None] * count
+
+        def fetch(index):
+            try:
+                results[index] = self._fetch_page(request_dict,
+                                                  first_page + index)
+            except Exception as ex:  # pylint: disable=broad-except
+                errors[index] = ex
+
+        threads = [threading.Thread(target=fetch, args=(index,))
+                   for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for index, error in enumerate(errors):
+            if error is not None:
+                # Report the first failure, ignoring pages requested after it.
+                results = results[:index]
+                if not results:
+                    raise error
+                logger.warning("Error requesting page %d of search results: "
+                               "%s", first_page + index, error)
+                results.append({"errors": [str(error)]})
+                break
+        return results
+
+    def _fetch_page(self, request_dict, page):
+        """
+        Request a single page of results.
+        """
+        logger.debug("Requesting page %d of search results (page size: %d)",
+                     page, self._page_size)
+        params = dict(request_dict)
+        params["limit"] = self._page_size
+        params["page"] = page
+        return self._search_fn(**params)
@@ -1,25 +1,344 @@
 from __future__ import absolute_import
+import functools
 import logging
+import threading
 
 from dxlbootstrap.util import MessageUtils
 from dxlclient.callbacks import RequestCallback
-from dxlclient.message import ErrorResponse, Response
+from dxlclient.message import ErrorResponse, Event, Response
+from dxlmispservice._compression import compress_message, \
+    decompress_message, pop_compression_option
+from dxlmispservice._executor import RejectedError
+from dxlmispservice._metrics import Timer
+from dxlmispservice._pagination import TRUNCATED_FIELD
+from dxlmispservice._responsecache import ResponseCache, \
+    extract_data_references, extract_request_references
+from dxlmispservice._serialization import dumps, payload_to_dict
+from dxlmispservice._streaming import StreamPublisher, find_stream_items, \
+    pop_stream_options
 
 # Configure local logger
 logger = logging.getLogger(__name__)
 
 
+def normalize_request_dict(request_dict):
+    """
+    Convert the parameters of a request, in place, to the types expected by
+    the MISP API methods.
+
+    :param dict request_dict: The decoded request payload.
+    """
+    if "event" in request_dict and \
+            type(request_dict["event"]).__name__ in ("str", "unicode") and \
+            request_dict["event"].isdigit():
+        request_dict["event"] = int(request_dict["event"])
+
+
 class MispServiceRequestCallback(RequestCallback):
     """
     Constructor parameters:
 
     :param dxlmispservice.app.MispService app: The Misp service application
     :param api_method: Method or function to invoke when a request is received.
+    :param dxlmispservice._responsecache.ResponseCache response_cache: Cache
+        in which to store successful responses for the API method. If `None`,
+        responses are not cached.
+    :param dxlmispservice._singleflight.SingleFlight single_flight: Used to
+        coalesce requests with equivalent payloads which arrive while a call
+        to the API method for the same payload is still in flight. If `None`,
+        requests are not coalesced.
+    :param dxlmispservice._metrics.MetricsRegistry metrics: Registry in which
+        to record request metrics. If `None`, metrics are not recorded.
+    :param dxlmispservice._executor.ApiExecutor executor: Executor on which to
+        call the API method. If `None`, the API method is called on the thread
+        which invokes the callback.
+    :param str stream_topic_prefix: Prefix of the DXL topics to which results
+        are published for requests which ask for their result to be streamed
+        (see :mod:`dxlmispservice._streaming`). If `None`, results are not
+        streamed.
+    :param dxlmispservice._pagination.SearchPaginator paginator: Used to page
+        through the results of the API method (which must be a search). If
+        `None`, results are not paged.
     """
-    def __init__(self, app, api_method):
+
+    #: Name of the histogram of the time spent in each phase of handling a
+    #: request.
+    PHASE_SECONDS_METRIC = "dxlmispservice_request_phase_seconds"
+    #: Name of the counter of handled requests.
+    REQUESTS_METRIC = "dxlmispservice_requests_total"
+
+    def __init__(self, app, api_method, response_cache=None,
+                 single_flight=None, metrics=None, executor=None,
+                 stream_topic_prefix=None, paginator=None):
         super(MispServiceRequestCallback, self).__init__()
         self._app = app
         self._api_method = api_method
+        self._api_name = api_method.__name__
+        self._response_cache = response_cache
+        self._single_flight = single_flight
+        self._executor = executor
+        self._stream_topic_prefix = stream_topic_prefix
+        self._paginator = paginator
+        self._phase_seconds, self._requests = self.register_metrics(metrics)
+
+    @classmethod
+    def register_metrics(cls, metrics):
+        """
+        Register the request metrics.
+
+        :param dxlmispservice._metrics.MetricsRegistry metrics: The registry
+            in which to record request metrics, or `None`.
+        :return: A tuple containing the histogram of the time spent in each
+            phase of handling a request and the counter of handled requests,
+            or `None` for both if `metrics` is `None`.
+        :rtype: (dxlmispservice._metrics.Histogram,
+            dxlmispservice._metrics.Counter)
+        """
+        if metrics is None:
+            return None, None
+        return (
+            metrics.histogram(
+                cls.PHASE_SECONDS_METRIC,
+                "Time spent in each phase of handling a request: decode "
+                "(request payload), queue (waiting for an API worker), call "
+                "(MISP API), encode (response payload), send (response), and "
+                "total.",
+                ("api", "phase")),
+            metrics.counter(
+                cls.REQUESTS_METRIC,
+                "Handled requests by result: success, cached, coalesced, "
+                "misp_error, rejected, or error.",
+                ("api", "result")))
+
+    def _observe(self, timer, phase):
+        """
+        Record the time elapsed in a phase of handling a request, if metrics
+        are enabled.
+        """
+        if timer is not None:
+            self._phase_seconds.observe(timer.lap(), self._api_name, phase)
+
+    def _invoke_api_method(self, request_dict, cache_key, cache_generation):
+        """
+        Invoke the API method and serialize the data it returns.
+
+        :param dict request_dict: The parameters for the API method.
+        :param str cache_key: Key under which to store a successful response
+            in the response cache. If `None`, the response is not cached.
+        :param int cache_generation: The generation of the response cache
+            at the time the request was received.
+        :return: A tuple containing the serialized response payload as the
+            first element and, as the second element, an error message if the
+            MISP server reported an error or `None` if the call succeeded.
+        :rtype: (bytes, str)
+        """
+        timer = Timer() if self._phase_seconds is not None else None
+        if self._is_paged(request_dict):
+            response_data = self._paginator.search(request_dict)
+        else:
+            response_data = self._api_method(**request_dict)
+        self._observe(timer, "call")
+        error_message = None
+        if isinstance(response_data, dict) and \
+                response_data.get("errors", None):
+            error_message = str(response_data["errors"][0])
+        payload = dumps(response_data)
+        self._observe(timer, "encode")
+        if cache_key is not None and error_message is None:
+            references = extract_request_references(request_dict)
+            references.update(extract_data_references(response_data))
+            self._response_cache.put(cache_key, payload, references,
+                                     cache_generation)
+        return payload, error_message
+
+    def _invoke_api_method_streaming(self, request_dict, stream_options,
+                                     compression=None):
+        """
+        Invoke the API method and publish the items in the data it returns
+        to a stream. If the results of the API method are paged, the items in
+        each page are published as soon as the page has been received.
+
+        :param dict request_dict: The parameters for the API method.
+        :param tuple stream_options: The stream identifier and chunk size.
+        :param str compression: The name of the codec with which to compress
+            the payloads of the stream events, or `None`.
+        :return: A tuple containing the serialized response payload as the
+            first element and, as the second element, an error message if the
+            MISP server reported an error or `None` if the call succeeded.
+            The response payload is a summary of the stream or, if the data
+            does not contain a list of items, the data itself. If a page
+            fails after chunks have been published, the response payload
+            holds both the error and the summary of the stream. The summary
+            of a paged search which was cut off after the maximum number of
+            pages is marked as truncated.
+        :rtype: (bytes, str)
+        """
+        timer = Timer() if self._phase_seconds is not None else None
+        call_seconds = encode_seconds = 0
+        if self._is_paged(request_dict):
+            pages = self._paginator.pages(request_dict)
+        else:
+            pages = iter([self._api_method(**request_dict)])
+        stream_id, chunk_size = stream_options
+        publisher = None
+        response_data = None
+        error_message = None
+        truncated = False
+        try:
+            for data in pages:
+                if timer is not None:
+                    call_seconds += timer.lap()
+                if isinstance(data, dict) and data.get("errors", None):
+                    response_data = data
+                    error_message = str(data["errors"][0])
+                    break
+                items = find_stream_items(data)
+                if items is None:
+                    if publisher is None:
+                        response_data = data
+                    break
+                if publisher is None:
+                    publisher = StreamPublisher(
+                        functools.partial(self._send_event,
+                                          compression=compression),
+                        "{}/{}".format(self._stream_topic_prefix, stream_id),
+                        stream_id, chunk_size)
+                publisher.add(items)
+                truncated = truncated or bool(data.get(TRUNCATED_FIELD))
+                if timer is not None:
+                    encode_seconds += timer.lap()
+        except Exception as ex:  # pylint: disable=broad-except
+            if publisher is None:
+                raise
+            # Some of the chunks have already been published, so report the
+            # failure along with the summary of the stream.
+            logger.warning("Error requesting results for stream %s: %s",
+                           stream_id, ex)
+            response_data = {"errors": [str(ex)]}
+            error_message = str(ex)
+        if publisher is not None:
+            # Publish any pending items, even if a later page failed, so that
+            # the summary accounts for every chunk which has been published.
+            summary = publisher.close()
+            if truncated:
+                summary[TRUNCATED_FIELD] = True
+            if response_data is None:
+                response_data = summary
+            else:
+                response_data = dict(response_data, **summary)
+        payload = dumps(response_data)
+        if timer is not None:
+            encode_seconds += timer.lap()
+            self._phase_seconds.observe(call_seconds, self._api_name, "call")
+            self._phase_seconds.observe(encode_seconds, self._api_name,
+                                        "encode")
+        return payload, error_message
+
+    def _is_paged(self, request_dict):
+        """
+        :param dict request_dict: The parameters for the API method.
+        :return: Whether or not the results of the API method should be
+            paged.
+        :rtype: bool
+        """
+        return self._paginator is not None and \
+            self._paginator.applies_to(request_dict)
+
+    def _send_event(self, topic, payload, compression=None):
+        """
+        Send an event to the DXL fabric.
+
+        :param str topic: The DXL topic for the event.
+        :param bytes payload: The payload for the event.
+        :param str compression: The name of the codec with which to compress
+            the payload, or `None`.
+        """
+        event = Event(topic)
+        event.payload = payload
+        compress_message(event, compression)
+        self._app.client.send_event(event)
+
+    def _prepare_call(self, topic, request_dict, stream_options,
+                      compression=None):
+        """
+        Look up the response for a request in the response cache and prepare
+        the call to the API method for it.
+
+        :param str topic: The DXL topic on which the request was received.
+        :param dict request_dict: The parameters for the API method.
+        :param tuple stream_options: The stream identifier and chunk size, or
+            `None` if the result is not streamed.
+        :param str compression: The name of the codec with which to compress
+            the payloads of the stream events, or `None`.
+        :return: A tuple containing a function (taking no arguments) which
+            invokes the API method and returns the serialized response payload
+            and error message, the key with which to coalesce the call with
+            equivalent calls (or `None`), and the cached response payload (or
+            `None`).
+        :rtype: (function, str, bytes)
+        """
+        request_key = None
+        if stream_options is None and (
+                self._response_cache is not None or
+                self._single_flight is not None):
+            request_key = ResponseCache.make_key(topic, request_dict)
+
+        cache_key = None
+        cache_generation = None
+        cached_payload = None
+        if request_key is not None and self._response_cache is not None:
+            cache_key = request_key
+            cache_generation = self._response_cache.generation
+            cached_payload = self._response_cache.get(cache_key)
+
+        if stream_options is not None:
+            # Streamed results are neither cached nor shared with other
+            # requests.
+            invoke = functools.partial(self._invoke_api_method_streaming,
+                                       request_dict, stream_options,
+                                       compression)
+        else:
+            invoke = functools.partial(self._invoke_api_method,
+                                       request_dict, cache_key,
+                                       cache_generation)
+        coalesce_key = request_key \
+            if self._single_flight is not None else None
+        return invoke, coalesce_key, cached_payload
+
+    def invoke_operation(self, topic, request_dict, complete):
+        """
+        Invoke the API method for an operation in a batch request, using the
+        response cache, coalescing, and executor as for a request received on
+        the topic of the API method. If the API method is called on the
+        executor, this method returns without waiting for the call to
+        complete.
+
+        :param str topic: The DXL topic of the API method.
+        :param dict request_dict: The parameters for the API method.
+        :param complete: Function invoked once the call completes. See
+            :meth:`_submit`. The result passed to the function may also be
+            `"cached"` if the response was found in the response cache.
+        :raises RejectedError: If the executor does not accept the call.
+        """
+        invoke, coalesce_key, cached_payload = self._prepare_call(
+            topic, request_dict, None)
+        if cached_payload is not None:
+            complete((cached_payload, None), None, "cached")
+        elif self._executor is not None:
+            self._submit(invoke, coalesce_key, complete)
+        else:
+            try:
+                if coalesce_key is not None:
+                    outcome, shared = self._single_flight.do(coalesce_key,
+                                                             invoke)
+                    result = "coalesced" if shared else None
+                else:
+                    outcome = invoke()
+                    result = None
+            except Exception as ex:  # pylint: disable=broad-except
+                complete(None, ex, None)
+                return
+            complete(outcome, None, result)
 
     def on_request(self, request):
         """
@@ -32,26 +351,624 @@ class MispServiceRequestCallback(RequestCallback):
         logger.debug("Payload for topic %s: %s", request.destination_topic,
                      request.payload)
 
+        timer = Timer() if self._phase_seconds is not None else None
         try:
-            request_dict = MessageUtils.json_payload_to_dict(request) \
+            decompress_message(request)
+            request_dict = payload_to_dict(request) \
                 if request.payload else {}
-            if "event" in request_dict and \
-                    type(request_dict["event"]).__name__ in ("str", "unicode") and \
-                    request_dict["event"].isdigit():
-                request_dict["event"] = int(request_dict["event"])
+            normalize_request_dict(request_dict)
+            compression = pop_compression_option(request_dict)
 
-            response_data = self._api_method(**request_dict)
-            if isinstance(response_data, dict) and \
-                    response_data.get("errors", None):
-                res = ErrorResponse(
-                    request, error_message=str(response_data["errors"][0]))
+            stream_options = None
+            if self._stream_topic_prefix is not None:
+                stream_options = pop_stream_options(request_dict)
+
+            invoke, coalesce_key, cached_payload = self._prepare_call(
+                request.destination_topic, request_dict, stream_options,
+                compression)
+            self._observe(timer, "decode")
+
+            if cached_payload is not None:
+                logger.debug("Returning cached response for topic %s",
+                             request.destination_topic)
+                res = self._create_response(request, cached_payload, None,
+                                            compression)
+                result = "cached"
+            elif self._executor is not None:
+                self._submit(invoke, coalesce_key,
+                             functools.partial(self._complete_request,
+                                               request, timer, compression),
+                             timer)
+                return
+            elif coalesce_key is not None:
+                (payload, error_message), shared = self._single_flight.do(
+                    coalesce_key, invoke)
+                if shared:
+                    logger.debug(
+                        "Returning response from coalesced request for "
+                        "topic %s", request.destination_topic)
+                res = self._create_response(request, payload, error_message,
+                                            compression)
+                result = "coalesced" if shared else None
+            else:
+                payload, error_message = invoke()
+                res = self._create_response(request, payload, error_message,
+                                            compression)
+                result = None
+        except RejectedError as ex:
+            logger.warning("Rejecting request on topic %s: %s",
+                           request.destination_topic, ex)
+            res = ErrorResponse(request,
+                                error_message=MessageUtils.encode(str(ex)))
+            result = "rejected"
+        except Exception as ex:
+            res = self._create_error_response(request, ex)
+            result = "error"
+
+        self._send_response(res, result, timer)
+
+    def _submit(self, invoke, coalesce_key, complete, timer=None):
+        """
+        Queue a call to the API method on the executor.
+
+        :param invoke: Function (taking no arguments) which invokes the API
+            method and returns the serialized response payload and error
+            message.
+        :param str coalesce_key: Key which identifies equivalent calls with
+            which the call may be coalesced. If `None`, the call is not
+            coalesced.
+        :param complete: Function invoked once the call completes, on the
+            thread which completed it, with the outcome of the call (a tuple
+            containing the serialized response payload and error message),
+            the exception raised by the call (or `None`), and the result for
+            the request metrics (`"coalesced"` if the outcome was shared from
+            an equivalent call, otherwise `None`).
+        :param dxlmispservice._metrics.Timer timer: Timer for recording
+            request metrics, or `None` if metrics are not recorded.
+        :raises RejectedError: If the executor does not accept the call.
+        """
+        call = None
+        if coalesce_key is not None:
+            call, leader = self._single_flight.begin(coalesce_key)
+            if not leader:
+                # Complete once the in-flight call completes, without
+                # occupying a thread in the meantime.
+                call.add_done_callback(
+                    lambda completed_call: self._complete_call(
+                        completed_call, complete))
+                return
+
+        def execute():
+            self._observe(timer, "queue")
+            try:
+                outcome = invoke()
+            except Exception as ex:  # pylint: disable=broad-except
+                if call is not None:
+                    self._single_flight.finish(coalesce_key, call,
+                                               exception=ex)
+                complete(None, ex, None)
+                return
+            if call is not None:
+                self._single_flight.finish(coalesce_key, call, outcome)
+            complete(outcome, None, None)
+
+        try:
+            self._executor.submit(self._api_name, execute)
+        except Exception as ex:
+            if call is not None:
+                self._single_flight.finish(coalesce_key, call, exception=ex)
+            raise
+
+    @staticmethod
+    def _complete_call(call, complete):
+        """
+        Complete a call which was coalesced with an in-flight call.
+
+        :param call: The completed in-flight call.
+        :param complete: The completion function passed to :meth:`_submit`.
+        """
+        try:
+            outcome = call.result()
+        except Exception as ex:  # pylint: disable=broad-except
+            complete(None, ex, "coalesced")
+            return
+        complete(outcome, None, "coalesced")
+
+    def _complete_request(self, request, timer, compression, outcome,
+                          exception, result):
+        """
+        Send the response for a request whose call to the API method was
+        executed on the executor.
+
+        :param dxlclient.message.Request request: The request
+        :param dxlmispservice._metrics.Timer timer: Timer for recording
+            request metrics, or `None` if metrics are not recorded.
+        :param str compression: The name of the codec with which to compress
+            the response payload, or `None`.
+        :param tuple outcome: The serialized response payload and error
+            message.
+        :param Exception exception: The exception raised by the call, or
+            `None` if it succeeded.
+        :param str result: The result for the request metrics.
+        """
+        if result == "coalesced":
+            logger.debug(
+                "Returning response from coalesced request for topic %s",
+                request.destination_topic)
+        if exception is not None:
+            res = self._create_error_response(request, exception)
+            result = "error"
+        else:
+            res = self._create_response(request, outcome[0], outcome[1],
+                                        compression)
+        self._send_response(res, result, timer)
+
+    @staticmethod
+    def _create_response(request, payload, error_message, compression=None):
+        """
+        Create the response for a request.
+
+        :param dxlclient.message.Request request: The request
+        :param bytes payload: The serialized response payload.
+        :param str error_message: The error message reported by the MISP
+            server, or `None` if the call succeeded.
+        :param str compression: The name of the codec with which to compress
+            the payload of a successful response, or `None`.
+        :return: The response.
+        :rtype: dxlclient.message.Response
+        """
+        if error_message is None:
+            res = Response(request)
+            res.payload = payload
+            compress_message(res, compression)
+        else:
+            res = ErrorResponse(request, error_message=error_message)
+            res.payload = payload
+        return res
+
+    @staticmethod
+    def _create_error_response(request, ex):
+        """
+        Create the error response for a request whose handling failed.
+
+        :param dxlclient.message.Request request: The request
+        :param Exception ex: The exception raised while handling the request.
+        :return: The error response.
+        :rtype: dxlclient.message.ErrorResponse
+        """
+        error_str = str(ex)
+        logger.exception("Error handling request: %s", error_str)
+        return ErrorResponse(request,
+                             error_message=MessageUtils.encode(error_str))
+
+    def _send_response(self, res, result, timer):
+        """
+        Send a response and record the request metrics.
+
+        :param dxlclient.message.Response res: The response.
+        :param str result: The result of the request, for the request
+            metrics. If `None`, the result is determined from the type of
+            the response.
+        :param dxlmispservice._metrics.Timer timer: Timer for recording
+            request metrics, or `None` if metrics are not recorded.
+        """
+        if timer is not None:
+            # Only time the send, excluding the preceding phases which have
+            # already been recorded.
+            timer.lap()
+        self._app.client.send_response(res)
+        if timer is not None:
+            self._observe(timer, "send")
+            self._phase_seconds.observe(timer.total(), self._api_name,
+                                        "total")
+            if result is None:
+                result = "misp_error" if isinstance(res, ErrorResponse) \
+                    else "success"
+            self._requests.inc(self._api_name, result)
+
+
+class MispServiceBatchRequestCallback(RequestCallback):
+    """
+    Request callback which invokes several MISP API methods for a single
+    request. The request payload is a JSON object whose `operations` member
+    is a list of operations, each of which is a JSON object with the
+    following members:
+
+    * `api` - The name of the MISP API method to invoke.
+    * `args` - (optional) The parameters for the API method, as would be
+      sent in the payload of a request on the topic of the API method.
+
+    The request payload may also hold the `dxl_compression` parameter, to
+    compress the response payload (see :mod:`dxlmispservice._compression`).
+
+    The response payload is a JSON object whose `responses` member is a list
+    with a result for each operation, in the order of the operations. Each
+    result holds the `api` name of the operation and either the `response`
+    data returned by the MISP server, an `error` message, or both (if the
+    MISP server reported an error).
+
+    Constructor parameters:
+
+    :param dxlmispservice.app.MispService app: The Misp service application
+    :param dict callbacks: Tuples containing the DXL topic and the
+        :class:`MispServiceRequestCallback` for each API method which may be
+        invoked, keyed by API method name.
+    :param int max_operations: The maximum number of operations in a
+        request.
+    :param int parallel_operations: The maximum number of operations of a
+        request to invoke at the same time.
+    :param dxlmispservice._metrics.MetricsRegistry metrics: Registry in which
+        to record request metrics. If `None`, metrics are not recorded.
+    :param dxlmispservice._executor.ApiExecutor executor: The executor on
+        which the request callbacks call their API methods. If `None`, the
+        operations are invoked on threads started for the request.
+    """
+
+    #: Name of the API for the batch requests themselves in the request
+    #: metrics.
+    BATCH_API_NAME = "batch"
+
+    def __init__(self, app, callbacks, max_operations, parallel_operations,
+                 metrics=None, executor=None):
+        super(MispServiceBatchRequestCallback, self).__init__()
+        if max_operations < 1:
+            raise ValueError(
+                "Maximum number of operations must be greater than 0: "
+                "{}".format(max_operations))
+        if parallel_operations < 1:
+            raise ValueError(
+                "Number of parallel operations must be greater than 0: "
+                "{}".format(parallel_operations))
+        self._app = app
+        self._callbacks = callbacks
+        self._max_operations = max_operations
+        self._parallel_operations = parallel_operations
+        self._executor = executor
+        self._phase_seconds, self._requests = \
+            MispServiceRequestCallback.register_metrics(metrics)
+
+    def _parse_operations(self, request):
+        """
+        Decode the operations in a request.
+
+        :param dxlclient.message.Request request: The request
+        :return: A tuple containing the operations as the first element and,
+            as the second element, the name of the codec with which to
+            compress the response payload or `None`.
+        :rtype: (list(dict), str)
+        :raises ValueError: If the request payload does not hold a valid
+            list of operations.
+        """
+        decompress_message(request)
+        request_dict = payload_to_dict(request) \
+            if request.payload else {}
+        if not isinstance(request_dict, dict):
+            request_dict = {}
+        compression = pop_compression_option(request_dict)
+        operations = request_dict.get("operations")
+        if not isinstance(operations, list) or not operations:
+            raise ValueError(
+                "Request must contain a non-empty list of operations")
+        if len(operations) > self._max_operations:
+            raise ValueError(
+                "Too many operations in request, maximum is {}: {}".format(
+                    self._max_operations, len(operations)))
+        return operations, compression
+
+    def _invoke_operation(self, operation, complete):
+        """
+        Invoke a single operation.
+
+        :param operation: The operation.
+        :param complete: Function invoked once the operation completes. See
+            :meth:`MispServiceRequestCallback.invoke_operation`.
+        """
+        try:
+            api_name = operation.get("api") \
+                if isinstance(operation, dict) else None
+            if api_name not in self._callbacks:
+                raise ValueError(
+                    "Operation has an unknown or unsupported api: {}".format(
+                        api_name))
+            request_dict = operation.get("args") or {}
+            if not isinstance(request_dict, dict):
+                raise ValueError(
+                    "Operation args must be an object: {}".format(
+                        request_dict))
+            request_dict = dict(request_dict)
+            normalize_request_dict(request_dict)
+            topic, callback = self._callbacks[api_name]
+            callback.invoke_operation(topic, request_dict, complete)
+        except RejectedError as ex:
+            complete(None, ex, "rejected")
+        except Exception as ex:  # pylint: disable=broad-except
+            complete(None, ex, None)
+
+    def _invoke_operations(self, operations):
+        """
+        Invoke the operations in a request, up to `parallel_operations` at a
+        time, and wait for them to complete.
+
+        :param list operations: The operations.
+        :return: The serialized result of each operation, in the order of
+            the operations.
+        :rtype: list(bytes)
+        """
+        results = [None] * len(operations)
+        if self._executor is None:
+            self._invoke_operations_on_threads(operations, results)
+            return results
+        slots = threading.Semaphore(self._parallel_operations)
+
+        def complete(index, outcome, exception, result):
+            try:
+                results[index] = self._create_result(
+                    operations[index], outcome, exception, result)
+            finally:
+                slots.release()
+
+        for index, operation in enumerate(operations):
+            slots.acquire()
+            self._invoke_operation(operation,
+                                   functools.partial(complete, index))
+        # Wait for the operations which are still in flight.
+        for _ in range(self._parallel_operations):
+            slots.acquire()
+        return results
+
+    def _invoke_operations_on_threads(self, operations, results):
+        """
+        Invoke the operations in a request, without an executor, on the
+        calling thread and up to `parallel_operations - 1` additional threads,
+        and wait for them to complete.
+
+        :param list operations: The operations.
+        :param list results: The list in which to store the serialized result
+            of each operation, in the order of the operations.
+        """
+        lock = threading.Lock()
+        indexes = iter(range(len(operations)))
+
+        def complete(index, outcome, exception, result):
+            results[index] = self._create_result(
+                operations[index], outcome, exception, result)
+
+        def run():
+            while True:
+                with lock:
+                    index = next(indexes, None)
+                if index is None:
+                    return
+                self._invoke_operation(operations[index],
+                                       functools.partial(complete, index))
+
+        threads = [threading.Thread(target=run, name="BatchOperation")
+                   for _ in range(min(self._parallel_operations,
+                                      len(operations)) - 1)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        run()
+        for thread in threads:
+            thread.join()
+
+    def _create_result(self, operation, outcome, exception, result):
+        """
+        Serialize the result of an operation and record it in the request
+        metrics.
+
+        :param operation: The operation.
+        :param tuple outcome: The serialized response payload and error
+            message, or `None` if the operation failed.
+        :param Exception exception: The exception raised by the operation, or
+            `None` if it succeeded.
+        :param str result: The result for the request metrics.
+        :return: The serialized result.
+        :rtype: bytes
+        """
+        api_name = operation.get("api") \
+            if isinstance(operation, dict) else None
+        result_dict = {"api": api_name}
+        payload = None
+        if exception is not None:
+            if result == "rejected":
+                logger.warning("Rejecting batch operation for %s: %s",
+                               api_name, exception)
             else:
-                res = Response(request)
-            MessageUtils.dict_to_json_payload(res, response_data)
+                logger.error("Error handling batch operation for %s: %s",
+                             api_name, exception)
+                result = "error"
+            result_dict["error"] = str(exception)
+        else:
+            payload, error_message = outcome
+            if error_message is not None:
+                result_dict["error"] = error_message
+                result = "misp_error"
+            elif result is None:
+                result = "success"
+        if self._requests is not None and api_name in self._callbacks:
+            self._requests.inc(api_name, result)
+        result_payload = dumps(result_dict)
+        if payload is None:
+            return result_payload
+        # Splice in the response payload as is, rather than decoding it (or
+        # the cached copy of it) only to encode it again.
+        return result_payload[:-1] + b', "response": ' + payload + b"}"
+
+    def on_request(self, request):
+        """
+        Callback invoked when a request is received.
+
+        :param dxlclient.message.Request request: The request
+        """
+        logger.info("Batch request received on topic '%s'",
+                    request.destination_topic)
+        logger.debug("Payload for topic %s: %s", request.destination_topic,
+                     request.payload)
+
+        timer = Timer() if self._phase_seconds is not None else None
+        try:
+            operations, compression = self._parse_operations(request)
+            results = self._invoke_operations(operations)
+            res = Response(request)
+            res.payload = b'{"responses": [' + b", ".join(results) + b"]}"
+            compress_message(res, compression)
+            result = "success"
         except Exception as ex:
             error_str = str(ex)
-            logger.exception("Error handling request: %s", error_str)
+            logger.exception("Error handling batch request: %s", error_str)
             res = ErrorResponse(request,
                                 error_message=MessageUtils.encode(error_str))
+            result = "error"
+
+        self._app.client.send_response(res)
+        if timer is not None:
+            self._phase_seconds.observe(timer.total(), self.BATCH_API_NAME,
+                                        "total")
+            self._requests.inc(self.BATCH_API_NAME, result)
 
+
+class MispServiceLookupRequestCallback(RequestCallback):
+    """
+    Request callback which looks up indicator values in the local indicator
+    index, calling the MISP server only for values which the index cannot
+    answer for. The request payload is a JSON object with either a `value`
+    member holding a single value to look up or a `values` member holding a
+    list of values to look up. The request payload may also hold the
+    `dxl_compression` parameter, to compress the response payload (see
+    :mod:`dxlmispservice._compression`).
+
+    The response payload is a JSON object with the following members:
+
+    * `results` - An object mapping each value to a list of the matching
+      attributes (empty if the value is not known).
+    * `complete` - Whether or not the index had been fully loaded from the
+      MISP server when the values were looked up. If not, values which are
+      known to MISP may not be found in an
+      :class:`dxlmispservice._indicatorindex.IndicatorIndex`. (An
+      :class:`dxlmispservice._indicatorindex.IndicatorFilter` searches the
+      MISP server for every value until it has been loaded.)
+
+    Constructor parameters:
+
+    :param dxlmispservice.app.MispService app: The Misp service application
+    :param index: The index, either an
+        :class:`dxlmispservice._indicatorindex.IndicatorIndex` or an
+        :class:`dxlmispservice._indicatorindex.IndicatorFilter`.
+    :param int max_values: The maximum number of values in a request.
+    :param dxlmispservice._metrics.MetricsRegistry metrics: Registry in which
+        to record request metrics. If `None`, metrics are not recorded.
+    """
+
+    #: Name of the API for the lookup requests in the request metrics.
+    LOOKUP_API_NAME = "lookup"
+
+    def __init__(self, app, index, max_values, metrics=None):
+        super(MispServiceLookupRequestCallback, self).__init__()
+        self._app = app
+        self._index = index
+        self._max_values = max_values
+        self._phase_seconds, self._requests = \
+            MispServiceRequestCallback.register_metrics(metrics)
+
+    def _parse_values(self, request):
+        """
+        Decode the values to look up from a request.
+
+        :param dxlclient.message.Request request: The request
+        :return: A tuple containing the values as the first element and, as
+            the second element, the name of the codec with which to compress
+            the response payload or `None`.
+        :rtype: (list(str), str)
+        :raises ValueError: If the request payload does not hold a value or
+            a valid list of values.
+        """
+        decompress_message(request)
+        request_dict = payload_to_dict(request) \
+            if request.payload else {}
+        if not isinstance(request_dict, dict):
+            request_dict = {}
+        compression = pop_compression_option(request_dict)
+        if "value" in request_dict:
+            values = [request_dict["value"]]
+        else:
+            values = request_dict.get("values")
+            if not isinstance(values, list) or not values:
+                raise ValueError(
+                    "Request must contain a value or a non-empty list of "
+                    "values")
+        if len(values) > self._max_values:
+            raise ValueError(
+                "Too many values in request, maximum is {}: {}".format(
+                    self._max_values, len(values)))
+        for value in values:
+            if type(value).__name__ not in ("str", "unicode"):
+                raise ValueError(
+                    "Values must be strings: {}".format(value))
+        return values, compression
+
+    def on_request(self, request):
+        """
+        Callback invoked when a request is received.
+
+        :param dxlclient.message.Request request: The request
+        """
+        logger.debug("Lookup request received on topic '%s'",
+                     request.destination_topic)
+
+        timer = Timer() if self._phase_seconds is not None else None
+        try:
+            values, compression = self._parse_values(request)
+            complete = self._index.complete
+            results = self._index.lookup_values(values)
+            res = Response(request)
+            res.payload = dumps({"results": results, "complete": complete})
+            compress_message(res, compression)
+            result = "success"
+        except Exception as ex:
+            error_str = str(ex)
+            logger.exception("Error handling lookup request: %s", error_str)
+            res = ErrorResponse(request,
+                                error_message=MessageUtils.encode(error_str))
+            result = "error"
+
+        self._app.client.send_response(res)
+        if timer is not None:
+            self._phase_seconds.observe(timer.total(), self.LOOKUP_API_NAME,
+                                        "total")
+            self._requests.inc(self.LOOKUP_API_NAME, result)
+
+
+class MispServiceMetricsRequestCallback(RequestCallback):
+    """
+    Request callback which responds with the metrics recorded by the service,
+    in the Prometheus text exposition format.
+
+    Constructor parameters:
+
+    :param dxlmispservice.app.MispService app: The Misp service application
+    :param dxlmispservice._metrics.MetricsRegistry metrics: The registry
+        containing the metrics.
+    """
+    def __init__(self, app, metrics):
+        super(MispServiceMetricsRequestCallback, self).__init__()
+        self._app = app
+        self._metrics = metrics
+
+    def on_request(self, request):
+        """
+        Callback invoked when a request is received.
+
+        :param dxlclient.message.Request request: The request
+        """
+        logger.debug("Metrics request received on topic '%s'",
+                     request.destination_topic)
+        try:
+            res = Response(request)
+            res.payload = MessageUtils.encode(self._metrics.render())
+        except Exception as ex:
+            error_str = str(ex)
+            logger.exception("Error handling metrics request: %s", error_str)
+            res = ErrorResponse(request,
+                                error_message=MessageUtils.encode(error_str))
         self._app.client.send_response(res)
@@ -0,0 +1,315 @@
+from __future__ import absolute_import
+from collections import OrderedDict
+import functools
+import json
+import threading
+import time
+
+# Use a monotonic clock for entry expiration where available (Python 3.3+).
+_now = getattr(time, "monotonic", time.time)
+
+#: Names of request parameters whose values identify a MISP event.
+_EVENT_PARAMS = ("event", "eventid", "event_id", "eid")
+#: Names of request parameters whose values identify a MISP attribute.
+_ATTRIBUTE_PARAMS = ("attribute", "attribute_id", "att_id")
+#: Names of request parameters whose values identify either a MISP event or
+#: a MISP attribute.
+_UUID_PARAMS = ("uuid",)
+#: Names of request parameters whose values identify a MISP tag.
+_TAG_PARAMS = ("tag", "tags")
+#: Names of request parameters whose values are MISP attribute values.
+_VALUE_PARAMS = ("value", "values")
+
+
+def _scalars(value):
+    """
+    Return the scalar members of a request parameter value as strings.
+    """
+    if isinstance(value, (list, tuple, set)):
+        return [str(item) for item in value
+                if not isinstance(item, (dict, list, tuple, set))]
+    if isinstance(value, (dict, bool)) or value is None:
+        return []
+    return [str(value)]
+
+
+def extract_request_references(request_dict):
+    """
+    Extract references to MISP events, attributes, tags, and attribute values
+    from the parameters of an API request.
+
+    :param dict request_dict: The decoded request payload.
+    :return: The references, each a string of the form `"<kind>:<value>"`.
+    :rtype: set(str)
+    """
+    references = set()
+    for param, value in request_dict.items():
+        if param in _EVENT_PARAMS:
+            kinds = ("event",)
+        elif param in _ATTRIBUTE_PARAMS:
+            kinds = ("attribute",)
+        elif param in _UUID_PARAMS:
+            kinds = ("event", "attribute")
+        elif param in _TAG_PARAMS:
+            kinds = ("tag",)
+        elif param in _VALUE_PARAMS:
+            kinds = ("value",)
+        else:
+            continue
+        for item in _scalars(value):
+            # Negated search terms, for example "!tag", refer to the same
+            # object as the term without the negation.
+            item = item[1:] if item.startswith("!") else item
+            for kind in kinds:
+                references.add("{}:{}".format(kind, item))
+    return references
+
+
+def _add_object_references(references, object_type, obj):
+    """
+    Add the references for a single MISP object (event, attribute, etc.) to
+    the supplied set.
+    """
+    if object_type == "Event":
+        for field in ("id", "uuid"):
+            if obj.get(field):
+                references.add("event:{}".format(obj[field]))
+    elif object_type in ("Attribute", "ShadowAttribute"):
+        for field in ("id", "uuid"):
+            if obj.get(field):
+                references.add("attribute:{}".format(obj[field]))
+        if obj.get("event_id"):
+            references.add("event:{}".format(obj["event_id"]))
+        if obj.get("value"):
+            references.add("value:{}".format(obj["value"]))
+    elif object_type in ("Object", "Sighting"):
+        if obj.get("event_id"):
+            references.add("event:{}".format(obj["event_id"]))
+        if obj.get("attribute_id"):
+            references.add("attribute:{}".format(obj["attribute_id"]))
+    elif object_type == "Tag":
+        if obj.get("name"):
+            references.add("tag:{}".format(obj["name"]))
+
+
+def visit_misp_objects(data, visit_fn):
+    """
+    Visit each MISP object (event, attribute, tag, etc.) in MISP data. The
+    type of an object is the key under which it (or the list holding it) is
+    found.
+
+    :param data: The MISP data (as decoded from JSON).
+    :param visit_fn: Function invoked with the type and the `dict` of each
+        object.
+    """
+    stack = [(None, data)]
+    while stack:
+        object_type, item = stack.pop()
+        if isinstance(item, list):
+            stack.extend((object_type, member) for member in item)
+        elif isinstance(item, dict):
+            if object_type:
+                visit_fn(object_type, item)
+            for key, value in item.items():
+                if isinstance(value, (dict, list)):
+                    stack.append((key, value))
+
+
+def extract_data_references(data):
+    """
+    Extract references to MISP events, attributes, tags, and attribute values
+    from MISP data, for example the response to an API request or the content
+    of a MISP ZeroMQ notification.
+
+    :param data: The MISP data (as decoded from JSON).
+    :return: The references, each a string of the form `"<kind>:<value>"`.
+    :rtype: set(str)
+    """
+    references = set()
+    visit_misp_objects(data, functools.partial(_add_object_references,
+                                               references))
+    return references
+
+
+class ResponseCache(object):
+    """
+    Thread-safe, size-bounded cache of serialized responses for MISP API
+    requests. Entries expire after a fixed time-to-live and, once the cache is
+    full, the least recently used entry is evicted to make room for a new one.
+
+    Each entry may be stored with a set of references to the MISP objects the
+    response pertains to (see :func:`extract_request_references` and
+    :func:`extract_data_references`). Entries can then be evicted early via
+    :meth:`invalidate` when any of the referenced objects change.
+
+    Constructor parameters:
+
+    :param int max_size: Maximum number of entries to hold in the cache.
+    :param float ttl: Number of seconds for which an entry remains valid after
+        it has been stored in the cache.
+    """
+
+    #: Maximum number of recently invalidated references remembered in order
+    #: to reject responses which were computed before an invalidation but
+    #: stored afterward.
+    _MAX_INVALIDATION_HISTORY = 10000
+
+    def __init__(self, max_size, ttl):
+        if max_size < 1:
+            raise ValueError(
+                "Response cache size must be greater than 0: {}".format(
+                    max_size))
+        if ttl <= 0:
+            raise ValueError(
+                "Response cache TTL must be greater than 0: {}".format(ttl))
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_reference = {}
+        self._generation = 0
+        self._invalidations = OrderedDict()
+        self._oldest_invalidation_generation = 0
+
+    @staticmethod
+    def make_key(topic, request_dict):
+        """
+        Build a cache key for a request.
+
+        :param str topic: The DXL topic on which the request was received.
+        :param dict request_dict: The decoded request payload.
+        :return: A key which is the same for any two requests sent to the
+            same topic with equivalent payloads, regardless of the order in
+            which the payload members were serialized.
+        :rtype: str
+        """
+        return "{} {}".format(topic,
+                              json.dumps(request_dict, sort_keys=True,
+                                         separators=(",", ":")))
+
+    @property
+    def generation(self):
+        """
+        The current invalidation generation of the cache. Capture this value
+        before computing a response and supply it to :meth:`put` so that the
+        response is discarded if any of its references are invalidated while
+        it is being computed.
+        """
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """
+        Retrieve the value stored for a key.
+
+        :param str key: The cache key.
+        :return: The cached value or `None` if no unexpired value is stored
+            for the key.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value, _ = entry
+            if expires <= _now():
+                self._remove(key)
+                return None
+            # Mark the entry as the most recently used one.
+            del self._entries[key]
+            self._entries[key] = entry
+            return value
+
+    def put(self, key, value, references=(), generation=None):
+        """
+        Store a value for a key, evicting the least recently used entry if the
+        cache is full.
+
+        :param str key: The cache key.
+        :param value: The value to store.
+        :param references: References to the MISP objects the value pertains
+            to.
+        :param int generation: The value of :attr:`generation` captured before
+            the value was computed. If set and any of the references have been
+            invalidated since, the value is not stored.
+        :return: Whether or not the value was stored.
+        :rtype: bool
+        """
+        references = frozenset(references)
+        with self._lock:
+            if generation is not None and generation < self._generation:
+                if generation < self._oldest_invalidation_generation:
+                    return False
+                for reference in references:
+                    if self._invalidations.get(reference, -1) > generation:
+                        return False
+            self._remove(key)
+            while len(self._entries) >= self._max_size:
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = (_now() + self._ttl, value, references)
+            for reference in references:
+                self._keys_by_reference.setdefault(reference, set()).add(key)
+            return True
+
+    def invalidate(self, references):
+        """
+        Evict all entries which were stored with any of the supplied
+        references.
+
+        :param references: References to MISP objects which have changed.
+        :return: The number of entries evicted.
+        :rtype: int
+        """
+        evicted = 0
+        with self._lock:
+            self._generation += 1
+            for reference in references:
+                self._invalidations.pop(reference, None)
+                self._invalidations[reference] = self._generation
+                for key in list(self._keys_by_reference.get(reference, ())):
+                    self._remove(key)
+                    evicted += 1
+            while len(self._invalidations) > self._MAX_INVALIDATION_HISTORY:
+                _, dropped_generation = self._invalidations.popitem(
+                    last=False)
+                self._oldest_invalidation_generation = dropped_generation
+        return evicted
+
+    def invalidate_all(self):
+        """
+        Evict all entries, including any which are being computed at the time
+        of the call. This can be used when a change to MISP data cannot be
+        matched to specific references, for example because a notification
+        was lost.
+        """
+        with self._lock:
+            self._generation += 1
+            self._oldest_invalidation_generation = self._generation
+            self._invalidations.clear()
+            self._entries.clear()
+            self._keys_by_reference.clear()
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_reference.clear()
+
+    def _remove(self, key):
+        """
+        Remove the entry for a key, if present. Must be called with the lock
+        held.
+        """
+        entry = self._entries.pop(key, None)
+        if entry:
+            for reference in entry[2]:
+                keys = self._keys_by_reference.get(reference)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._keys_by_reference[reference]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,130 @@
+from __future__ import absolute_import
+import json
+import math
+
+import requests
+
+try:
+    import orjson  # pylint: disable=import-error
+except ImportError:
+    orjson = None
+
+#: The name of the library used to encode and decode JSON: `orjson` if it is
+#: installed, otherwise `json` (from the standard library).
+BACKEND = "json" if orjson is None else "orjson"
+
+if orjson is not None:
+    # Serialize non-string keys as the standard library does, and leave
+    # values which the standard library cannot serialize (rather than
+    # formatting them in orjson's own way) so that these fall back to the
+    # standard library and fail in the same way.
+    _ORJSON_DUMPS_OPTIONS = getattr(orjson, "OPT_NON_STR_KEYS", 0) | \
+        getattr(orjson, "OPT_PASSTHROUGH_DATETIME", 0) | \
+        getattr(orjson, "OPT_PASSTHROUGH_DATACLASS", 0)
+
+
+def dumps(obj):
+    """
+    Encode an object as JSON.
+
+    The output decodes to the same value whichever backend is used, although
+    the formatting (whitespace, escaping of non-ASCII characters, and
+    notation of floats) may differ. Objects which the faster backend cannot
+    encode (for example, integers beyond 64 bits) are encoded with the
+    standard library. Floats which are not finite (`NaN` and infinity),
+    which are not valid JSON, are encoded as `null` by either backend.
+
+    :param obj: The object.
+    :return: The UTF-8 encoded JSON document.
+    :rtype: bytes
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_DUMPS_OPTIONS)
+        except TypeError:
+            pass
+    try:
+        return json.dumps(obj, allow_nan=False).encode("utf-8")
+    except ValueError as ex:
+        if "float" not in str(ex):
+            raise
+        # The object holds a float which is not finite. Replace these as
+        # orjson does, rather than writing `NaN` or `Infinity`.
+        return json.dumps(_replace_non_finite(obj)).encode("utf-8")
+
+
+def _replace_non_finite(obj):
+    """
+    :return: A copy of an object in which floats which are not finite are
+        replaced with `None`.
+    """
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else obj
+    if isinstance(obj, dict):
+        return dict((key, _replace_non_finite(value))
+                    for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [_replace_non_finite(value) for value in obj]
+    return obj
+
+
+def loads(data):
+    """
+    Decode a JSON document.
+
+    Documents which the faster backend rejects but the standard library
+    accepts (for example, those containing `NaN` or integers beyond 64 bits)
+    are decoded with the standard library.
+
+    :param data: The JSON document as `str` or as a UTF-8 encoded bytes-like
+        object (`bytes`, `bytearray`, or `memoryview`).
+    :return: The decoded value.
+    :raises ValueError: If the document is not valid JSON.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            pass
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+def payload_to_dict(message):
+    """
+    Decode the JSON payload of a DXL message. This is equivalent to
+    :meth:`dxlbootstrap.util.MessageUtils.json_payload_to_dict`, but uses
+    the faster backend if it is available.
+
+    :param dxlclient.message.Message message: The DXL message.
+    :return: The decoded payload.
+    """
+    payload = message.payload
+    if isinstance(payload, (bytes, bytearray)):
+        payload = payload.rstrip(b"\0")
+    else:
+        payload = payload.rstrip("\0")
+    return loads(payload)
+
+
+def response_json(response):
+    """
+    Decode the JSON body of a response from the MISP server. This is
+    equivalent to :meth:`requests.Response.json`, but uses the faster backend
+    if it is available.
+
+    :param requests.Response response: The response.
+    :return: The decoded body.
+    :raises ValueError: If the body is not valid JSON.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(response.content)
+        except ValueError:
+            pass
+    # Call the method of the class, in case the instance method has been
+    # replaced with this function.
+    return requests.Response.json(response)
@@ -0,0 +1,151 @@
+from __future__ import absolute_import
+import logging
+import threading
+
+# Configure local logger
+logger = logging.getLogger(__name__)
+
+
+class _Call(object):
+    """
+    An in-flight call whose outcome is shared by every caller which requested
+    the same key while the call was running.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def set_result(self, result):
+        """
+        Complete the call with a result.
+        """
+        self._result = result
+        self._complete()
+
+    def set_exception(self, exception):
+        """
+        Complete the call with an exception.
+        """
+        self._exception = exception
+        self._complete()
+
+    def _complete(self):
+        """
+        Mark the call as complete and invoke the registered callbacks.
+        """
+        with self._lock:
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.exception("Error invoking call completion callback: "
+                                 "%s", ex)
+
+    def add_done_callback(self, callback):
+        """
+        Register a function to invoke with the call once it completes. If the
+        call has already completed, the function is invoked immediately.
+
+        :param callback: The function, taking the call as its only argument.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def result(self):
+        """
+        Wait for the call to complete.
+
+        :return: The result of the call.
+        :raises Exception: The exception raised by the call, if any.
+        """
+        self._done.wait()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls made for the same key so that only the first
+    caller (the "leader") performs the work. Callers which arrive for the same
+    key while the leader is still running wait for and receive the leader's
+    outcome instead of repeating the work.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def begin(self, key):
+        """
+        Start a call for a key, unless a call for the same key is already in
+        flight.
+
+        :param key: Key which identifies equivalent calls.
+        :return: A tuple containing the call as the first element and, as the
+            second element, whether the caller is the leader. The leader must
+            perform the work and then complete the call via :meth:`finish`.
+            Other callers should wait for the outcome of the call.
+        :rtype: (_Call, bool)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+        return call, leader
+
+    def finish(self, key, call, result=None, exception=None):
+        """
+        Complete a call started by :meth:`begin`, sharing its outcome with
+        the callers waiting for it.
+
+        :param key: Key which identifies equivalent calls.
+        :param _Call call: The call.
+        :param result: The result of the call.
+        :param Exception exception: The exception raised by the call, if any.
+        """
+        with self._lock:
+            del self._calls[key]
+        if exception is None:
+            call.set_result(result)
+        else:
+            call.set_exception(exception)
+
+    def do(self, key, fn):
+        """
+        Run a function for a key, unless a call for the same key is already in
+        flight, in which case wait for that call to complete.
+
+        :param key: Key which identifies equivalent calls.
+        :param fn: Function (taking no arguments) to invoke.
+        :return: A tuple containing the result of the call as the first
+            element and, as the second element, whether the result was shared
+            from a call made by another caller.
+        :rtype: (object, bool)
+        :raises Exception: The exception raised by the function, if any.
+        """
+        call, leader = self.begin(key)
+        if not leader:
+            return call.result(), True
+
+        try:
+            result = fn()
+        except Exception as ex:
+            self.finish(key, call, exception=ex)
+            raise
+        self.finish(key, call, result)
+        return result, False
+
+    def __len__(self):
+        with self._lock:
+            return len(self._calls)
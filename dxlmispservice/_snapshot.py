@@ -0,0 +1,99 @@
+from __future__ import absolute_import
+import os
+import sqlite3
+
+from dxlmispservice._serialization import dumps, loads
+
+#: The version of the layout of snapshot files. Snapshots written with a
+#: different version are not read.
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Rows are inserted in batches, so that a large snapshot is streamed to disk
+# rather than held in memory as a whole.
+_INSERT_BATCH_SIZE = 10000
+
+# `os.replace` (which, unlike `os.rename`, replaces an existing file on all
+# platforms) is not available on Python 2.
+_replace = getattr(os, "replace", os.rename)
+
+
+def write_snapshot(path, meta, rows):
+    """
+    Write a snapshot to an SQLite database file. The snapshot is written to
+    a temporary file which then replaces the file at `path`, so that the file
+    at `path` always holds a complete snapshot.
+
+    :param str path: The path of the file.
+    :param dict meta: Values (which must be encodable as JSON) which describe
+        the snapshot.
+    :param rows: An iterable of the items in the snapshot, as bytes.
+    :return: The number of items written.
+    :rtype: int
+    """
+    temp_path = path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    count = 0
+    connection = sqlite3.connect(temp_path)
+    try:
+        connection.execute("PRAGMA journal_mode=OFF")
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute(
+            "CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)")
+        connection.execute("CREATE TABLE items (data BLOB)")
+        meta = dict(meta, format_version=SNAPSHOT_FORMAT_VERSION)
+        connection.executemany(
+            "INSERT INTO meta (name, value) VALUES (?, ?)",
+            [(name, dumps(value).decode("utf-8"))
+             for name, value in meta.items()])
+        batch = []
+        for row in rows:
+            batch.append((sqlite3.Binary(row),))
+            if len(batch) >= _INSERT_BATCH_SIZE:
+                connection.executemany(
+                    "INSERT INTO items (data) VALUES (?)", batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            connection.executemany(
+                "INSERT INTO items (data) VALUES (?)", batch)
+            count += len(batch)
+        connection.commit()
+    finally:
+        connection.close()
+    _replace(temp_path, path)
+    return count
+
+
+def read_snapshot(path, restore_fn):
+    """
+    Read a snapshot from an SQLite database file written by
+    :func:`write_snapshot`.
+
+    :param str path: The path of the file.
+    :param restore_fn: Function invoked with the `meta` values of the
+        snapshot and an iterator of its items (as bytes). The items can only
+        be read until the function returns.
+    :return: The value returned by `restore_fn`.
+    :raises ValueError: If the file does not hold a snapshot which can be
+        read.
+    """
+    if not os.path.isfile(path):
+        raise ValueError("Snapshot file not found: {}".format(path))
+    connection = sqlite3.connect(path)
+    try:
+        try:
+            meta = dict((name, loads(value)) for name, value in
+                        connection.execute("SELECT name, value FROM meta"))
+        except sqlite3.DatabaseError as ex:
+            raise ValueError("Unable to read snapshot file {}: {}".format(
+                path, ex))
+        if meta.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported snapshot format version, expected {}: {}".format(
+                    SNAPSHOT_FORMAT_VERSION, meta.get("format_version")))
+        rows = (bytes(row[0]) for row in
+                connection.execute("SELECT data FROM items ORDER BY rowid"))
+        return restore_fn(meta, rows)
+    finally:
+        connection.close()
@@ -0,0 +1,146 @@
+from __future__ import absolute_import
+import logging
+import re
+
+from dxlmispservice._serialization import dumps
+
+# Configure local logger
+logger = logging.getLogger(__name__)
+
+#: Reserved request parameter which holds the identifier of the stream to
+#: which the result of a request should be published.
+STREAM_ID_PARAM = "dxl_stream_id"
+#: Reserved request parameter which holds the maximum number of result items
+#: to publish in each chunk of a stream.
+CHUNK_SIZE_PARAM = "dxl_chunk_size"
+
+# Stream identifiers become part of a DXL topic, so they are restricted to
+# characters which have no special meaning in topics.
+_STREAM_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def pop_stream_options(request_dict):
+    """
+    Remove the reserved streaming parameters from the parameters of a
+    request.
+
+    :param dict request_dict: The decoded request payload.
+    :return: A tuple containing the stream identifier as the first element
+        and the chunk size as the second element, or `None` if the request
+        does not ask for its result to be streamed.
+    :rtype: (str, int)
+    :raises ValueError: If the streaming parameters are invalid.
+    """
+    stream_id = request_dict.pop(STREAM_ID_PARAM, None)
+    chunk_size = request_dict.pop(CHUNK_SIZE_PARAM, None)
+    if stream_id is None and chunk_size is None:
+        return None
+    if stream_id is None or \
+            not _STREAM_ID_PATTERN.match(str(stream_id)):
+        raise ValueError(
+            "{} must consist of 1 to 64 letters, digits, '_', or '-': "
+            "{}".format(STREAM_ID_PARAM, stream_id))
+    try:
+        chunk_size = int(chunk_size)
+    except (TypeError, ValueError):
+        chunk_size = 0
+    if chunk_size < 1:
+        raise ValueError("{} must be an integer greater than 0".format(
+            CHUNK_SIZE_PARAM))
+    return str(stream_id), chunk_size
+
+
+def find_stream_items(data):
+    """
+    Find the list of items in the result of a MISP API call which should be
+    split into chunks.
+
+    :param data: The result of the call (as decoded from JSON).
+    :return: The items, or `None` if the result does not contain a list of
+        items. The items are found in the following places:
+
+        * The result itself, if it is a list.
+        * `response`, if it is a list (for example, the result of a `search`
+          for events).
+        * The only member of `response`, if it is a list (for example,
+          `response.Attribute` in the result of a `search` for attributes).
+    :rtype: list
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        response = data.get("response")
+        if isinstance(response, list):
+            return response
+        if isinstance(response, dict) and len(response) == 1:
+            items = next(iter(response.values()))
+            if isinstance(items, list):
+                return items
+    return None
+
+
+class StreamPublisher(object):
+    """
+    Publishes items to a stream as a sequence of DXL events, each of which
+    contains up to `chunk_size` items. The payload of each event is a JSON
+    object with the following members:
+
+    * `stream_id` - The identifier of the stream.
+    * `sequence` - The position of the chunk in the stream, starting at `0`.
+    * `response` - The list of items in the chunk.
+
+    Constructor parameters:
+
+    :param send_fn: Function invoked with the DXL topic and payload of each
+        event to send.
+    :param str topic: The DXL topic to which to send the events.
+    :param str stream_id: The identifier of the stream.
+    :param int chunk_size: The maximum number of items in each event.
+    """
+    def __init__(self, send_fn, topic, stream_id, chunk_size):
+        self._send_fn = send_fn
+        self._topic = topic
+        self._stream_id = stream_id
+        self._chunk_size = chunk_size
+        self._pending = []
+        self._chunks = 0
+        self._items = 0
+
+    def add(self, items):
+        """
+        Add items to the stream, publishing each chunk as soon as it is full.
+
+        :param list items: The items.
+        """
+        self._pending.extend(items)
+        while len(self._pending) >= self._chunk_size:
+            chunk = self._pending[:self._chunk_size]
+            del self._pending[:self._chunk_size]
+            self._publish(chunk)
+
+    def close(self):
+        """
+        Publish the remaining items.
+
+        :return: A summary of the stream, for the response to the request:
+            the `stream_id`, DXL `topic`, and number of `chunks` and `items`
+            published.
+        :rtype: dict
+        """
+        if self._pending:
+            chunk, self._pending = self._pending, []
+            self._publish(chunk)
+        return {"stream_id": self._stream_id, "topic": self._topic,
+                "chunks": self._chunks, "items": self._items}
+
+    def _publish(self, chunk):
+        """
+        Publish a chunk of items.
+        """
+        logger.debug("Publishing chunk %d of stream %s with %d items",
+                     self._chunks, self._stream_id, len(chunk))
+        self._send_fn(self._topic, dumps({"stream_id": self._stream_id,
+                                          "sequence": self._chunks,
+                                          "response": chunk}))
+        self._chunks += 1
+        self._items += len(chunk)
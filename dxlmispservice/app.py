@@ -3,12 +3,27 @@ import logging
 import os
 import threading
 import zmq
-from pymisp import PyMISP
 
 from dxlbootstrap.app import Application
 from dxlclient import ServiceRegistrationInfo
 from dxlclient.message import Event
-from dxlmispservice._requesthandlers import MispServiceRequestCallback
+from dxlmispservice._apiclient import MispApiClient, create_session
+from dxlmispservice._compression import check_codec, compress_message
+from dxlmispservice._executor import ApiExecutor
+from dxlmispservice._indicatorindex import IndicatorFilter, IndicatorIndex
+from dxlmispservice._metrics import MetricsHttpServer, MetricsRegistry
+from dxlmispservice._notifications import NotificationBatcher, \
+    NotificationDispatcher, NotificationFilter, NotificationGapDetector, \
+    NotificationRoute, decode_json_payload, split_notification
+from dxlmispservice._pagination import SearchPaginator
+from dxlmispservice._requesthandlers import MispServiceBatchRequestCallback, \
+    MispServiceLookupRequestCallback, MispServiceMetricsRequestCallback, \
+    MispServiceRequestCallback
+from dxlmispservice._responsecache import ResponseCache, \
+    extract_data_references
+from dxlmispservice._serialization import BACKEND as JSON_BACKEND, dumps
+from dxlmispservice._singleflight import SingleFlight
+from dxlmispservice._streaming import find_stream_items
 
 # Configure local logger
 logger = logging.getLogger(__name__)
@@ -68,14 +83,401 @@ class MispService(Application):
     #: delivered to the DXL fabric.
     _GENERAL_ZEROMQ_NOTIFICATION_TOPICS_CONFIG_PROP = "zeroMqNotificationTopics"
 
+    #: The name of the "ApiConnection" section within the application
+    #: configuration file.
+    _API_CONNECTION_CONFIG_SECTION = "ApiConnection"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of HTTP connections to keep open to the MISP server.
+    _API_CONNECTION_POOL_SIZE_CONFIG_PROP = "poolSize"
+    #: The property used to specify in the application configuration file the
+    #: number of times to retry a failed attempt to connect to the MISP server.
+    _API_CONNECTION_MAX_RETRIES_CONFIG_PROP = "maxRetries"
+    #: The property used to specify in the application configuration file the
+    #: factor used to calculate the delay between connection retries.
+    _API_CONNECTION_RETRY_BACKOFF_FACTOR_CONFIG_PROP = "retryBackoffFactor"
+    #: The property used to specify in the application configuration file
+    #: whether or not HTTP connections to the MISP server should be kept open
+    #: for reuse between requests.
+    _API_CONNECTION_KEEP_ALIVE_CONFIG_PROP = "keepAlive"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds to wait for the MISP server to respond to a request.
+    _API_CONNECTION_TIMEOUT_CONFIG_PROP = "timeout"
+    #: The property used to specify in the application configuration file
+    #: whether or not to check the PyMISP version recommended by, and the
+    #: attribute types supported by, the MISP server on startup.
+    _API_CONNECTION_CHECK_SERVER_CONFIG_PROP = "checkServer"
+    #: The property used to specify in the application configuration file
+    #: whether or not to connect to the MISP server in the background, after
+    #: the service has been registered with the DXL fabric.
+    _API_CONNECTION_CONNECT_IN_BACKGROUND_CONFIG_PROP = "connectInBackground"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds for which requests received before the connection to
+    #: the MISP server has been made wait for it to be made.
+    _API_CONNECTION_READY_TIMEOUT_CONFIG_PROP = "readyTimeout"
+
+    #: The name of the "ResponseCache" section within the application
+    #: configuration file.
+    _RESPONSE_CACHE_CONFIG_SECTION = "ResponseCache"
+    #: The property used to specify in the application configuration file the
+    #: list of MISP APIs whose responses should be cached.
+    _RESPONSE_CACHE_API_NAMES_CONFIG_PROP = "apiNames"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of responses to hold in the cache.
+    _RESPONSE_CACHE_MAX_SIZE_CONFIG_PROP = "maxSize"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds for which a cached response remains valid.
+    _RESPONSE_CACHE_TTL_CONFIG_PROP = "ttl"
+    #: The property used to specify in the application configuration file the
+    #: names of the MISP ZeroMQ topics whose notifications should evict cached
+    #: responses which refer to the changed MISP events, attributes, and tags.
+    _RESPONSE_CACHE_INVALIDATION_TOPICS_CONFIG_PROP = "invalidationTopics"
+
+    #: The name of the "RequestCoalescing" section within the application
+    #: configuration file.
+    _REQUEST_COALESCING_CONFIG_SECTION = "RequestCoalescing"
+    #: The property used to specify in the application configuration file the
+    #: list of MISP APIs for which concurrent requests with equivalent payloads
+    #: should be coalesced into a single call to the MISP server.
+    _REQUEST_COALESCING_API_NAMES_CONFIG_PROP = "apiNames"
+
+    #: The name of the "NotificationForwarding" section within the application
+    #: configuration file.
+    _NOTIFICATION_FORWARDING_CONFIG_SECTION = "NotificationForwarding"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of MISP ZeroMQ notifications to send to the DXL fabric
+    #: in a single event.
+    _NOTIFICATION_FORWARDING_BATCH_SIZE_CONFIG_PROP = "batchSize"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of seconds to hold a MISP ZeroMQ notification before
+    #: sending the batch which contains it to the DXL fabric.
+    _NOTIFICATION_FORWARDING_BATCH_WINDOW_CONFIG_PROP = "batchWindow"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of received MISP ZeroMQ notifications to queue for
+    #: processing.
+    _NOTIFICATION_FORWARDING_QUEUE_SIZE_CONFIG_PROP = "queueSize"
+    #: The property used to specify in the application configuration file the
+    #: number of threads which process queued MISP ZeroMQ notifications.
+    _NOTIFICATION_FORWARDING_WORKER_COUNT_CONFIG_PROP = "workerCount"
+    #: The property used to specify in the application configuration file what
+    #: to do with a received MISP ZeroMQ notification when the queue is full.
+    _NOTIFICATION_FORWARDING_OVERFLOW_POLICY_CONFIG_PROP = "overflowPolicy"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of pending MISP ZeroMQ messages to receive each time the
+    #: socket is polled.
+    _NOTIFICATION_FORWARDING_RECEIVE_BURST_LIMIT_CONFIG_PROP = \
+        "receiveBurstLimit"
+    #: The properties used to specify in the application configuration file
+    #: the values by which MISP ZeroMQ notifications are filtered before being
+    #: forwarded to the DXL fabric, keyed by the name of the corresponding
+    #: filter criterion.
+    _NOTIFICATION_FORWARDING_FILTER_CONFIG_PROPS = (
+        ("orgs", "filterOrgs"),
+        ("tags", "filterTags"),
+        ("threat_levels", "filterThreatLevels"),
+        ("distributions", "filterDistributions"),
+        ("attribute_types", "filterAttributeTypes"))
+    #: The property used to specify in the application configuration file the
+    #: codec with which to compress the payloads of the events to which MISP
+    #: ZeroMQ notifications are forwarded.
+    _NOTIFICATION_FORWARDING_COMPRESSION_CONFIG_PROP = "compression"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds without any MISP ZeroMQ message after which
+    #: notifications are considered to have been lost.
+    _NOTIFICATION_FORWARDING_STALL_TIMEOUT_CONFIG_PROP = "stallTimeout"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of events (and attributes) to republish after
+    #: notifications may have been lost.
+    _NOTIFICATION_FORWARDING_CATCH_UP_MAX_RESULTS_CONFIG_PROP = \
+        "catchUpMaxResults"
+
+    #: The name of the "ZeroMqConnection" section within the application
+    #: configuration file.
+    _ZEROMQ_CONNECTION_CONFIG_SECTION = "ZeroMqConnection"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of MISP ZeroMQ messages to buffer before the MISP
+    #: ZeroMQ server drops messages for the service.
+    _ZEROMQ_CONNECTION_RECEIVE_HIGH_WATER_MARK_CONFIG_PROP = \
+        "receiveHighWaterMark"
+    #: The property used to specify in the application configuration file the
+    #: size, in bytes, of the kernel receive buffer of the MISP ZeroMQ
+    #: connection.
+    _ZEROMQ_CONNECTION_RECEIVE_BUFFER_SIZE_CONFIG_PROP = "receiveBufferSize"
+    #: The property used to specify in the application configuration file
+    #: whether or not to send TCP keepalive probes on the MISP ZeroMQ
+    #: connection.
+    _ZEROMQ_CONNECTION_TCP_KEEPALIVE_CONFIG_PROP = "tcpKeepalive"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds for which the MISP ZeroMQ connection is idle before
+    #: TCP keepalive probes are sent.
+    _ZEROMQ_CONNECTION_TCP_KEEPALIVE_IDLE_CONFIG_PROP = "tcpKeepaliveIdle"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds between TCP keepalive probes.
+    _ZEROMQ_CONNECTION_TCP_KEEPALIVE_INTERVAL_CONFIG_PROP = \
+        "tcpKeepaliveInterval"
+    #: The property used to specify in the application configuration file the
+    #: number of unanswered TCP keepalive probes after which the MISP ZeroMQ
+    #: connection is dropped.
+    _ZEROMQ_CONNECTION_TCP_KEEPALIVE_COUNT_CONFIG_PROP = "tcpKeepaliveCount"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds to wait before reconnecting to the MISP ZeroMQ
+    #: server.
+    _ZEROMQ_CONNECTION_RECONNECT_INTERVAL_CONFIG_PROP = "reconnectInterval"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of seconds to wait before reconnecting to the MISP
+    #: ZeroMQ server, up to which the wait doubles after each failed attempt.
+    _ZEROMQ_CONNECTION_RECONNECT_INTERVAL_MAX_CONFIG_PROP = \
+        "reconnectIntervalMax"
+    #: The property used to specify in the application configuration file
+    #: whether or not to keep only the latest received MISP ZeroMQ message.
+    _ZEROMQ_CONNECTION_CONFLATE_CONFIG_PROP = "conflate"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds between ZeroMQ heartbeats on the MISP ZeroMQ
+    #: connection.
+    _ZEROMQ_CONNECTION_HEARTBEAT_INTERVAL_CONFIG_PROP = "heartbeatInterval"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds to wait for a reply to a ZeroMQ heartbeat before the
+    #: MISP ZeroMQ connection is dropped.
+    _ZEROMQ_CONNECTION_HEARTBEAT_TIMEOUT_CONFIG_PROP = "heartbeatTimeout"
+
+    #: The name of the "ResponseStreaming" section within the application
+    #: configuration file.
+    _RESPONSE_STREAMING_CONFIG_SECTION = "ResponseStreaming"
+    #: The property used to specify in the application configuration file the
+    #: names of the MISP APIs whose results can be streamed.
+    _RESPONSE_STREAMING_API_NAMES_CONFIG_PROP = "apiNames"
+
+    #: The name of the "SearchPagination" section within the application
+    #: configuration file.
+    _SEARCH_PAGINATION_CONFIG_SECTION = "SearchPagination"
+    #: The property used to specify in the application configuration file the
+    #: number of results to request in each page of a search.
+    _SEARCH_PAGINATION_PAGE_SIZE_CONFIG_PROP = "pageSize"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of pages of a search to request at the same time.
+    _SEARCH_PAGINATION_PARALLEL_PAGES_CONFIG_PROP = "parallelPages"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of pages to request for a search.
+    _SEARCH_PAGINATION_MAX_PAGES_CONFIG_PROP = "maxPages"
+    #: The name of the MISP API whose results can be paged.
+    _SEARCH_API_NAME = "search"
+
+    #: The name of the "RequestBatching" section within the application
+    #: configuration file.
+    _REQUEST_BATCHING_CONFIG_SECTION = "RequestBatching"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of operations in a batch request.
+    _REQUEST_BATCHING_MAX_OPERATIONS_CONFIG_PROP = "maxOperations"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of operations of a batch request to invoke at the same
+    #: time.
+    _REQUEST_BATCHING_PARALLEL_OPERATIONS_CONFIG_PROP = "parallelOperations"
+    #: The default maximum number of operations of a batch request to invoke
+    #: at the same time.
+    _DEFAULT_REQUEST_BATCHING_PARALLEL_OPERATIONS = 4
+    #: The name of the last component of the DXL topic for batch requests.
+    _BATCH_REQUEST_TOPIC_NAME = "batch"
+
+    #: The name of the "IndicatorIndex" section within the application
+    #: configuration file.
+    _INDICATOR_INDEX_CONFIG_SECTION = "IndicatorIndex"
+    #: The property used to specify in the application configuration file
+    #: whether or not to maintain a local index of MISP attribute values for
+    #: lookup requests.
+    _INDICATOR_INDEX_ENABLED_CONFIG_PROP = "enabled"
+    #: The property used to specify in the application configuration file how
+    #: values are held in the index: "index" (all matching attributes) or
+    #: "bloom" (a Bloom filter of values).
+    _INDICATOR_INDEX_MODE_CONFIG_PROP = "mode"
+    #: The property used to specify in the application configuration file the
+    #: number of values which the Bloom filter is sized to hold.
+    _INDICATOR_INDEX_BLOOM_CAPACITY_CONFIG_PROP = "bloomCapacity"
+    #: The property used to specify in the application configuration file the
+    #: false positive rate of the Bloom filter.
+    _INDICATOR_INDEX_BLOOM_ERROR_RATE_CONFIG_PROP = "bloomErrorRate"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds between rebuilds of the index.
+    _INDICATOR_INDEX_REBUILD_INTERVAL_CONFIG_PROP = "rebuildInterval"
+    #: The property used to specify in the application configuration file the
+    #: MISP attribute types to index.
+    _INDICATOR_INDEX_TYPES_CONFIG_PROP = "types"
+    #: The property used to specify in the application configuration file
+    #: whether or not to index only attributes whose "to_ids" flag is set.
+    _INDICATOR_INDEX_TO_IDS_ONLY_CONFIG_PROP = "toIdsOnly"
+    #: The property used to specify in the application configuration file the
+    #: number of attributes to request in each page of the search which loads
+    #: the index.
+    _INDICATOR_INDEX_PAGE_SIZE_CONFIG_PROP = "pageSize"
+    #: The property used to specify in the application configuration file the
+    #: names of the MISP ZeroMQ topics whose notifications update the index.
+    _INDICATOR_INDEX_UPDATE_TOPICS_CONFIG_PROP = "updateTopics"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of values in a lookup request.
+    _INDICATOR_INDEX_MAX_LOOKUP_VALUES_CONFIG_PROP = "maxLookupValues"
+    #: The property used to specify in the application configuration file the
+    #: path of the file to which the index is saved, so that it can be
+    #: restored when the application is restarted.
+    _INDICATOR_INDEX_SNAPSHOT_PATH_CONFIG_PROP = "snapshotPath"
+    #: The property used to specify in the application configuration file the
+    #: number of seconds between saves of the index to the snapshot file.
+    _INDICATOR_INDEX_SNAPSHOT_INTERVAL_CONFIG_PROP = "snapshotInterval"
+    #: Index mode in which all matching attributes are held.
+    _INDICATOR_INDEX_MODE_INDEX = "index"
+    #: Index mode in which a Bloom filter of values is held.
+    _INDICATOR_INDEX_MODE_BLOOM = "bloom"
+    #: The default number of values which the Bloom filter is sized to hold.
+    _DEFAULT_INDICATOR_INDEX_BLOOM_CAPACITY = 1000000
+    #: The default false positive rate of the Bloom filter.
+    _DEFAULT_INDICATOR_INDEX_BLOOM_ERROR_RATE = 0.001
+    #: The default number of seconds between rebuilds of the index.
+    _DEFAULT_INDICATOR_INDEX_REBUILD_INTERVAL = 86400.0
+    #: The default number of attributes to request in each page of the search
+    #: which loads the index.
+    _DEFAULT_INDICATOR_INDEX_PAGE_SIZE = 1000
+    #: The default names of the MISP ZeroMQ topics whose notifications update
+    #: the index.
+    _DEFAULT_INDICATOR_INDEX_UPDATE_TOPICS = {"misp_json_attribute"}
+    #: The default maximum number of values in a lookup request.
+    _DEFAULT_INDICATOR_INDEX_MAX_LOOKUP_VALUES = 1000
+    #: The default number of seconds between saves of the index to the
+    #: snapshot file.
+    _DEFAULT_INDICATOR_INDEX_SNAPSHOT_INTERVAL = 3600.0
+    #: Number of seconds to wait between attempts to load the index.
+    _INDICATOR_INDEX_LOAD_RETRY_DELAY = 10.0
+    #: The name of the last component of the DXL topic for lookup requests.
+    _LOOKUP_REQUEST_TOPIC_NAME = "lookup"
+
+    #: The name of the "RequestExecution" section within the application
+    #: configuration file.
+    _REQUEST_EXECUTION_CONFIG_SECTION = "RequestExecution"
+    #: The property used to specify in the application configuration file the
+    #: number of threads which call MISP API methods.
+    _REQUEST_EXECUTION_WORKER_COUNT_CONFIG_PROP = "workerCount"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of calls in flight for each MISP API which has no
+    #: specific limit.
+    _REQUEST_EXECUTION_DEFAULT_CONCURRENCY_LIMIT_CONFIG_PROP = \
+        "defaultConcurrencyLimit"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of calls in flight for specific MISP APIs.
+    _REQUEST_EXECUTION_CONCURRENCY_LIMITS_CONFIG_PROP = "concurrencyLimits"
+    #: The property used to specify in the application configuration file the
+    #: priority of the calls for specific MISP APIs.
+    _REQUEST_EXECUTION_PRIORITIES_CONFIG_PROP = "priorities"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of calls to queue for each MISP API which has no
+    #: specific maximum.
+    _REQUEST_EXECUTION_DEFAULT_MAX_QUEUE_SIZE_CONFIG_PROP = \
+        "defaultMaxQueueSize"
+    #: The property used to specify in the application configuration file the
+    #: maximum number of calls to queue for specific MISP APIs.
+    _REQUEST_EXECUTION_MAX_QUEUE_SIZES_CONFIG_PROP = "maxQueueSizes"
+
+    #: The name of the "Metrics" section within the application configuration
+    #: file.
+    _METRICS_CONFIG_SECTION = "Metrics"
+    #: The property used to specify in the application configuration file the
+    #: port on which metrics can be scraped over HTTP.
+    _METRICS_HTTP_PORT_CONFIG_PROP = "httpPort"
+    #: The property used to specify in the application configuration file the
+    #: host name or IP address on which metrics can be scraped over HTTP.
+    _METRICS_HTTP_HOST_CONFIG_PROP = "httpHost"
+    #: The property used to specify in the application configuration file
+    #: whether or not metrics can be requested over the DXL fabric.
+    _METRICS_DXL_TOPIC_ENABLED_CONFIG_PROP = "dxlTopicEnabled"
+
     #: Default port number at which the MISP API server is expected to be hosted.
     _DEFAULT_API_PORT = 443
     #: Default port number at which the MISP ZeroMQ server is expected to be hosted.
     _DEFAULT_ZEROMQ_PORT = 50000
+    #: Default maximum number of HTTP connections to keep open to the MISP
+    #: server.
+    _DEFAULT_API_CONNECTION_POOL_SIZE = 10
+    #: Default number of times to retry a failed attempt to connect to the
+    #: MISP server.
+    _DEFAULT_API_CONNECTION_MAX_RETRIES = 3
+    #: Default factor used to calculate the delay between connection retries.
+    _DEFAULT_API_CONNECTION_RETRY_BACKOFF_FACTOR = 0.5
+    #: Default number of seconds for which requests received before the
+    #: connection to the MISP server has been made wait for it to be made.
+    _DEFAULT_API_CONNECTION_READY_TIMEOUT = 10.0
+    #: Number of seconds to wait between attempts to connect to the MISP
+    #: server in the background.
+    _API_CONNECTION_BACKGROUND_RETRY_DELAY = 10.0
+    #: Default maximum number of seconds to hold a MISP ZeroMQ notification
+    #: before sending the batch which contains it to the DXL fabric.
+    _DEFAULT_NOTIFICATION_FORWARDING_BATCH_WINDOW = 1.0
+    #: Default maximum number of received MISP ZeroMQ notifications to queue
+    #: for processing.
+    _DEFAULT_NOTIFICATION_FORWARDING_QUEUE_SIZE = 10000
+    #: Default number of threads which process queued MISP ZeroMQ
+    #: notifications.
+    _DEFAULT_NOTIFICATION_FORWARDING_WORKER_COUNT = 1
+    #: Default maximum number of pending MISP ZeroMQ messages to receive each
+    #: time the socket is polled.
+    _DEFAULT_NOTIFICATION_FORWARDING_RECEIVE_BURST_LIMIT = 1000
+    #: Default maximum number of events (and attributes) to republish after
+    #: MISP ZeroMQ notifications may have been lost.
+    _DEFAULT_NOTIFICATION_FORWARDING_CATCH_UP_MAX_RESULTS = 1000
+    #: Default maximum number of MISP ZeroMQ messages to buffer. This is far
+    #: above the ZeroMQ default of 1000, which is exceeded during large MISP
+    #: feed imports.
+    _DEFAULT_ZEROMQ_CONNECTION_RECEIVE_HIGH_WATER_MARK = 100000
+    #: Default number of seconds for which the MISP ZeroMQ connection is idle
+    #: before TCP keepalive probes are sent.
+    _DEFAULT_ZEROMQ_CONNECTION_TCP_KEEPALIVE_IDLE = 60
+    #: Default number of seconds between TCP keepalive probes.
+    _DEFAULT_ZEROMQ_CONNECTION_TCP_KEEPALIVE_INTERVAL = 10
+    #: Default number of unanswered TCP keepalive probes after which the MISP
+    #: ZeroMQ connection is dropped.
+    _DEFAULT_ZEROMQ_CONNECTION_TCP_KEEPALIVE_COUNT = 6
+    #: Default number of seconds to wait before reconnecting to the MISP
+    #: ZeroMQ server.
+    _DEFAULT_ZEROMQ_CONNECTION_RECONNECT_INTERVAL = 0.1
+    #: Default maximum number of seconds to wait before reconnecting to the
+    #: MISP ZeroMQ server.
+    _DEFAULT_ZEROMQ_CONNECTION_RECONNECT_INTERVAL_MAX = 30.0
+    #: The MISP ZeroMQ topic on which the MISP ZeroMQ server publishes
+    #: heartbeats.
+    _ZEROMQ_HEARTBEAT_TOPIC = "misp_json_self"
+    #: Number of seconds between checks for gaps in the MISP ZeroMQ
+    #: notifications.
+    _NOTIFICATION_GAP_CHECK_INTERVAL = 1.0
+    #: Number of seconds before the start of a gap in the MISP ZeroMQ
+    #: notifications from which to search for changes, to allow for
+    #: notifications which were in flight and for clock differences between
+    #: the service and the MISP server.
+    _NOTIFICATION_CATCH_UP_MARGIN = 60.0
+    #: Maximum number of seconds to wait for a catch-up in progress to stop
+    #: when the application is destroyed.
+    _NOTIFICATION_CATCH_UP_STOP_TIMEOUT = 10.0
+    #: The name under which the searches which republish lost MISP ZeroMQ
+    #: notifications are queued on the API executor.
+    _NOTIFICATION_CATCH_UP_API_NAME = "notificationCatchUp"
+    #: The MISP ZeroMQ topics whose lost notifications are republished, with
+    #: the MISP search controller which finds the changes and the key under
+    #: which each change is held in a notification.
+    _NOTIFICATION_CATCH_UP_SOURCES = (
+        ("misp_json", "events", "Event"),
+        ("misp_json_attribute", "attributes", "Attribute"))
+    #: The heartbeat topic, as received from the ZeroMQ socket.
+    _ZEROMQ_HEARTBEAT_TOPIC_BYTES = _ZEROMQ_HEARTBEAT_TOPIC.encode("utf-8")
+    #: Default maximum number of responses to hold in the response cache.
+    _DEFAULT_RESPONSE_CACHE_MAX_SIZE = 1000
+    #: Default number of seconds for which a cached response remains valid.
+    _DEFAULT_RESPONSE_CACHE_TTL = 60
+    #: Default host name or IP address on which metrics can be scraped over
+    #: HTTP.
+    _DEFAULT_METRICS_HTTP_HOST = "127.0.0.1"
 
     #: The base name for DXL topics delivered for MISP ZeroMQ notifications.
     _ZEROMQ_NOTIFICATIONS_EVENT_TOPIC = _SERVICE_BASE_NAME + \
                                         "/event/zeromq-notifications"
+    #: The base name for DXL topics to which streamed results are published.
+    _STREAM_EVENT_TOPIC = _SERVICE_BASE_NAME + "/event/stream"
+    #: The DXL request topic on which metrics can be requested.
+    _METRICS_REQUEST_TOPIC = _SERVICE_BASE_NAME + "/service/metrics"
+    #: Name of the counter of MISP ZeroMQ notifications.
+    _NOTIFICATIONS_METRIC = "dxlmispservice_notifications_total"
 
     def __init__(self, config_dir):
         """
@@ -90,13 +492,56 @@ class MispService(Application):
         self._service_unique_id = None
         self._api_client = None
         self._api_names = ()
+        self._response_cache = None
+        self._response_cache_api_names = set()
+        self._response_cache_invalidation_topics = set()
+        self._single_flight = None
+        self._coalesced_api_names = set()
+        self._api_executor = None
+        self._streamed_api_names = set()
+        self._search_page_size = 0
+        self._search_parallel_pages = 1
+        self._search_max_pages = 0
+        self._batch_max_operations = 0
+        self._batch_parallel_operations = \
+            self._DEFAULT_REQUEST_BATCHING_PARALLEL_OPERATIONS
+        self._indicator_index = None
+        self._indicator_index_page_size = \
+            self._DEFAULT_INDICATOR_INDEX_PAGE_SIZE
+        self._indicator_index_update_topics = set()
+        self._indicator_index_rebuild_interval = 0
+        self._indicator_index_max_lookup_values = \
+            self._DEFAULT_INDICATOR_INDEX_MAX_LOOKUP_VALUES
+        self._indicator_index_stop = threading.Event()
+        self._indicator_index_snapshot_path = None
+        self._indicator_index_snapshot_interval = 0
+        self._indicator_index_snapshot_lock = threading.Lock()
+        self._indicator_index_restored = False
         self._zeromq_context = None
         self._zeromq_notification_topics = set()
+        self._zeromq_socket_options = []
         self._zeromq_poller = None
         self._zeromq_misp_sub_socket = None
         self._zeromq_shutdown_push_socket = None
         self._zeromq_shutdown_pull_socket = None
         self._zeromq_thread = None
+        self._notification_batcher = None
+        self._notification_dispatcher = None
+        self._notification_stall_timeout = 0
+        self._notification_gap_detector = None
+        self._notification_catch_up_max_results = \
+            self._DEFAULT_NOTIFICATION_FORWARDING_CATCH_UP_MAX_RESULTS
+        self._notification_catch_up_stop = threading.Event()
+        self._notification_catch_up_thread = None
+        self._notification_filter = None
+        self._notification_compression = None
+        self._metrics = None
+        self._metrics_http_server = None
+        self._metrics_dxl_topic_enabled = False
+        self._notification_counter = None
+        self._zeromq_receive_burst_limit = 1
+        self._zeromq_max_topic_length = 0
+        self._zeromq_notification_routes = {}
 
     @property
     def client(self):
@@ -191,6 +636,39 @@ class MispService(Application):
 
         return return_value
 
+    def _get_api_name_values_from_config(self, section, setting,
+                                         return_type=int):
+        """
+        Get the value for a setting in the application configuration file
+        which consists of a comma-delimited list of `<api name>:<value>`
+        entries, for example `search:2,get_event:5`.
+
+        :param str section: Name of the section in which the setting resides.
+        :param str setting: Name of the setting.
+        :param type return_type: Expected 'type' of each value.
+        :return: The values, keyed by API name.
+        :rtype: dict
+        :raises ValueError: If an entry is not of the form
+            `<api name>:<value>` or its value is not of the expected type.
+        """
+        api_name_values = {}
+        entries = self._get_setting_from_config(
+            section, setting, return_type=list, default_value=[])
+        for entry in entries:
+            if not entry:
+                continue
+            api_name, separator, value = entry.partition(":")
+            api_name = api_name.strip()
+            try:
+                if not separator or not api_name:
+                    raise ValueError("expected <api name>:<value>")
+                api_name_values[api_name] = return_type(value.strip())
+            except ValueError as ex:
+                raise ValueError(
+                    "Unexpected value for setting {} in section {}: {}".format(
+                        setting, section, ex))
+        return api_name_values
+
     def on_load_configuration(self, config):
         """
         Invoked after the application-specific configuration has been loaded
@@ -206,6 +684,10 @@ class MispService(Application):
             self._GENERAL_CONFIG_SECTION,
             self._GENERAL_SERVICE_UNIQUE_ID_PROP)
 
+        self._load_metrics_configuration()
+        logger.info("Encoding and decoding JSON payloads with: %s",
+                    JSON_BACKEND)
+
         host = self._get_setting_from_config(
             self._GENERAL_CONFIG_SECTION,
             self._GENERAL_HOST_CONFIG_PROP,
@@ -223,9 +705,21 @@ class MispService(Application):
             return_type=list,
             default_value=[])
 
+        self._load_indicator_index_configuration()
+
+        self._notification_stall_timeout = self._get_setting_from_config(
+            self._NOTIFICATION_FORWARDING_CONFIG_SECTION,
+            self._NOTIFICATION_FORWARDING_STALL_TIMEOUT_CONFIG_PROP,
+            return_type=float,
+            default_value=0)
+
         # Only validate MISP API configuration and connect to a MISP API server
-        # if at least one API name was specified in the configuration file.
-        if self._api_names:
+        # if at least one API name was specified in the configuration file, or
+        # the indicator index (which is loaded from the MISP API server) or the
+        # detection of lost notifications (which are searched for on the MISP
+        # API server) is enabled.
+        if self._api_names or self._indicator_index is not None or \
+                self._notification_stall_timeout > 0:
             api_key = self._get_setting_from_config(
                 self._GENERAL_CONFIG_SECTION,
                 self._GENERAL_API_KEY_CONFIG_PROP,
@@ -267,9 +761,35 @@ class MispService(Application):
             else:
                 cert = None
 
-            logger.info("Connecting to MISP API URL: %s", api_url)
-            self._api_client = PyMISP(api_url, api_key,
-                                      ssl=verify_certificate, cert=cert)
+            self._create_api_client(api_url, api_key, verify_certificate,
+                                    cert)
+
+            self._load_response_cache_configuration()
+
+            self._coalesced_api_names = self._get_setting_from_config(
+                self._REQUEST_COALESCING_CONFIG_SECTION,
+                self._REQUEST_COALESCING_API_NAMES_CONFIG_PROP,
+                return_type=set,
+                default_value=set())
+            self._coalesced_api_names.discard("")
+            if self._coalesced_api_names:
+                logger.info("Coalescing concurrent requests for MISP APIs: %s",
+                            ", ".join(sorted(self._coalesced_api_names)))
+                self._single_flight = SingleFlight()
+
+            self._streamed_api_names = self._get_setting_from_config(
+                self._RESPONSE_STREAMING_CONFIG_SECTION,
+                self._RESPONSE_STREAMING_API_NAMES_CONFIG_PROP,
+                return_type=set,
+                default_value=set())
+            self._streamed_api_names.discard("")
+            if self._streamed_api_names:
+                logger.info("Streaming results on request for MISP APIs: %s",
+                            ", ".join(sorted(self._streamed_api_names)))
+
+            self._load_search_pagination_configuration()
+            self._load_request_batching_configuration()
+            self._load_request_execution_configuration()
 
         self._zeromq_notification_topics = self._get_setting_from_config(
             self._GENERAL_CONFIG_SECTION,
@@ -280,18 +800,782 @@ class MispService(Application):
         # Only validate MISP ZeroMQ configuration and connect to a MISP ZeroMQ
         # server if at least one ZeroMQ topic was specified in the
         # configuration file.
-        if self._zeromq_notification_topics:
+        if self._zeromq_subscription_topics():
             zeromq_port = self._get_setting_from_config(
                 self._GENERAL_CONFIG_SECTION,
                 self._GENERAL_ZEROMQ_PORT_CONFIG_PROP,
                 default_value=self._DEFAULT_ZEROMQ_PORT,
                 return_type=int
             )
+            self._load_notification_forwarding_configuration()
+            self._load_zeromq_connection_configuration()
+            self._build_zeromq_notification_routes()
             self._setup_zeromq_sockets(host, zeromq_port)
 
+        if self._indicator_index is not None:
+            # Load the index after subscribing for the notifications which
+            # update it, so that no changes made during the load are missed.
+            loader_thread = threading.Thread(
+                target=self._load_indicator_index, name="IndicatorIndexLoad")
+            loader_thread.daemon = True
+            loader_thread.start()
+            if self._indicator_index_snapshot_path and \
+                    self._indicator_index_snapshot_interval > 0:
+                snapshot_thread = threading.Thread(
+                    target=self._save_indicator_index_snapshots,
+                    name="IndicatorIndexSnapshot")
+                snapshot_thread.daemon = True
+                snapshot_thread.start()
+
+    def _load_search_pagination_configuration(self):
+        """
+        Read the settings for paging through the results of searches from
+        the application configuration file.
+        """
+        self._search_page_size = self._get_setting_from_config(
+            self._SEARCH_PAGINATION_CONFIG_SECTION,
+            self._SEARCH_PAGINATION_PAGE_SIZE_CONFIG_PROP,
+            return_type=int,
+            default_value=0)
+        if self._search_page_size < 1:
+            return
+        self._search_parallel_pages = self._get_setting_from_config(
+            self._SEARCH_PAGINATION_CONFIG_SECTION,
+            self._SEARCH_PAGINATION_PARALLEL_PAGES_CONFIG_PROP,
+            return_type=int,
+            default_value=1)
+        self._search_max_pages = self._get_setting_from_config(
+            self._SEARCH_PAGINATION_CONFIG_SECTION,
+            self._SEARCH_PAGINATION_MAX_PAGES_CONFIG_PROP,
+            return_type=int,
+            default_value=0)
+        logger.info(
+            "Paging through search results (page size: %d, parallel pages: "
+            "%d, max pages: %s)", self._search_page_size,
+            self._search_parallel_pages, self._search_max_pages or "no limit")
+
+    def _load_request_batching_configuration(self):
+        """
+        Read the settings for batch requests from the application
+        configuration file.
+        """
+        self._batch_max_operations = self._get_setting_from_config(
+            self._REQUEST_BATCHING_CONFIG_SECTION,
+            self._REQUEST_BATCHING_MAX_OPERATIONS_CONFIG_PROP,
+            return_type=int,
+            default_value=0)
+        if self._batch_max_operations < 1:
+            return
+        self._batch_parallel_operations = self._get_setting_from_config(
+            self._REQUEST_BATCHING_CONFIG_SECTION,
+            self._REQUEST_BATCHING_PARALLEL_OPERATIONS_CONFIG_PROP,
+            return_type=int,
+            default_value=self._DEFAULT_REQUEST_BATCHING_PARALLEL_OPERATIONS)
+        logger.info(
+            "Accepting batch requests (max operations: %d, parallel "
+            "operations: %d)", self._batch_max_operations,
+            self._batch_parallel_operations)
+
+    def _load_indicator_index_configuration(self):
+        """
+        Read the settings for the indicator index from the application
+        configuration file and, if it is enabled, create the index.
+        """
+        enabled = self._get_setting_from_config(
+            self._INDICATOR_INDEX_CONFIG_SECTION,
+            self._INDICATOR_INDEX_ENABLED_CONFIG_PROP,
+            return_type=bool,
+            default_value=False)
+        if not enabled:
+            return
+        mode = self._get_setting_from_config(
+            self._INDICATOR_INDEX_CONFIG_SECTION,
+            self._INDICATOR_INDEX_MODE_CONFIG_PROP,
+            default_value=self._INDICATOR_INDEX_MODE_INDEX)
+        if mode not in (self._INDICATOR_INDEX_MODE_INDEX,
+                        self._INDICATOR_INDEX_MODE_BLOOM):
+            raise ValueError(
+                "Unsupported indicator index mode, expected {} or {}: "
+                "{}".format(self._INDICATOR_INDEX_MODE_INDEX,
+                            self._INDICATOR_INDEX_MODE_BLOOM, mode))
+        types = self._get_setting_from_config(
+            self._INDICATOR_INDEX_CONFIG_SECTION,
+            self._INDICATOR_INDEX_TYPES_CONFIG_PROP,
+            return_type=set,
+            default_value=set())
+        types.discard("")
+        to_ids_only = self._get_setting_from_config(
+            self._INDICATOR_INDEX_CONFIG_SECTION,
+            self._INDICATOR_INDEX_TO_IDS_ONLY_CONFIG_PROP,
+            return_type=bool,
+            default_value=False)
+        self._indicator_index_page_size = self._get_setting_from_config(
+            self._INDICATOR_INDEX_CONFIG_SECTION,
+            self._INDICATOR_INDEX_PAGE_SIZE_CONFIG_PROP,
+            return_type=int,
+            default_value=self._DEFAULT_INDICATOR_INDEX_PAGE_SIZE)
+        if self._indicator_index_page_size < 1:
+            raise ValueError(
+                "Indicator index page size must be greater than 0: {}".format(
+                    self._indicator_index_page_size))
+        self._indicator_index_update_topics = self._get_setting_from_config(
+            self._INDICATOR_INDEX_CONFIG_SECTION,
+            self._INDICATOR_INDEX_UPDATE_TOPICS_CONFIG_PROP,
+            return_type=set,
+            default_value=set(self._DEFAULT_INDICATOR_INDEX_UPDATE_TOPICS))
+        self._indicator_index_update_topics.discard("")
+        self._indicator_index_rebuild_interval = self._get_setting_from_config(
+            self._INDICATOR_INDEX_CONFIG_SECTION,
+            self._INDICATOR_INDEX_REBUILD_INTERVAL_CONFIG_PROP,
+            return_type=float,
+            default_value=self._DEFAULT_INDICATOR_INDEX_REBUILD_INTERVAL)
+        self._indicator_index_max_lookup_values = \
+            self._get_setting_from_config(
+                self._INDICATOR_INDEX_CONFIG_SECTION,
+                self._INDICATOR_INDEX_MAX_LOOKUP_VALUES_CONFIG_PROP,
+                return_type=int,
+                default_value=self._DEFAULT_INDICATOR_INDEX_MAX_LOOKUP_VALUES)
+        if self._indicator_index_max_lookup_values < 1:
+            raise ValueError(
+                "Maximum number of lookup values must be greater than 0: "
+                "{}".format(self._indicator_index_max_lookup_values))
+        logger.info(
+            "Maintaining indicator index (mode: %s, types: %s, to_ids only: "
+            "%s, update topics: %s, rebuild interval: %s)", mode,
+            ", ".join(sorted(types)) if types else "all", to_ids_only,
+            ", ".join(sorted(self._indicator_index_update_topics)),
+            self._indicator_index_rebuild_interval)
+        if mode == self._INDICATOR_INDEX_MODE_BLOOM:
+            capacity = self._get_setting_from_config(
+                self._INDICATOR_INDEX_CONFIG_SECTION,
+                self._INDICATOR_INDEX_BLOOM_CAPACITY_CONFIG_PROP,
+                return_type=int,
+                default_value=self._DEFAULT_INDICATOR_INDEX_BLOOM_CAPACITY)
+            error_rate = self._get_setting_from_config(
+                self._INDICATOR_INDEX_CONFIG_SECTION,
+                self._INDICATOR_INDEX_BLOOM_ERROR_RATE_CONFIG_PROP,
+                return_type=float,
+                default_value=self._DEFAULT_INDICATOR_INDEX_BLOOM_ERROR_RATE)
+            self._indicator_index = IndicatorFilter(
+                self._search_misp_attributes, capacity, error_rate, types,
+                to_ids_only)
+            logger.info("Using Bloom filter for indicator index (capacity: "
+                        "%d, error rate: %s, size: %d bytes)", capacity,
+                        error_rate, self._indicator_index.size)
+        else:
+            self._indicator_index = IndicatorIndex(types, to_ids_only)
+        self._indicator_index_snapshot_path = self._get_setting_from_config(
+            self._INDICATOR_INDEX_CONFIG_SECTION,
+            self._INDICATOR_INDEX_SNAPSHOT_PATH_CONFIG_PROP,
+            default_value="")
+        self._indicator_index_snapshot_interval = \
+            self._get_setting_from_config(
+                self._INDICATOR_INDEX_CONFIG_SECTION,
+                self._INDICATOR_INDEX_SNAPSHOT_INTERVAL_CONFIG_PROP,
+                return_type=float,
+                default_value=self._DEFAULT_INDICATOR_INDEX_SNAPSHOT_INTERVAL)
+        if self._metrics is not None:
+            self._metrics.gauge(
+                "dxlmispservice_indicator_index_attributes",
+                "Number of MISP attributes (or, for a Bloom filter, values) "
+                "in the indicator index.",
+                lambda: len(self._indicator_index))
+
+    def _search_misp_attributes(self, **kwargs):
+        """
+        Search the MISP server for attributes.
+
+        :param kwargs: The search parameters.
+        :return: The search result.
+        """
+        return self._api_client.search(controller="attributes", **kwargs)
+
+    def _load_indicator_index(self):
+        """
+        Restore the indicator index from the snapshot file (if one is
+        configured), load it from a paged search of the MISP server for
+        attributes (or, if it was restored, for the attributes modified
+        since), retrying until the load succeeds, and then rebuild it every
+        `rebuildInterval` seconds, until the application is destroyed.
+        Invoked on a background thread.
+        """
+        if self._indicator_index_snapshot_path:
+            self._restore_indicator_index_snapshot()
+        paginator = SearchPaginator(self._search_misp_attributes,
+                                    self._indicator_index_page_size)
+        while not self._indicator_index_stop.is_set():
+            try:
+                if self._indicator_index_restored:
+                    logger.info(
+                        "Loading changes to indicator index since %d ...",
+                        self._indicator_index.last_timestamp)
+                    count = self._indicator_index.load(
+                        paginator,
+                        self._indicator_index.delta_search_params())
+                else:
+                    logger.info("Loading indicator index ...")
+                    count = self._indicator_index.load(paginator)
+                self._indicator_index.mark_complete()
+                logger.info("Loaded indicator index (%d attributes found, "
+                            "size: %d)", count, len(self._indicator_index))
+                self._save_indicator_index_snapshot()
+                break
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.error("Unable to load indicator index: %s. Retrying "
+                             "in %s seconds.", ex,
+                             self._INDICATOR_INDEX_LOAD_RETRY_DELAY)
+            self._indicator_index_stop.wait(
+                self._INDICATOR_INDEX_LOAD_RETRY_DELAY)
+
+        if self._indicator_index_rebuild_interval <= 0:
+            return
+        while not self._indicator_index_stop.wait(
+                self._indicator_index_rebuild_interval):
+            try:
+                logger.info("Rebuilding indicator index ...")
+                count = self._indicator_index.rebuild(paginator)
+                logger.info("Rebuilt indicator index (%d attributes found, "
+                            "size: %d)", count, len(self._indicator_index))
+                self._save_indicator_index_snapshot()
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.error("Unable to rebuild indicator index: %s", ex)
+
+    def _restore_indicator_index_snapshot(self):
+        """
+        Restore the indicator index from the snapshot file, if there is one,
+        so that only the attributes which have changed since the snapshot was
+        saved need to be loaded from the MISP server.
+        """
+        path = self._indicator_index_snapshot_path
+        if not os.path.isfile(path):
+            logger.info("No indicator index snapshot found at %s", path)
+            return
+        try:
+            logger.info("Restoring indicator index from %s ...", path)
+            self._indicator_index.restore_snapshot(path)
+            self._indicator_index_restored = True
+            logger.info("Restored indicator index (size: %d, last "
+                        "timestamp: %d)", len(self._indicator_index),
+                        self._indicator_index.last_timestamp)
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.warning("Unable to restore indicator index from %s, "
+                           "loading it from the MISP server instead: %s",
+                           path, ex)
+
+    def _save_indicator_index_snapshot(self):
+        """
+        Save the indicator index to the snapshot file, if one is configured
+        and the index has been loaded.
+        """
+        path = self._indicator_index_snapshot_path
+        if not path:
+            return
+        with self._indicator_index_snapshot_lock:
+            try:
+                if self._indicator_index.save_snapshot(path) is not None:
+                    logger.info("Saved indicator index to %s (size: %d)",
+                                path, len(self._indicator_index))
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.error("Unable to save indicator index to %s: %s",
+                             path, ex)
+
+    def _save_indicator_index_snapshots(self):
+        """
+        Save the indicator index to the snapshot file every
+        `snapshotInterval` seconds, until the application is destroyed.
+        Invoked on a background thread.
+        """
+        while not self._indicator_index_stop.wait(
+                self._indicator_index_snapshot_interval):
+            self._save_indicator_index_snapshot()
+
+    def _load_request_execution_configuration(self):
+        """
+        Read the settings for executing MISP API calls from the application
+        configuration file and, if a number of workers is configured, create
+        the executor on which API calls are made.
+        """
+        worker_count = self._get_setting_from_config(
+            self._REQUEST_EXECUTION_CONFIG_SECTION,
+            self._REQUEST_EXECUTION_WORKER_COUNT_CONFIG_PROP,
+            return_type=int,
+            default_value=0)
+        if worker_count < 1:
+            return
+        # By default, calls for a single MISP API (for example, a burst of
+        # slow searches) can only occupy half of the workers, leaving the
+        # rest for calls for other APIs.
+        default_limit = self._get_setting_from_config(
+            self._REQUEST_EXECUTION_CONFIG_SECTION,
+            self._REQUEST_EXECUTION_DEFAULT_CONCURRENCY_LIMIT_CONFIG_PROP,
+            return_type=int,
+            default_value=max(1, worker_count // 2))
+        limits = self._get_api_name_values_from_config(
+            self._REQUEST_EXECUTION_CONFIG_SECTION,
+            self._REQUEST_EXECUTION_CONCURRENCY_LIMITS_CONFIG_PROP)
+        priorities = self._get_api_name_values_from_config(
+            self._REQUEST_EXECUTION_CONFIG_SECTION,
+            self._REQUEST_EXECUTION_PRIORITIES_CONFIG_PROP)
+        default_max_queue_size = self._get_setting_from_config(
+            self._REQUEST_EXECUTION_CONFIG_SECTION,
+            self._REQUEST_EXECUTION_DEFAULT_MAX_QUEUE_SIZE_CONFIG_PROP,
+            return_type=int,
+            default_value=0)
+        max_queue_sizes = self._get_api_name_values_from_config(
+            self._REQUEST_EXECUTION_CONFIG_SECTION,
+            self._REQUEST_EXECUTION_MAX_QUEUE_SIZES_CONFIG_PROP)
+        for setting, api_name_values in (
+                (self._REQUEST_EXECUTION_CONCURRENCY_LIMITS_CONFIG_PROP,
+                 limits),
+                (self._REQUEST_EXECUTION_PRIORITIES_CONFIG_PROP, priorities),
+                (self._REQUEST_EXECUTION_MAX_QUEUE_SIZES_CONFIG_PROP,
+                 max_queue_sizes)):
+            for api_name in sorted(set(api_name_values) -
+                                   set(self._api_names)):
+                logger.warning(
+                    "Setting %s in section %s refers to MISP API which is "
+                    "not in apiNames: %s", setting,
+                    self._REQUEST_EXECUTION_CONFIG_SECTION, api_name)
+        logger.info(
+            "Executing MISP API calls on %d workers (default concurrency "
+            "limit: %d, default max queue size: %d)", worker_count,
+            default_limit, default_max_queue_size)
+        for api_name in sorted(set(limits) | set(priorities) |
+                               set(max_queue_sizes)):
+            logger.info(
+                "MISP API %s: concurrency limit: %d, priority: %d, max queue "
+                "size: %d", api_name, limits.get(api_name, default_limit),
+                priorities.get(api_name, 0),
+                max_queue_sizes.get(api_name, default_max_queue_size))
+        # Searches which republish lost notifications are queued apart from
+        # the requests for the search API, one at a time and behind the calls
+        # for every other API, so that a catch-up does not delay requests.
+        limits[self._NOTIFICATION_CATCH_UP_API_NAME] = 1
+        priorities[self._NOTIFICATION_CATCH_UP_API_NAME] = \
+            min(list(priorities.values()) + [0]) - 1
+        self._api_executor = ApiExecutor(
+            worker_count, default_limit, limits, priorities,
+            default_max_queue_size, max_queue_sizes)
+        if self._metrics is not None:
+            self._metrics.gauge(
+                "dxlmispservice_api_calls_queued",
+                "Number of MISP API calls waiting for a worker.",
+                lambda: dict(((api_name,), queued) for api_name, (queued, _)
+                             in self._api_executor.stats().items()),
+                ("api",))
+            self._metrics.gauge(
+                "dxlmispservice_api_calls_in_flight",
+                "Number of MISP API calls in flight.",
+                lambda: dict(((api_name,), in_flight)
+                             for api_name, (_, in_flight)
+                             in self._api_executor.stats().items()),
+                ("api",))
+
+    def _load_metrics_configuration(self):
+        """
+        Read the settings for metrics from the application configuration file
+        and, if metrics can be scraped over HTTP or requested over the DXL
+        fabric, create the metrics registry.
+        """
+        http_port = self._get_setting_from_config(
+            self._METRICS_CONFIG_SECTION,
+            self._METRICS_HTTP_PORT_CONFIG_PROP,
+            return_type=int)
+        self._metrics_dxl_topic_enabled = self._get_setting_from_config(
+            self._METRICS_CONFIG_SECTION,
+            self._METRICS_DXL_TOPIC_ENABLED_CONFIG_PROP,
+            return_type=bool,
+            default_value=False)
+        if http_port is None and not self._metrics_dxl_topic_enabled:
+            return
+
+        self._metrics = MetricsRegistry()
+        self._notification_counter = self._metrics.counter(
+            self._NOTIFICATIONS_METRIC,
+            "MISP ZeroMQ notifications by result: received, forwarded, "
+            "filtered, dropped, failed, or caught_up.",
+            ("topic", "result"))
+        self._metrics.gauge(
+            "dxlmispservice_notification_queue_depth",
+            "Number of MISP ZeroMQ notifications queued for processing.",
+            lambda: self._notification_dispatcher.qsize()
+            if self._notification_dispatcher else 0)
+
+        if http_port is not None:
+            http_host = self._get_setting_from_config(
+                self._METRICS_CONFIG_SECTION,
+                self._METRICS_HTTP_HOST_CONFIG_PROP,
+                default_value=self._DEFAULT_METRICS_HTTP_HOST)
+            self._metrics_http_server = MetricsHttpServer(
+                self._metrics, http_host, http_port)
+            logger.info("Serving metrics at http://%s:%d/metrics",
+                        http_host, self._metrics_http_server.port)
+
+    def _create_api_client(self, api_url, api_key, verify_certificate,
+                           cert):
+        """
+        Create the MISP API client. Unless configured to connect in the
+        background, connect to the MISP server before returning.
+
+        :param str api_url: The URL of the MISP API server.
+        :param str api_key: The MISP API key.
+        :param verify_certificate: Whether or not to verify the certificate of
+            the MISP server, or the path to a bundle of trusted CA
+            certificates with which to verify it.
+        :param cert: The client certificate (and private key) to supply to
+            the MISP server, if any.
+        """
+        timeout = self._get_setting_from_config(
+            self._API_CONNECTION_CONFIG_SECTION,
+            self._API_CONNECTION_TIMEOUT_CONFIG_PROP,
+            return_type=float)
+        check_server = self._get_setting_from_config(
+            self._API_CONNECTION_CONFIG_SECTION,
+            self._API_CONNECTION_CHECK_SERVER_CONFIG_PROP,
+            return_type=bool,
+            default_value=True)
+        connect_in_background = self._get_setting_from_config(
+            self._API_CONNECTION_CONFIG_SECTION,
+            self._API_CONNECTION_CONNECT_IN_BACKGROUND_CONFIG_PROP,
+            return_type=bool,
+            default_value=False)
+        ready_timeout = self._get_setting_from_config(
+            self._API_CONNECTION_CONFIG_SECTION,
+            self._API_CONNECTION_READY_TIMEOUT_CONFIG_PROP,
+            return_type=float,
+            default_value=self._DEFAULT_API_CONNECTION_READY_TIMEOUT)
+
+        session = self._create_api_session()
+        try:
+            self._api_client = MispApiClient(
+                api_url, api_key, session, timeout=timeout,
+                check_server=check_server, ready_timeout=ready_timeout,
+                ssl=verify_certificate, cert=cert)
+            if not check_server:
+                logger.info("Using MISP API URL without checking server: %s",
+                            api_url)
+            elif connect_in_background:
+                logger.info("Connecting to MISP API URL in background: %s",
+                            api_url)
+                self._api_client.connect_in_background(
+                    self._API_CONNECTION_BACKGROUND_RETRY_DELAY)
+            else:
+                logger.info("Connecting to MISP API URL: %s", api_url)
+                self._api_client.connect()
+        except Exception:
+            self._api_client = None
+            session.close()
+            raise
+
+    def _create_api_session(self):
+        """
+        Create the HTTP session, with a pool of connections to the MISP server,
+        which is shared by all API requests.
+
+        :return: The session.
+        :rtype: requests.Session
+        """
+        pool_size = self._get_setting_from_config(
+            self._API_CONNECTION_CONFIG_SECTION,
+            self._API_CONNECTION_POOL_SIZE_CONFIG_PROP,
+            return_type=int,
+            default_value=self._DEFAULT_API_CONNECTION_POOL_SIZE)
+        max_retries = self._get_setting_from_config(
+            self._API_CONNECTION_CONFIG_SECTION,
+            self._API_CONNECTION_MAX_RETRIES_CONFIG_PROP,
+            return_type=int,
+            default_value=self._DEFAULT_API_CONNECTION_MAX_RETRIES)
+        retry_backoff_factor = self._get_setting_from_config(
+            self._API_CONNECTION_CONFIG_SECTION,
+            self._API_CONNECTION_RETRY_BACKOFF_FACTOR_CONFIG_PROP,
+            return_type=float,
+            default_value=self._DEFAULT_API_CONNECTION_RETRY_BACKOFF_FACTOR)
+        keep_alive = self._get_setting_from_config(
+            self._API_CONNECTION_CONFIG_SECTION,
+            self._API_CONNECTION_KEEP_ALIVE_CONFIG_PROP,
+            return_type=bool,
+            default_value=True)
+        logger.debug(
+            "Creating MISP API session (pool size: %d, max retries: %d, "
+            "keep alive: %s)", pool_size, max_retries, keep_alive)
+        return create_session(pool_size, max_retries, retry_backoff_factor,
+                              keep_alive)
+
+    def _load_response_cache_configuration(self):
+        """
+        Read the settings for the response cache from the application
+        configuration file and, if at least one API name is configured for
+        caching, create the cache.
+        """
+        self._response_cache_api_names = self._get_setting_from_config(
+            self._RESPONSE_CACHE_CONFIG_SECTION,
+            self._RESPONSE_CACHE_API_NAMES_CONFIG_PROP,
+            return_type=set,
+            default_value=set())
+        self._response_cache_api_names.discard("")
+
+        if self._response_cache_api_names:
+            max_size = self._get_setting_from_config(
+                self._RESPONSE_CACHE_CONFIG_SECTION,
+                self._RESPONSE_CACHE_MAX_SIZE_CONFIG_PROP,
+                return_type=int,
+                default_value=self._DEFAULT_RESPONSE_CACHE_MAX_SIZE)
+            ttl = self._get_setting_from_config(
+                self._RESPONSE_CACHE_CONFIG_SECTION,
+                self._RESPONSE_CACHE_TTL_CONFIG_PROP,
+                return_type=float,
+                default_value=self._DEFAULT_RESPONSE_CACHE_TTL)
+            logger.info(
+                "Caching responses for MISP APIs: %s (max size: %d, ttl: %s)",
+                ", ".join(sorted(self._response_cache_api_names)),
+                max_size, ttl)
+            self._response_cache = ResponseCache(max_size, ttl)
+
+            self._response_cache_invalidation_topics = \
+                self._get_setting_from_config(
+                    self._RESPONSE_CACHE_CONFIG_SECTION,
+                    self._RESPONSE_CACHE_INVALIDATION_TOPICS_CONFIG_PROP,
+                    return_type=set,
+                    default_value=set())
+            self._response_cache_invalidation_topics.discard("")
+
+    def _load_notification_forwarding_configuration(self):
+        """
+        Read the settings for processing MISP ZeroMQ notifications and
+        forwarding them to the DXL fabric from the application configuration
+        file.
+        """
+        queue_size = self._get_setting_from_config(
+            self._NOTIFICATION_FORWARDING_CONFIG_SECTION,
+            self._NOTIFICATION_FORWARDING_QUEUE_SIZE_CONFIG_PROP,
+            return_type=int,
+            default_value=self._DEFAULT_NOTIFICATION_FORWARDING_QUEUE_SIZE)
+        worker_count = self._get_setting_from_config(
+            self._NOTIFICATION_FORWARDING_CONFIG_SECTION,
+            self._NOTIFICATION_FORWARDING_WORKER_COUNT_CONFIG_PROP,
+            return_type=int,
+            default_value=self._DEFAULT_NOTIFICATION_FORWARDING_WORKER_COUNT)
+        overflow_policy = self._get_setting_from_config(
+            self._NOTIFICATION_FORWARDING_CONFIG_SECTION,
+            self._NOTIFICATION_FORWARDING_OVERFLOW_POLICY_CONFIG_PROP,
+            default_value=NotificationDispatcher.OVERFLOW_BLOCK)
+        logger.info(
+            "Processing notifications (queue size: %d, workers: %d, "
+            "overflow policy: %s)", queue_size, worker_count, overflow_policy)
+        self._notification_dispatcher = NotificationDispatcher(
+            self._process_zeromq_misp_message, queue_size, worker_count,
+            overflow_policy, self._on_zeromq_misp_message_dropped)
+
+        self._zeromq_receive_burst_limit = self._get_setting_from_config(
+            self._NOTIFICATION_FORWARDING_CONFIG_SECTION,
+            self._NOTIFICATION_FORWARDING_RECEIVE_BURST_LIMIT_CONFIG_PROP,
+            return_type=int,
+            default_value=self._DEFAULT_NOTIFICATION_FORWARDING_RECEIVE_BURST_LIMIT)
+        if self._zeromq_receive_burst_limit < 1:
+            raise ValueError(
+                "Receive burst limit must be greater than 0: {}".format(
+                    self._zeromq_receive_burst_limit))
+
+        batch_size = self._get_setting_from_config(
+            self._NOTIFICATION_FORWARDING_CONFIG_SECTION,
+            self._NOTIFICATION_FORWARDING_BATCH_SIZE_CONFIG_PROP,
+            return_type=int,
+            default_value=1)
+        if batch_size > 1:
+            batch_window = self._get_setting_from_config(
+                self._NOTIFICATION_FORWARDING_CONFIG_SECTION,
+                self._NOTIFICATION_FORWARDING_BATCH_WINDOW_CONFIG_PROP,
+                return_type=float,
+                default_value=self._DEFAULT_NOTIFICATION_FORWARDING_BATCH_WINDOW)
+            logger.info(
+                "Batching notifications (batch size: %d, batch window: %s)",
+                batch_size, batch_window)
+            self._notification_batcher = NotificationBatcher(
+                self._send_notification_event, batch_size, batch_window)
+
+        filter_values = {}
+        for criterion, setting in \
+                self._NOTIFICATION_FORWARDING_FILTER_CONFIG_PROPS:
+            values = self._get_setting_from_config(
+                self._NOTIFICATION_FORWARDING_CONFIG_SECTION, setting,
+                return_type=set, default_value=set())
+            values.discard("")
+            filter_values[criterion] = values
+        notification_filter = NotificationFilter(**filter_values)
+        if notification_filter:
+            logger.info("Filtering forwarded notifications (%s)",
+                        notification_filter)
+            self._notification_filter = notification_filter
+
+        compression = self._get_setting_from_config(
+            self._NOTIFICATION_FORWARDING_CONFIG_SECTION,
+            self._NOTIFICATION_FORWARDING_COMPRESSION_CONFIG_PROP)
+        if compression:
+            self._notification_compression = check_codec(compression)
+            logger.info("Compressing forwarded notifications with %s",
+                        compression)
+
+        if self._notification_stall_timeout > 0:
+            self._notification_catch_up_max_results = \
+                self._get_setting_from_config(
+                    self._NOTIFICATION_FORWARDING_CONFIG_SECTION,
+                    self._NOTIFICATION_FORWARDING_CATCH_UP_MAX_RESULTS_CONFIG_PROP,
+                    return_type=int,
+                    default_value=self._DEFAULT_NOTIFICATION_FORWARDING_CATCH_UP_MAX_RESULTS)
+            if self._notification_catch_up_max_results < 1:
+                raise ValueError(
+                    "Catch-up max results must be greater than 0: {}".format(
+                        self._notification_catch_up_max_results))
+            logger.info(
+                "Detecting lost notifications (stall timeout: %s, catch-up "
+                "max results: %d)", self._notification_stall_timeout,
+                self._notification_catch_up_max_results)
+            self._notification_gap_detector = NotificationGapDetector(
+                self._notification_stall_timeout)
+
+    def _load_zeromq_connection_configuration(self):
+        """
+        Read the options for the socket connected to the MISP ZeroMQ server
+        from the application configuration file.
+        """
+        def get_setting(prop, return_type, default_value):
+            return self._get_setting_from_config(
+                self._ZEROMQ_CONNECTION_CONFIG_SECTION, prop,
+                return_type=return_type, default_value=default_value)
+
+        def milliseconds(seconds):
+            return int(round(seconds * 1000))
+
+        receive_high_water_mark = get_setting(
+            self._ZEROMQ_CONNECTION_RECEIVE_HIGH_WATER_MARK_CONFIG_PROP, int,
+            self._DEFAULT_ZEROMQ_CONNECTION_RECEIVE_HIGH_WATER_MARK)
+        receive_buffer_size = get_setting(
+            self._ZEROMQ_CONNECTION_RECEIVE_BUFFER_SIZE_CONFIG_PROP, int, 0)
+        tcp_keepalive = get_setting(
+            self._ZEROMQ_CONNECTION_TCP_KEEPALIVE_CONFIG_PROP, bool, True)
+        reconnect_interval = get_setting(
+            self._ZEROMQ_CONNECTION_RECONNECT_INTERVAL_CONFIG_PROP, float,
+            self._DEFAULT_ZEROMQ_CONNECTION_RECONNECT_INTERVAL)
+        reconnect_interval_max = get_setting(
+            self._ZEROMQ_CONNECTION_RECONNECT_INTERVAL_MAX_CONFIG_PROP, float,
+            self._DEFAULT_ZEROMQ_CONNECTION_RECONNECT_INTERVAL_MAX)
+        conflate = get_setting(
+            self._ZEROMQ_CONNECTION_CONFLATE_CONFIG_PROP, bool, False)
+        heartbeat_interval = get_setting(
+            self._ZEROMQ_CONNECTION_HEARTBEAT_INTERVAL_CONFIG_PROP, float, 0)
+        heartbeat_timeout = get_setting(
+            self._ZEROMQ_CONNECTION_HEARTBEAT_TIMEOUT_CONFIG_PROP, float, 0)
+        for prop, value in (
+                (self._ZEROMQ_CONNECTION_RECEIVE_HIGH_WATER_MARK_CONFIG_PROP,
+                 receive_high_water_mark),
+                (self._ZEROMQ_CONNECTION_RECEIVE_BUFFER_SIZE_CONFIG_PROP,
+                 receive_buffer_size),
+                (self._ZEROMQ_CONNECTION_RECONNECT_INTERVAL_CONFIG_PROP,
+                 reconnect_interval),
+                (self._ZEROMQ_CONNECTION_RECONNECT_INTERVAL_MAX_CONFIG_PROP,
+                 reconnect_interval_max),
+                (self._ZEROMQ_CONNECTION_HEARTBEAT_INTERVAL_CONFIG_PROP,
+                 heartbeat_interval),
+                (self._ZEROMQ_CONNECTION_HEARTBEAT_TIMEOUT_CONFIG_PROP,
+                 heartbeat_timeout)):
+            if value < 0:
+                raise ValueError(
+                    "ZeroMQ connection {} must not be negative: {}".format(
+                        prop, value))
+
+        options = [("RCVHWM", receive_high_water_mark),
+                   ("RECONNECT_IVL", milliseconds(reconnect_interval)),
+                   ("RECONNECT_IVL_MAX",
+                    milliseconds(reconnect_interval_max))]
+        if receive_buffer_size:
+            # Leaving the size to the operating system allows it to grow the
+            # buffer as needed (for example, with TCP autotuning on Linux).
+            options.append(("RCVBUF", receive_buffer_size))
+        if tcp_keepalive:
+            options.extend((
+                ("TCP_KEEPALIVE", 1),
+                ("TCP_KEEPALIVE_IDLE", get_setting(
+                    self._ZEROMQ_CONNECTION_TCP_KEEPALIVE_IDLE_CONFIG_PROP,
+                    int, self._DEFAULT_ZEROMQ_CONNECTION_TCP_KEEPALIVE_IDLE)),
+                ("TCP_KEEPALIVE_INTVL", get_setting(
+                    self._ZEROMQ_CONNECTION_TCP_KEEPALIVE_INTERVAL_CONFIG_PROP,
+                    int,
+                    self._DEFAULT_ZEROMQ_CONNECTION_TCP_KEEPALIVE_INTERVAL)),
+                ("TCP_KEEPALIVE_CNT", get_setting(
+                    self._ZEROMQ_CONNECTION_TCP_KEEPALIVE_COUNT_CONFIG_PROP,
+                    int,
+                    self._DEFAULT_ZEROMQ_CONNECTION_TCP_KEEPALIVE_COUNT))))
+        else:
+            options.append(("TCP_KEEPALIVE", 0))
+        if conflate:
+            logger.warning("Conflating MISP ZeroMQ messages, only the latest "
+                           "queued message is kept")
+            options.append(("CONFLATE", 1))
+        if heartbeat_interval:
+            options.append(("HEARTBEAT_IVL", milliseconds(heartbeat_interval)))
+            if heartbeat_timeout:
+                options.append(("HEARTBEAT_TIMEOUT",
+                                milliseconds(heartbeat_timeout)))
+
+        self._zeromq_socket_options = []
+        applied = []
+        for name, value in options:
+            option = getattr(zmq, name, None)
+            if option is None:
+                logger.warning("ZeroMQ socket option %s is not supported by "
+                               "this version of ZeroMQ, ignoring it", name)
+                continue
+            self._zeromq_socket_options.append((option, value))
+            applied.append("{}={}".format(name, value))
+        logger.info("Using MISP ZeroMQ socket options: %s", ", ".join(applied))
+
+    def _zeromq_subscription_topics(self):
+        """
+        :return: The names of the MISP ZeroMQ topics whose notifications are
+            processed: those forwarded to the DXL fabric, those which evict
+            cached responses, and those which update the indicator index.
+        :rtype: set(str)
+        """
+        return self._zeromq_notification_topics | \
+            self._response_cache_invalidation_topics | \
+            self._indicator_index_update_topics
+
+    def _build_zeromq_notification_routes(self):
+        """
+        Build the map from each ZeroMQ topic whose notifications should be
+        processed (as `bytes`, as received from the ZeroMQ socket) to the
+        :class:`NotificationRoute` describing how to process them. This is
+        done once, at configuration time, so that each received notification
+        only requires a lookup in the map.
+        """
+        event_topic_prefix = "{}{}/".format(
+            self._ZEROMQ_NOTIFICATIONS_EVENT_TOPIC,
+            "/{}".format(self._service_unique_id)
+            if self._service_unique_id else "")
+        routes = {}
+        for topic in self._zeromq_subscription_topics():
+            event_topic = None
+            if topic in self._zeromq_notification_topics:
+                event_topic = event_topic_prefix + topic
+                if self._notification_compression:
+                    # Compressed events are sent to a topic of their own, so
+                    # that subscribers opt in to them.
+                    event_topic += "/" + self._notification_compression
+            routes[topic.encode("utf-8")] = NotificationRoute(
+                topic, event_topic,
+                topic in self._response_cache_invalidation_topics,
+                topic in self._indicator_index_update_topics)
+        self._zeromq_notification_routes = routes
+        topics = list(routes)
+        if self._notification_gap_detector:
+            topics.append(self._ZEROMQ_HEARTBEAT_TOPIC.encode("utf-8"))
+        self._zeromq_max_topic_length = max(
+            len(topic) for topic in topics) if topics else 0
+
     @staticmethod
     def _create_zeromq_socket(context, host, socket_type, description,
-                              port=None, topics=None, log_level=logging.INFO):
+                              port=None, topics=None, log_level=logging.INFO,
+                              options=None):
         """
         Create a ZeroMQ socket and, optionally, subscribe the socket to
         one or more topics.
@@ -307,12 +1591,20 @@ class MispService(Application):
         :param list(str) topics: List of topics to which to subscribe the
             socket.
         :param int log_level: Level at which to log socket messages
+        :param list options: Options to set on the socket before it is
+            connected or bound, as (option, value) tuples. `LINGER` is always
+            set to `0`.
         :return: A tuple containing the ZeroMQ socket as the first element
             and port to which the socket is attached as the second element.
         :rtype: (socket, int)
         """
 
         socket = context.socket(socket_type)
+        # Options such as the high water mark only apply to connections made
+        # after they are set.
+        socket.setsockopt(zmq.LINGER, 0)  # pylint: disable=no-member
+        for option, value in options or ():
+            socket.setsockopt(option, value)
         base_socket_url = "tcp://{}".format(host)
 
         if port:
@@ -327,8 +1619,6 @@ class MispService(Application):
             socket_url = "{}:{}".format(base_socket_url, port)
             logger.debug("Bound %s ZeroMQ URL: %s", description, socket_url)
 
-        socket.setsockopt(zmq.LINGER, 0)  # pylint: disable=no-member
-
         if topics:
             for topic in sorted(topics):
                 logger.log(log_level, "Subscribing to %s ZeroMQ topic: %s ...",
@@ -350,10 +1640,16 @@ class MispService(Application):
         """
         self._zeromq_context = zmq.Context()
 
+        topics = self._zeromq_subscription_topics()
+        if self._notification_gap_detector:
+            # Subscribe for the heartbeats which show that the connection to
+            # the MISP ZeroMQ server is alive.
+            topics = topics | {self._ZEROMQ_HEARTBEAT_TOPIC}
         self._zeromq_misp_sub_socket, _ = self._create_zeromq_socket(
             self._zeromq_context, host,
             zmq.SUB,  # pylint: disable=no-member
-            "MISP", port=port, topics=self._zeromq_notification_topics)
+            "MISP", port=port, topics=topics,
+            options=self._zeromq_socket_options)
 
         shutdown_host = "127.0.0.1"
 
@@ -379,10 +1675,17 @@ class MispService(Application):
         self._zeromq_thread = zeromq_thread
         self._zeromq_thread.start()
 
+        if self._notification_gap_detector:
+            self._notification_catch_up_thread = threading.Thread(
+                target=self._catch_up_lost_notifications,
+                name="NotificationCatchUp")
+            self._notification_catch_up_thread.daemon = True
+            self._notification_catch_up_thread.start()
+
     def _process_zeromq_misp_messages(self):
         """
         Poll for MISP ZeroMQ notifications. On receipt of a notification,
-        send a corresponding event to the DXL fabric.
+        queue it for processing by the notification dispatcher.
         """
         while not self.__destroyed:
             try:
@@ -393,31 +1696,326 @@ class MispService(Application):
                 socks = {}
             if self._zeromq_misp_sub_socket in socks and \
                     socks[self._zeromq_misp_sub_socket] == zmq.POLLIN:
-                message = self._zeromq_misp_sub_socket.recv_string()
-                topic, _, payload = message.partition(" ")
-                logger.debug("Received notification for %s", topic)
-
-                # ZeroMQ will deliver notifications for any topic which starts
-                # with the subscribed topic name. Events should only be
-                # forwarded only to the DXL fabric for messages whose topic
-                # exactly matches an entry in the DXL service configuration
-                # file. For example, if the DXL service configuration file
-                # includes only the topic "misp_json", the ZeroMQ socket would
-                # provide messages with a topic of either "misp_json" or
-                # "misp_json_self" to the ZeroMQ subscriber. Only messages with
-                # a topic of "misp_json" (not "misp_json_self") should be
-                # forwarded to the DXL fabric.
-                if topic in self._zeromq_notification_topics:
-                    full_event_topic = "{}{}/{}".format(
-                        self._ZEROMQ_NOTIFICATIONS_EVENT_TOPIC,
-                        "/{}".format(self._service_unique_id)
-                        if self._service_unique_id else "",
-                        topic)
-                    event = Event(full_event_topic)
-                    logger.debug("Forwarding notification to %s ...",
-                                 full_event_topic)
-                    event.payload = payload
-                    self.client.send_event(event)
+                # Drain the messages which are already pending on the socket,
+                # up to the burst limit, before polling again.
+                for _ in range(self._zeromq_receive_burst_limit):
+                    try:
+                        # Receive the message without copying it so that the
+                        # payload can be forwarded as-is, without being
+                        # decoded to a string.
+                        message = self._zeromq_misp_sub_socket.recv(
+                            zmq.NOBLOCK,  # pylint: disable=no-member
+                            copy=False)
+                    # zmq.Again is raised once no more messages are
+                    # pending. Any other ZMQError could be raised if the
+                    # socket is shut down between receives.
+                    except zmq.ZMQError:
+                        break
+                    self._queue_zeromq_misp_message(message)
+                    if self.__destroyed:
+                        break
+
+    def _queue_zeromq_misp_message(self, message):
+        """
+        Queue a received MISP ZeroMQ message for processing by the
+        notification dispatcher, if its topic is one which should be
+        processed.
+
+        :param zmq.Frame message: The ZeroMQ message.
+        """
+        topic_and_payload = split_notification(
+            message, self._zeromq_max_topic_length)
+        if not topic_and_payload:
+            return
+        topic, payload = topic_and_payload
+        if self._notification_gap_detector:
+            if topic == self._ZEROMQ_HEARTBEAT_TOPIC_BYTES:
+                try:
+                    self._notification_gap_detector.heartbeat(
+                        decode_json_payload(payload))
+                except ValueError as ex:
+                    logger.debug("Unable to parse heartbeat: %s", ex)
+                    self._notification_gap_detector.received()
+            else:
+                self._notification_gap_detector.received()
+
+        # ZeroMQ will deliver notifications for any topic which starts
+        # with the subscribed topic name. Notifications should only be
+        # processed for messages whose topic exactly matches an entry
+        # in the DXL service configuration file. For example, if the
+        # DXL service configuration file includes only the topic
+        # "misp_json", the ZeroMQ socket would provide messages with a
+        # topic of either "misp_json" or "misp_json_self" to the
+        # ZeroMQ subscriber. Only messages with a topic of "misp_json"
+        # (not "misp_json_self") should be processed.
+        route = self._zeromq_notification_routes.get(topic)
+        if route:
+            logger.debug("Received notification for %s", route.zeromq_topic)
+            if self._notification_counter is not None:
+                self._notification_counter.inc(route.zeromq_topic, "received")
+            self._notification_dispatcher.put(route, payload)
+
+    def _process_zeromq_misp_message(self, route, payload, catch_up=False):
+        """
+        Process a MISP ZeroMQ notification, invoked on a notification
+        dispatcher worker thread. Evict cached responses which refer to data
+        in the notification and, if it matches the notification filter,
+        forward the notification to the DXL fabric.
+
+        :param NotificationRoute route: How to process the notification.
+        :param memoryview payload: The JSON payload of the ZeroMQ
+            notification.
+        :param bool catch_up: Whether or not the notification republishes a
+            change which was made during a gap in the notifications. Such
+            notifications are counted as `caught_up` when they are
+            processed.
+        """
+        if catch_up:
+            self._count_notification(route, "caught_up")
+        try:
+            result = self._handle_zeromq_misp_message(route, payload)
+        except Exception:
+            self._count_notification(route, "failed")
+            raise
+        self._count_notification(route, result)
+
+    def _handle_zeromq_misp_message(self, route, payload):
+        """
+        Evict cached responses which refer to data in a MISP ZeroMQ
+        notification, apply the attributes in the notification to the
+        indicator index and, if it matches the notification filter, forward
+        the notification to the DXL fabric.
+
+        :param NotificationRoute route: How to process the notification.
+        :param memoryview payload: The JSON payload of the ZeroMQ
+            notification.
+        :return: The result of processing the notification: `forwarded`,
+            `filtered`, or `None` if the notification was only used to evict
+            cached responses or update the indicator index.
+        :rtype: str
+        """
+        data = None
+        malformed = False
+        if route.invalidate_cache or route.update_index or \
+                (route.event_topic and self._notification_filter):
+            try:
+                data = decode_json_payload(payload)
+            except ValueError as ex:
+                malformed = True
+                logger.warning("Unable to parse notification for %s: %s",
+                               route.zeromq_topic, ex)
+
+        if route.invalidate_cache and data is not None:
+            self._invalidate_cached_responses(route.zeromq_topic, data)
+
+        if route.update_index and data is not None:
+            self._indicator_index.apply_notification(data)
+
+        if route.event_topic:
+            if self._notification_filter and (
+                    data is None or not self._notification_filter.matches(
+                        data)):
+                logger.debug("Notification for %s filtered out",
+                             route.zeromq_topic)
+                return "filtered"
+            # A payload which is known not to be JSON is sent on its own, so
+            # that it does not invalidate the other payloads in a batch.
+            if self._notification_batcher and not malformed:
+                self._notification_batcher.add(route.event_topic, payload)
+            else:
+                self._send_notification_event(route.event_topic, payload)
+            return "forwarded"
+        return None
+
+    def _count_notification(self, route, result):
+        """
+        Count a processed MISP ZeroMQ notification, if metrics are enabled.
+
+        :param NotificationRoute route: How the notification was processed.
+        :param str result: The result of processing the notification.
+        """
+        if self._notification_counter is not None and result:
+            self._notification_counter.inc(route.zeromq_topic, result)
+
+    def _on_zeromq_misp_message_dropped(self, route, payload,
+                                        catch_up=False):
+        """
+        Invoked when a MISP ZeroMQ notification is dropped because the
+        notification queue is full. Since the changes described by the
+        notification cannot be applied to the response cache, all cached
+        responses are evicted.
+
+        :param NotificationRoute route: How the notification would have been
+            processed.
+        :param memoryview payload: The JSON payload of the ZeroMQ
+            notification.
+        :param bool catch_up: Whether or not the notification republished a
+            change which was made during a gap in the notifications.
+        """
+        del payload
+        self._count_notification(route, "dropped")
+        if catch_up:
+            # Recording another gap for a dropped catch-up notification would
+            # start another catch-up, which could drop more notifications in
+            # turn. The cache was already invalidated when the catch-up began.
+            if route.update_index:
+                logger.warning("Catch-up notification for %s dropped, "
+                               "indicator index may be out of date",
+                               route.zeromq_topic)
+            return
+        if route.invalidate_cache:
+            logger.debug("Notification for %s dropped, evicting all cached "
+                         "responses", route.zeromq_topic)
+            self._response_cache.invalidate_all()
+        if route.update_index:
+            logger.warning("Notification for %s dropped, indicator index may "
+                           "be out of date", route.zeromq_topic)
+        if self._notification_gap_detector:
+            self._notification_gap_detector.add_gap()
+
+    def _catch_up_lost_notifications(self):
+        """
+        Check for gaps in the MISP ZeroMQ notifications every
+        `_NOTIFICATION_GAP_CHECK_INTERVAL` seconds, until the application is
+        destroyed, and republish the changes made during each gap. Invoked
+        on a background thread.
+        """
+        stalled = False
+        while not self._notification_catch_up_stop.wait(
+                self._NOTIFICATION_GAP_CHECK_INTERVAL):
+            if self._notification_gap_detector.stalled != stalled:
+                stalled = not stalled
+                if stalled:
+                    logger.warning(
+                        "No MISP ZeroMQ messages received for %s seconds, "
+                        "notifications may be lost",
+                        self._notification_stall_timeout)
+                else:
+                    logger.info("Receiving MISP ZeroMQ messages again")
+            gap_start = self._notification_gap_detector.take_gap()
+            if gap_start is None:
+                continue
+            try:
+                self._republish_changes_since(
+                    gap_start - self._NOTIFICATION_CATCH_UP_MARGIN)
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.error("Unable to republish lost notifications: %s. "
+                             "Retrying in %s seconds.", ex,
+                             self._NOTIFICATION_GAP_CHECK_INTERVAL)
+                self._notification_gap_detector.add_gap(gap_start)
+
+    def _republish_changes_since(self, since):
+        """
+        Search the MISP server for the events and attributes modified since
+        a point in time and queue each of them for processing as a MISP
+        ZeroMQ notification, for the topics (`misp_json` and
+        `misp_json_attribute`) whose notifications are processed. The
+        republished notifications have an `action` of `catch-up`.
+
+        :param float since: The time, in seconds since the epoch.
+        """
+        if self._response_cache_invalidation_topics:
+            # Changes for topics which are not republished may have been
+            # lost.
+            self._response_cache.invalidate_all()
+        for topic, controller, key in self._NOTIFICATION_CATCH_UP_SOURCES:
+            if self._notification_catch_up_stop.is_set():
+                return
+            route = self._zeromq_notification_routes.get(
+                topic.encode("utf-8"))
+            if route is None:
+                continue
+            data = self._search_for_catch_up(
+                controller=controller, timestamp=int(since),
+                limit=self._notification_catch_up_max_results, page=1)
+            if self._notification_catch_up_stop.is_set():
+                return
+            items = find_stream_items(data)
+            if items is None:
+                raise ValueError("Unexpected search result: {}".format(
+                    data.get("errors", data)
+                    if isinstance(data, dict) else data))
+            logger.info("Republishing %d changes since %d for %s", len(items),
+                        since, topic)
+            if len(items) >= self._notification_catch_up_max_results:
+                logger.warning(
+                    "More than %d changes since %d for %s, only the first %d "
+                    "are republished", self._notification_catch_up_max_results,
+                    since, topic, self._notification_catch_up_max_results)
+            for item in items:
+                if self._notification_catch_up_stop.is_set():
+                    return
+                if not isinstance(item, dict):
+                    continue
+                payload = dumps({key: item.get(key, item),
+                                 "action": "catch-up"})
+                self._notification_dispatcher.put(route, payload, True)
+
+    def _search_for_catch_up(self, **kwargs):
+        """
+        Search the MISP server for the changes to republish in a catch-up.
+        If MISP API calls are executed on worker threads, the search is
+        queued on the API executor, at a lower priority than the calls for
+        every other API, and the wait for it ends early if the application
+        is destroyed.
+
+        :param kwargs: The parameters for the search.
+        :return: The search result, or `None` if the application was
+            destroyed before the search completed.
+        :raises RejectedError: If the search could not be queued.
+        """
+        if not self._api_executor:
+            return self._api_client.search(**kwargs)
+        done = threading.Event()
+        outcome = []
+
+        def search():
+            try:
+                outcome.append((self._api_client.search(**kwargs), None))
+            except Exception as ex:  # pylint: disable=broad-except
+                outcome.append((None, ex))
+            finally:
+                done.set()
+
+        self._api_executor.submit(self._NOTIFICATION_CATCH_UP_API_NAME,
+                                  search)
+        while not done.wait(self._NOTIFICATION_GAP_CHECK_INTERVAL):
+            if self._notification_catch_up_stop.is_set():
+                return None
+        data, error = outcome[0]
+        if error:
+            raise error
+        return data
+
+    def _send_notification_event(self, topic, payload):
+        """
+        Send an event for one or more MISP ZeroMQ notifications to the DXL
+        fabric.
+
+        :param str topic: The DXL topic for the event.
+        :param payload: The payload for the event.
+        """
+        event = Event(topic)
+        logger.debug("Forwarding notification to %s ...", topic)
+        event.payload = payload
+        compress_message(event, self._notification_compression)
+        self.client.send_event(event)
+
+    def _invalidate_cached_responses(self, topic, data):
+        """
+        Evict cached responses which refer to any of the MISP events,
+        attributes, tags, or attribute values included in a MISP ZeroMQ
+        notification.
+
+        :param str topic: The topic of the ZeroMQ notification.
+        :param data: The content of the ZeroMQ notification (as decoded
+            from JSON).
+        """
+        references = extract_data_references(data)
+        if references:
+            evicted = self._response_cache.invalidate(references)
+            logger.debug("Evicted %d cached responses for notification %s",
+                         evicted, topic)
 
     @staticmethod
     def _close_zeromq_socket(socket, description):
@@ -438,20 +2036,42 @@ class MispService(Application):
         Destroys the application (disconnects from fabric and frees resources
         allocated to handle ZeroMQ notifications)
         """
-        super(MispService, self).destroy()
         with self.__lock:
-            if not self.__destroyed:
+            destroying = not self.__destroyed
+            if destroying:
                 self.__destroyed = True
-                self._close_zeromq_socket(self._zeromq_misp_sub_socket, "MISP")
-                if self._zeromq_shutdown_push_socket:
-                    # Send message to the Shutdown PULL socket to interrupt
-                    # the ZeroMQ polling operation
-                    self._zeromq_shutdown_push_socket.send_string("interrupt")
-                if self._zeromq_thread:
-                    logger.debug(
-                        "Waiting for ZeroMQ message thread to terminate ...")
-                    self._zeromq_thread.join()
-                    logger.debug("ZeroMQ message thread terminated")
+                self._indicator_index_stop.set()
+                self._notification_catch_up_stop.set()
+                # Stop receiving notifications and finish forwarding those
+                # already received before the client is disconnected from the
+                # fabric.
+                self._stop_zeromq_misp_message_processing()
+                if self._notification_catch_up_thread:
+                    # Wait for a catch-up in progress, which may be calling
+                    # the MISP server, before the API client is closed.
+                    logger.debug("Waiting for notification catch-up thread "
+                                 "to terminate ...")
+                    self._notification_catch_up_thread.join(
+                        self._NOTIFICATION_CATCH_UP_STOP_TIMEOUT)
+                    if self._notification_catch_up_thread.is_alive():
+                        logger.warning(
+                            "Notification catch-up thread did not terminate "
+                            "within %s seconds",
+                            self._NOTIFICATION_CATCH_UP_STOP_TIMEOUT)
+                if self._api_executor:
+                    # Respond to requests which are already queued before the
+                    # client is disconnected from the fabric. Requests which
+                    # arrive after this point are rejected.
+                    logger.debug("Waiting for queued MISP API calls ...")
+                    self._api_executor.close()
+        if destroying and self._indicator_index is not None:
+            # Save the index with the changes from all of the notifications
+            # received, so that a restarted application only loads those made
+            # while it was stopped.
+            self._save_indicator_index_snapshot()
+        super(MispService, self).destroy()
+        if destroying:
+            with self.__lock:
                 self._close_zeromq_socket(self._zeromq_shutdown_push_socket,
                                           "Shutdown PUSH")
                 self._close_zeromq_socket(self._zeromq_shutdown_pull_socket,
@@ -467,6 +2087,36 @@ class MispService(Application):
                     logger.debug("Terminating ZeroMQ context...")
                     self._zeromq_context.term()
                     logger.debug("ZeroMQ context terminated")
+                if self._api_client:
+                    logger.debug("Closing MISP API connections ...")
+                    self._api_client.close()
+                if self._metrics_http_server:
+                    logger.debug("Stopping metrics HTTP server ...")
+                    self._metrics_http_server.close()
+
+    def _stop_zeromq_misp_message_processing(self):
+        """
+        Stop the thread which receives MISP ZeroMQ notifications and wait for
+        notifications which have already been received to be processed.
+        """
+        self._close_zeromq_socket(self._zeromq_misp_sub_socket, "MISP")
+        if self._zeromq_shutdown_push_socket:
+            # Send message to the Shutdown PULL socket to interrupt
+            # the ZeroMQ polling operation
+            self._zeromq_shutdown_push_socket.send_string("interrupt")
+        if self._notification_dispatcher:
+            # Closing the dispatcher also releases the ZeroMQ message thread
+            # if it is waiting for space in the notification queue.
+            logger.debug("Waiting for queued notifications to be processed ...")
+            self._notification_dispatcher.close()
+        if self._zeromq_thread:
+            logger.debug(
+                "Waiting for ZeroMQ message thread to terminate ...")
+            self._zeromq_thread.join()
+            logger.debug("ZeroMQ message thread terminated")
+        if self._notification_batcher:
+            # Send any pending batches of notifications.
+            self._notification_batcher.close()
 
     def on_dxl_connect(self):
         """
@@ -485,6 +2135,8 @@ class MispService(Application):
         :rtype: instancemethod
         """
         api_method = None
+        if api_name in MispApiClient.MANAGEMENT_METHODS:
+            return api_method
         if hasattr(self._api_client, api_name):
             api_attr = getattr(self._api_client, api_name)
             if callable(api_attr):
@@ -504,12 +2156,18 @@ class MispService(Application):
                 logger.warning("MISP API name is invalid: %s",
                                api_name)
 
-        if api_methods:
+        if api_methods or self._metrics_dxl_topic_enabled or \
+                self._indicator_index is not None:
             logger.info("Registering service: misp_service")
+            stream_topic_prefix = "{}{}".format(
+                self._STREAM_EVENT_TOPIC,
+                "/{}".format(self._service_unique_id)
+                if self._service_unique_id else "")
             service = ServiceRegistrationInfo(
                 self._dxl_client,
                 self._SERVICE_TYPE)
 
+            batch_callbacks = {}
             for api_method in api_methods:
                 api_method_name = api_method.__name__
                 topic = "{}{}/{}".format(
@@ -525,10 +2183,73 @@ class MispService(Application):
                     api_method_name,
                     "requesthandler",
                     topic)
+                callback = MispServiceRequestCallback(
+                    self, api_method,
+                    self._response_cache
+                    if api_method_name in self._response_cache_api_names
+                    else None,
+                    self._single_flight
+                    if api_method_name in self._coalesced_api_names
+                    else None,
+                    self._metrics,
+                    self._api_executor,
+                    stream_topic_prefix
+                    if api_method_name in self._streamed_api_names
+                    else None,
+                    SearchPaginator(
+                        api_method, self._search_page_size,
+                        self._search_parallel_pages,
+                        self._search_max_pages)
+                    if api_method_name == self._SEARCH_API_NAME and
+                    self._search_page_size > 0 else None)
+                self.add_request_callback(service, topic, callback, False)
+                batch_callbacks[api_method_name] = (topic, callback)
+
+            if batch_callbacks and self._batch_max_operations > 0:
+                topic = "{}{}/{}".format(
+                    self._SERVICE_TYPE,
+                    "/{}".format(self._service_unique_id)
+                    if self._service_unique_id else "",
+                    self._BATCH_REQUEST_TOPIC_NAME)
+                logger.info("Registering batch request callback. Topic: %s.",
+                            topic)
+                self.add_request_callback(
+                    service,
+                    topic,
+                    MispServiceBatchRequestCallback(
+                        self, batch_callbacks, self._batch_max_operations,
+                        self._batch_parallel_operations, self._metrics,
+                        self._api_executor),
+                    False)
+
+            if self._indicator_index is not None:
+                topic = "{}{}/{}".format(
+                    self._SERVICE_TYPE,
+                    "/{}".format(self._service_unique_id)
+                    if self._service_unique_id else "",
+                    self._LOOKUP_REQUEST_TOPIC_NAME)
+                logger.info("Registering lookup request callback. Topic: %s.",
+                            topic)
+                self.add_request_callback(
+                    service,
+                    topic,
+                    MispServiceLookupRequestCallback(
+                        self, self._indicator_index,
+                        self._indicator_index_max_lookup_values,
+                        self._metrics),
+                    False)
+
+            if self._metrics_dxl_topic_enabled:
+                topic = "{}{}".format(
+                    self._METRICS_REQUEST_TOPIC,
+                    "/{}".format(self._service_unique_id)
+                    if self._service_unique_id else "")
+                logger.info("Registering metrics request callback. Topic: %s.",
+                            topic)
                 self.add_request_callback(
                     service,
                     topic,
-                    MispServiceRequestCallback(self, api_method),
+                    MispServiceMetricsRequestCallback(self, self._metrics),
                     False)
 
             self.register_service(service)
@@ -78,7 +78,9 @@ setup(
 
     extras_require={
         "dev": DEV_REQUIREMENTS,
-        "test": TEST_REQUIREMENTS
+        "fastjson": ["orjson; python_version >= '3.6'"],
+        "test": TEST_REQUIREMENTS,
+        "zstd": ["zstandard"]
     },
 
     test_suite="nose.collector",
@@ -0,0 +1,25 @@
+from __future__ import absolute_import
+
+
+class FakeClient(object):
+    """
+    Stand-in for the DXL client of an application, which records the events
+    and responses sent with it.
+    """
+    def __init__(self):
+        self.events = []
+        self.responses = []
+
+    def send_event(self, event):
+        self.events.append(event)
+
+    def send_response(self, response):
+        self.responses.append(response)
+
+
+class FakeApp(object):
+    """
+    Stand-in for the application passed to request callbacks.
+    """
+    def __init__(self):
+        self.client = FakeClient()
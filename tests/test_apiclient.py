@@ -0,0 +1,128 @@
+from __future__ import absolute_import
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import requests_mock
+from pymisp import PyMISPError
+
+from dxlmispservice import MispService
+from dxlmispservice._apiclient import MispApiClient, create_session
+
+_URL = "https://127.0.0.1:443/"
+_DESCRIBE_TYPES = {"result": {
+    "categories": ["Other"],
+    "sane_defaults": {"comment": {"default_category": "Other", "to_ids": 0}},
+    "types": ["comment"],
+    "category_type_mappings": {"Other": ["comment"]}}}
+
+
+class TestMispApiClient(unittest.TestCase):
+    def setUp(self):
+        self.req_mock = requests_mock.Mocker()
+        self.req_mock.start()
+        self.addCleanup(self.req_mock.stop)
+        self.version_calls = 0
+        self.version_delay = 0
+        self.req_mock.get(_URL + "servers/getPyMISPVersion.json",
+                          text=self._version)
+        self.req_mock.get(_URL + "attributes/describeTypes.json",
+                          text=json.dumps(_DESCRIBE_TYPES))
+        self.req_mock.get(_URL + "events/1",
+                          text=json.dumps({"Event": {"id": "1"}}))
+
+    def _version(self, request, context):
+        del request, context
+        self.version_calls += 1
+        time.sleep(self.version_delay)
+        return json.dumps({"version": "2.4.111"})
+
+    def _create_client(self, **kwargs):
+        client = MispApiClient(_URL, "key", create_session(1), **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_management_methods_not_exposed_as_apis(self):
+        config_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, config_dir)
+        app = MispService(config_dir)
+        app._api_client = self._create_client(check_server=False)
+        self.assertIsNotNone(app._get_api_method("get_event"))
+        for api_name in MispApiClient.MANAGEMENT_METHODS:
+            self.assertIsNone(app._get_api_method(api_name))
+
+    def test_connect_checks_server_after_construction(self):
+        client = self._create_client()
+        self.assertEqual(0, self.req_mock.call_count)
+        self.assertFalse(client.ready)
+        client.connect()
+        self.assertTrue(client.ready)
+        self.assertEqual(1, self.version_calls)
+        self.assertEqual(["comment"], client.types)
+        self.assertEqual({"Event": {"id": "1"}}, client.get_event(1))
+
+    def test_connect_warns_if_newer_pymisp_recommended(self):
+        self.req_mock.get(_URL + "servers/getPyMISPVersion.json",
+                          text=json.dumps({"version": "99.0.0"}))
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        apiclient_logger = logging.getLogger("dxlmispservice._apiclient")
+        apiclient_logger.addHandler(handler)
+        self.addCleanup(apiclient_logger.removeHandler, handler)
+        self._create_client().connect()
+        self.assertTrue(any(
+            record.levelno == logging.WARNING and
+            "Please upgrade PyMISP" in record.getMessage()
+            for record in records))
+
+    def test_connect_raises_if_server_unreachable(self):
+        self.req_mock.get(_URL + "servers/getPyMISPVersion.json",
+                          status_code=500, text="not json")
+        client = self._create_client(ready_timeout=0)
+        with self.assertRaises(PyMISPError):
+            client.connect()
+        self.assertFalse(client.ready)
+
+    def test_no_server_check(self):
+        client = self._create_client(check_server=False)
+        self.assertTrue(client.ready)
+        self.assertEqual({"Event": {"id": "1"}}, client.get_event(1))
+        self.assertEqual(0, self.version_calls)
+        self.assertIn("ip-dst", client.types)
+
+    def test_calls_wait_for_background_connect(self):
+        self.version_delay = 0.2
+        client = self._create_client(ready_timeout=5)
+        client.connect_in_background(retry_delay=0.1)
+        self.assertEqual({"Event": {"id": "1"}}, client.get_event(1))
+        self.assertTrue(client.ready)
+        self.assertEqual(["comment"], client.types)
+
+    def test_calls_fail_after_ready_timeout(self):
+        client = self._create_client(ready_timeout=0.1)
+        with self.assertRaises(PyMISPError):
+            client.get_event(1)
+        self.assertFalse(self.req_mock.called)
+
+    def test_close_releases_waiting_calls(self):
+        client = self._create_client(ready_timeout=30)
+        errors = []
+
+        def call():
+            try:
+                client.get_event(1)
+            except PyMISPError as ex:
+                errors.append(ex)
+
+        thread = threading.Thread(target=call)
+        thread.start()
+        time.sleep(0.1)
+        client.close()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(1, len(errors))
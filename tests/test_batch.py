@@ -0,0 +1,137 @@
+from __future__ import absolute_import
+import json
+import threading
+import time
+import unittest
+
+from dxlclient.message import ErrorResponse, Request
+from dxlbootstrap.util import MessageUtils
+
+from dxlmispservice._executor import ApiExecutor
+from dxlmispservice._requesthandlers import MispServiceBatchRequestCallback, \
+    MispServiceRequestCallback
+from dxlmispservice._responsecache import ResponseCache
+from tests._fakes import FakeApp
+
+
+class _FakeApi(object):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.max_concurrent = 0
+        self.threads = set()
+        self._concurrent = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.threads.add(threading.current_thread())
+            self._concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self._concurrent)
+        time.sleep(self.delay)
+        with self._lock:
+            self._concurrent -= 1
+
+    def get_event(self, event):
+        self._enter()
+        if event == 0:
+            return {"errors": ["Event not found"]}
+        if event < 0:
+            raise Exception("Invalid event")
+        return {"Event": {"id": str(event)}}
+
+    def search(self, **kwargs):
+        self._enter()
+        return {"response": [kwargs]}
+
+
+class BatchRequestCallbackTest(unittest.TestCase):
+    def _create_callback(self, api, response_cache=None, executor=None,
+                         parallel_operations=4):
+        app = FakeApp()
+        callbacks = {}
+        for api_method in (api.get_event, api.search):
+            callbacks[api_method.__name__] = (
+                "/misp/" + api_method.__name__,
+                MispServiceRequestCallback(app, api_method, response_cache,
+                                           executor=executor))
+        return app, MispServiceBatchRequestCallback(
+            app, callbacks, 5, parallel_operations, executor=executor)
+
+    @staticmethod
+    def _request(payload):
+        request = Request("/misp/batch")
+        MessageUtils.dict_to_json_payload(request, payload)
+        return request
+
+    def test_results_in_order(self):
+        app, callback = self._create_callback(_FakeApi())
+        callback.on_request(self._request({"operations": [
+            {"api": "get_event", "args": {"event": "3"}},
+            {"api": "search", "args": {"tags": "apt"}},
+            {"api": "get_event", "args": {"event": 0}},
+            {"api": "get_event", "args": {"event": -1}},
+            {"api": "add_event"}]}))
+        self.assertEqual(1, len(app.client.responses))
+        responses = json.loads(MessageUtils.decode_payload(
+            app.client.responses[0]))["responses"]
+        self.assertEqual(
+            {"api": "get_event", "response": {"Event": {"id": "3"}}},
+            responses[0])
+        self.assertEqual(
+            {"api": "search", "response": {"response": [{"tags": "apt"}]}},
+            responses[1])
+        self.assertEqual("Event not found", responses[2]["error"])
+        self.assertEqual(["Event not found"],
+                         responses[2]["response"]["errors"])
+        self.assertEqual({"api": "get_event", "error": "Invalid event"},
+                         responses[3])
+        self.assertEqual("add_event", responses[4]["api"])
+        self.assertNotIn("response", responses[4])
+
+    def test_bounded_parallelism(self):
+        api = _FakeApi(delay=0.05)
+        app, callback = self._create_callback(api, parallel_operations=2)
+        callback.on_request(self._request({"operations": [
+            {"api": "get_event", "args": {"event": index}}
+            for index in range(1, 6)]}))
+        self.assertEqual(2, api.max_concurrent)
+        # The operations share two threads, one of them the calling thread.
+        self.assertEqual(2, len(api.threads))
+        self.assertIn(threading.current_thread(), api.threads)
+        responses = json.loads(MessageUtils.decode_payload(
+            app.client.responses[0]))["responses"]
+        self.assertEqual([str(index) for index in range(1, 6)],
+                         [result["response"]["Event"]["id"]
+                          for result in responses])
+
+    def test_executor_and_cache(self):
+        executor = ApiExecutor(2, 1)
+        try:
+            api = _FakeApi(delay=0.02)
+            app, callback = self._create_callback(
+                api, ResponseCache(10, 60), executor)
+            payload = {"operations": [
+                {"api": "get_event", "args": {"event": index}}
+                for index in (1, 2, 1, 2)]}
+            callback.on_request(self._request(payload))
+            callback.on_request(self._request(payload))
+        finally:
+            executor.close()
+        # The concurrency limit for get_event applies to the operations.
+        self.assertEqual(1, api.max_concurrent)
+        first, second = [
+            json.loads(MessageUtils.decode_payload(response))
+            for response in app.client.responses]
+        self.assertEqual(first, second)
+        self.assertEqual(["1", "2", "1", "2"],
+                         [result["response"]["Event"]["id"]
+                          for result in second["responses"]])
+
+    def test_invalid_requests(self):
+        app, callback = self._create_callback(_FakeApi())
+        for payload in ({}, {"operations": []}, {"operations": "search"},
+                        {"operations": [{"api": "search"}] * 6}):
+            callback.on_request(self._request(payload))
+        self.assertEqual(4, len(app.client.responses))
+        self.assertTrue(all(isinstance(response, ErrorResponse)
+                            for response in app.client.responses))
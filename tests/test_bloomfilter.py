@@ -0,0 +1,43 @@
+from __future__ import absolute_import
+import unittest
+
+from dxlmispservice._bloomfilter import BloomFilter
+
+
+class BloomFilterTest(unittest.TestCase):
+    def test_added_values_are_present(self):
+        bloom_filter = BloomFilter(1000, 0.01)
+        for index in range(1000):
+            bloom_filter.add("value{}".format(index))
+        self.assertEqual(1000, len(bloom_filter))
+        for index in range(1000):
+            self.assertIn("value{}".format(index), bloom_filter)
+
+    def test_false_positive_rate(self):
+        bloom_filter = BloomFilter(1000, 0.01)
+        for index in range(1000):
+            bloom_filter.add("value{}".format(index))
+        false_positives = sum(1 for index in range(10000)
+                              if "other{}".format(index) in bloom_filter)
+        self.assertLess(false_positives, 300)
+
+    def test_size(self):
+        # About 1.2 bytes per value for a 1% error rate.
+        self.assertEqual(1199, BloomFilter(1000, 0.01).size)
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            BloomFilter(0, 0.01)
+        with self.assertRaises(ValueError):
+            BloomFilter(1000, 1)
+
+    def test_from_bytes(self):
+        bloom_filter = BloomFilter(1000, 0.01)
+        bloom_filter.add("value")
+        copy = BloomFilter.from_bytes(1000, 0.01, 1,
+                                      bloom_filter.to_bytes())
+        self.assertIn("value", copy)
+        self.assertNotIn("other", copy)
+        self.assertEqual(1, len(copy))
+        with self.assertRaises(ValueError):
+            BloomFilter.from_bytes(2000, 0.01, 1, bloom_filter.to_bytes())
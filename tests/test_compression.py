@@ -0,0 +1,103 @@
+from __future__ import absolute_import
+import json
+import unittest
+import zlib
+
+from dxlclient.message import ErrorResponse, Request
+from dxlbootstrap.util import MessageUtils
+
+from dxlmispservice import _compression
+from dxlmispservice._compression import COMPRESSION_FIELD, check_codec, \
+    compress, compress_message, decompress, decompress_message, \
+    pop_compression_option
+from dxlmispservice._requesthandlers import MispServiceRequestCallback
+from tests._fakes import FakeApp
+
+
+class CompressionTest(unittest.TestCase):
+    def test_zlib_round_trip(self):
+        data = b'{"Attribute": [' + b", ".join(
+            [b'{"value": "10.0.0.1"}'] * 100) + b"]}"
+        compressed = compress(memoryview(data), "zlib")
+        self.assertLess(len(compressed), len(data) // 10)
+        self.assertEqual(data, zlib.decompress(compressed))
+        self.assertEqual(data, decompress(compressed, "zlib"))
+
+    @unittest.skipIf(_compression.zstandard is None,
+                     "zstandard is not installed")
+    def test_zstd_round_trip(self):
+        data = b"MISP " * 1000
+        self.assertEqual(data, decompress(compress(data, "zstd"), "zstd"))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            check_codec("gzip")
+        with self.assertRaises(ValueError):
+            decompress(b"not compressed", "zlib")
+
+    def test_pop_compression_option(self):
+        request_dict = {"eventinfo": "x", "dxl_compression": "zlib"}
+        self.assertEqual("zlib", pop_compression_option(request_dict))
+        self.assertEqual({"eventinfo": "x"}, request_dict)
+        self.assertIsNone(pop_compression_option(request_dict))
+        with self.assertRaises(ValueError):
+            pop_compression_option({"dxl_compression": "lzma"})
+
+    def test_message_round_trip(self):
+        request = Request("/topic")
+        request.payload = b'{"event": 1}'
+        compress_message(request, "zlib")
+        self.assertEqual("zlib", request.other_fields[COMPRESSION_FIELD])
+        decompress_message(request)
+        self.assertEqual(b'{"event": 1}', request.payload)
+        self.assertNotIn(COMPRESSION_FIELD, request.other_fields)
+        compress_message(request, None)
+        self.assertEqual(b'{"event": 1}', request.payload)
+
+
+class CompressedRequestTest(unittest.TestCase):
+    def setUp(self):
+        self.app = FakeApp()
+
+        def get_event(event):
+            if event == 0:
+                return {"errors": ["Event not found"]}
+            return {"Event": {"id": str(event)}}
+
+        self.callback = MispServiceRequestCallback(self.app, get_event)
+
+    def test_compressed_response(self):
+        request = Request("/misp/get_event")
+        MessageUtils.dict_to_json_payload(
+            request, {"event": "5", "dxl_compression": "zlib"})
+        self.callback.on_request(request)
+        response = self.app.client.responses[0]
+        self.assertEqual("zlib", response.other_fields[COMPRESSION_FIELD])
+        self.assertEqual({"Event": {"id": "5"}}, json.loads(
+            zlib.decompress(response.payload).decode("utf-8")))
+
+    def test_compressed_request(self):
+        request = Request("/misp/get_event")
+        request.payload = zlib.compress(b'{"event": 7}')
+        request.other_fields[COMPRESSION_FIELD] = "zlib"
+        self.callback.on_request(request)
+        response = self.app.client.responses[0]
+        self.assertNotIn(COMPRESSION_FIELD, response.other_fields)
+        self.assertEqual({"Event": {"id": "7"}},
+                         MessageUtils.json_payload_to_dict(response))
+
+    def test_error_response_not_compressed(self):
+        request = Request("/misp/get_event")
+        MessageUtils.dict_to_json_payload(
+            request, {"event": 0, "dxl_compression": "zlib"})
+        self.callback.on_request(request)
+        response = self.app.client.responses[0]
+        self.assertIsInstance(response, ErrorResponse)
+        self.assertNotIn(COMPRESSION_FIELD, response.other_fields)
+
+    def test_unsupported_codec(self):
+        request = Request("/misp/get_event")
+        MessageUtils.dict_to_json_payload(
+            request, {"event": 5, "dxl_compression": "lzma"})
+        self.callback.on_request(request)
+        self.assertIsInstance(self.app.client.responses[0], ErrorResponse)
@@ -0,0 +1,100 @@
+from __future__ import absolute_import
+import threading
+import time
+import unittest
+
+from dxlmispservice._executor import ApiExecutor, RejectedError
+
+
+class ApiExecutorTest(unittest.TestCase):
+    def test_limit_does_not_block_other_apis(self):
+        executor = ApiExecutor(3, 3, {"search": 1})
+        release = threading.Event()
+        search_started = threading.Event()
+        tag_done = threading.Event()
+        calls = []
+
+        def search(value):
+            search_started.set()
+            release.wait(5)
+            calls.append(("search", value))
+
+        try:
+            executor.submit("search", search, 1)
+            search_started.wait(5)
+            executor.submit("search", search, 2)
+            executor.submit("tag", tag_done.set)
+            # The tag call runs even though a search call is in flight and
+            # another is waiting for the search limit.
+            self.assertTrue(tag_done.wait(5))
+            self.assertEqual((1, 1), executor.stats()["search"])
+            release.set()
+        finally:
+            executor.close()
+        self.assertEqual([("search", 1), ("search", 2)], calls)
+
+    def test_close_waits_for_calls_held_by_limit(self):
+        executor = ApiExecutor(3, 1)
+        calls = []
+
+        def search(value):
+            time.sleep(0.05)
+            calls.append(value)
+
+        for value in range(3):
+            executor.submit("search", search, value)
+        executor.close()
+        self.assertEqual([0, 1, 2], calls)
+
+    def test_higher_priority_executed_first(self):
+        executor = ApiExecutor(1, 1, priorities={"sighting": 10})
+        release = threading.Event()
+        started = threading.Event()
+        calls = []
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        try:
+            executor.submit("search", block)
+            started.wait(5)
+            executor.submit("search", calls.append, "search")
+            executor.submit("tag", calls.append, "tag")
+            executor.submit("sighting", calls.append, "sighting")
+            release.set()
+        finally:
+            executor.close()
+        self.assertEqual(["sighting", "search", "tag"], calls)
+
+    def test_full_queue_rejected(self):
+        executor = ApiExecutor(1, 1, default_max_queue_size=1,
+                               max_queue_sizes={"tag": 0})
+        release = threading.Event()
+        started = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        try:
+            executor.submit("search", block)
+            started.wait(5)
+            executor.submit("search", block)
+            self.assertRaises(RejectedError, executor.submit, "search",
+                              block)
+            # The queue for "tag" is not limited.
+            executor.submit("tag", lambda: None)
+            executor.submit("tag", lambda: None)
+            release.set()
+        finally:
+            executor.close()
+
+    def test_submit_after_close_rejected(self):
+        executor = ApiExecutor(1, 1)
+        executor.close()
+        self.assertRaises(RejectedError, executor.submit, "search",
+                          lambda: None)
+
+    def test_invalid_limit_rejected(self):
+        self.assertRaises(ValueError, ApiExecutor, 1, 1, {"search": 0})
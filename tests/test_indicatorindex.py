@@ -0,0 +1,362 @@
+from __future__ import absolute_import
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dxlclient.message import ErrorResponse, Request
+
+from dxlmispservice._indicatorindex import IndicatorFilter, IndicatorIndex, \
+    _IndicatorStore
+from dxlmispservice._pagination import SearchPaginator
+from dxlmispservice._requesthandlers import MispServiceLookupRequestCallback
+from tests._fakes import FakeApp
+
+
+def _attribute(attribute_id, attribute_type, value, event_id=1, **kwargs):
+    attribute = {"id": str(attribute_id), "event_id": str(event_id),
+                 "type": attribute_type, "category": "Network activity",
+                 "value": value, "to_ids": True, "timestamp": "1500000000"}
+    attribute.update(kwargs)
+    return attribute
+
+
+class IndicatorIndexTest(unittest.TestCase):
+    def test_lookup(self):
+        index = IndicatorIndex()
+        index.add_attribute(_attribute(1, "md5",
+                                       "44D88612FEA8A8F36DE82E1278ABB02F"))
+        index.add_attribute(_attribute(2, "url", "http://Example.com/Path"))
+        self.assertEqual(
+            ["1"], [match["id"] for match in
+                    index.lookup("44d88612fea8a8f36de82e1278abb02f")])
+        self.assertEqual(
+            ["2"], [match["id"] for match in
+                    index.lookup("http://Example.com/Path")])
+        self.assertEqual([], index.lookup("http://example.com/path"))
+        self.assertEqual([], index.lookup("unknown"))
+
+    def test_case_sensitive_types_not_matched_regardless_of_case(self):
+        index = IndicatorIndex()
+        index.add_attribute(_attribute(1, "url", "http://example.com/path"))
+        index.add_attribute(_attribute(2, "filename|md5", "evil.exe|aabb"))
+        self.assertEqual([], index.lookup("HTTP://EXAMPLE.COM/PATH"))
+        self.assertEqual([], index.lookup("EVIL.EXE"))
+        self.assertEqual(["2"], [match["id"] for match in
+                                 index.lookup("AABB")])
+
+    def test_composite_attributes_indexed_by_component(self):
+        index = IndicatorIndex(types={"md5"})
+        index.add_attribute(_attribute(1, "filename|md5", "evil.exe|abc123"))
+        index.add_attribute(_attribute(2, "domain", "example.com"))
+        self.assertEqual(1, len(index.lookup("ABC123")))
+        self.assertEqual([], index.lookup("evil.exe"))
+        self.assertEqual([], index.lookup("example.com"))
+        self.assertEqual(1, len(index))
+
+    def test_to_ids_only(self):
+        index = IndicatorIndex(to_ids_only=True)
+        index.add_attribute(_attribute(1, "ip-dst", "10.0.0.1"))
+        index.add_attribute(_attribute(2, "ip-dst", "10.0.0.2",
+                                       to_ids=False))
+        self.assertEqual(1, len(index.lookup("10.0.0.1")))
+        self.assertEqual([], index.lookup("10.0.0.2"))
+        # Clearing the flag removes the attribute from the index.
+        index.add_attribute(_attribute(1, "ip-dst", "10.0.0.1", to_ids="0"))
+        self.assertEqual([], index.lookup("10.0.0.1"))
+
+    def test_attribute_notifications(self):
+        index = IndicatorIndex()
+        index.apply_notification({"Attribute": _attribute(1, "domain",
+                                                          "a.example.com"),
+                                  "action": "add"})
+        self.assertEqual(1, len(index.lookup("a.example.com")))
+        index.apply_notification({"Attribute": _attribute(
+            1, "domain", "b.example.com", timestamp="1600000000"),
+                                  "action": "edit"})
+        self.assertEqual([], index.lookup("a.example.com"))
+        self.assertEqual(1, len(index.lookup("b.example.com")))
+        # Notifications do not advance the timestamp of the delta load.
+        self.assertEqual(0, index.last_timestamp)
+        index.apply_notification({"Attribute": {"id": "1"},
+                                  "action": "soft-delete"})
+        self.assertEqual([], index.lookup("b.example.com"))
+        self.assertEqual(0, len(index))
+
+    def test_event_notifications(self):
+        index = IndicatorIndex()
+        self.assertTrue(index.apply_notification({"Event": {
+            "id": "5",
+            "Attribute": [_attribute(1, "sha1", "aa", event_id=5)],
+            "Object": [{"Attribute": [
+                _attribute(2, "ip-src", "10.0.0.1", event_id=5),
+                _attribute(3, "ip-src", "10.0.0.3", event_id=5,
+                           deleted=True)]}]}}))
+        self.assertEqual(2, len(index))
+        self.assertEqual([], index.lookup("10.0.0.3"))
+        index.apply_notification({"Event": {"id": "5"}, "action": "delete"})
+        self.assertEqual(0, len(index))
+        self.assertFalse(index.apply_notification({"status": "alive"}))
+
+    def test_load(self):
+        attributes = [_attribute(i, "ip-dst", "10.0.0.{}".format(i))
+                      for i in range(5)]
+        calls = []
+
+        def search(**kwargs):
+            calls.append(kwargs)
+            start = (kwargs["page"] - 1) * kwargs["limit"]
+            return {"response": {
+                "Attribute": attributes[start:start + kwargs["limit"]]}}
+
+        index = IndicatorIndex(types={"ip-dst"}, to_ids_only=True)
+        self.assertEqual(5, index.load(SearchPaginator(search, 2)))
+        self.assertEqual(5, len(index))
+        self.assertEqual(3, len(calls))
+        self.assertEqual(["ip-dst"], calls[0]["type_attribute"])
+        self.assertTrue(calls[0]["to_ids"])
+        self.assertFalse(index.complete)
+
+    def test_load_raises_on_error(self):
+        index = IndicatorIndex()
+        with self.assertRaises(ValueError):
+            index.load(SearchPaginator(
+                lambda **kwargs: {"errors": ["Not allowed"]}, 10))
+
+
+class IndicatorStoreTest(unittest.TestCase):
+    def test_incomplete_store_not_instantiable(self):
+        class _Store(_IndicatorStore):
+            def lookup_values(self, values):
+                return {}
+
+        self.assertRaises(TypeError, _Store)
+
+
+class IndicatorIndexRebuildTest(unittest.TestCase):
+    def test_rebuild_removes_stale_attributes(self):
+        index = IndicatorIndex()
+        index.add_attribute(_attribute(1, "md5", "aa"))
+        index.add_attribute(_attribute(2, "md5", "bb"))
+
+        def search(**kwargs):
+            # An attribute added from a notification during the rebuild is
+            # kept.
+            index.apply_notification({"Attribute": _attribute(3, "md5", "cc"),
+                                      "action": "add"})
+            return {"response": {"Attribute": [
+                _attribute(1, "md5", "aa")]}} if kwargs["page"] == 1 else \
+                {"response": {"Attribute": []}}
+
+        self.assertEqual(1, index.rebuild(SearchPaginator(search, 10)))
+        self.assertEqual(1, len(index.lookup("aa")))
+        self.assertEqual([], index.lookup("bb"))
+        self.assertEqual(1, len(index.lookup("cc")))
+
+    def test_failed_rebuild_keeps_attributes(self):
+        index = IndicatorIndex()
+        index.add_attribute(_attribute(1, "md5", "aa"))
+        with self.assertRaises(ValueError):
+            index.rebuild(SearchPaginator(
+                lambda **kwargs: {"errors": ["Unavailable"]}, 10))
+        self.assertEqual(1, len(index.lookup("aa")))
+        index.add_attribute(_attribute(2, "md5", "bb"))
+        self.assertEqual(2, len(index))
+
+
+class IndicatorFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.searches = []
+        self.attributes = [_attribute(1, "filename|md5", "a.exe|AABB"),
+                           _attribute(2, "ip-dst", "10.0.0.1",
+                                      to_ids=False)]
+        self.bloom_filter = IndicatorFilter(self._search, 100, 0.001,
+                                            to_ids_only=True)
+        for attribute in self.attributes:
+            self.bloom_filter.add_attribute(attribute)
+
+    def _search(self, **kwargs):
+        self.searches.append(kwargs)
+        values = kwargs.get("values")
+        if values is None:
+            return {"response": {"Attribute": self.attributes}}
+        return {"response": {"Attribute": [
+            attribute for attribute in self.attributes
+            if any(value.lower() in attribute["value"].lower()
+                   for value in values)]}}
+
+    def test_lookups_search_misp_until_complete(self):
+        self.assertEqual({"unknown": []},
+                         self.bloom_filter.lookup_values(["unknown"]))
+        self.assertEqual(1, len(self.searches))
+
+    def test_lookups(self):
+        self.bloom_filter.mark_complete()
+        results = self.bloom_filter.lookup_values(
+            ["aabb", "unknown", "10.0.0.1"])
+        self.assertEqual(["1"], [match["id"] for match in results["aabb"]])
+        self.assertEqual([], results["unknown"])
+        self.assertEqual([], results["10.0.0.1"])
+        # Only the value which may be known to MISP is searched for.
+        self.assertEqual(1, len(self.searches))
+        self.assertEqual(["aabb"], self.searches[0]["values"])
+        self.assertTrue(self.searches[0]["to_ids"])
+
+        self.searches = []
+        self.assertEqual({"unknown": []},
+                         self.bloom_filter.lookup_values(["unknown"]))
+        self.assertEqual([], self.searches)
+
+    def test_case_sensitive_types_not_matched_regardless_of_case(self):
+        self.bloom_filter.mark_complete()
+        self.assertTrue(self.bloom_filter.might_contain("a.exe"))
+        self.assertTrue(self.bloom_filter.might_contain("aabb"))
+        self.assertFalse(self.bloom_filter.might_contain("A.EXE"))
+        results = self.bloom_filter.lookup_values(["a.exe", "AABB"])
+        self.assertEqual(["1"], [match["id"] for match in results["a.exe"]])
+        self.assertEqual(["1"], [match["id"] for match in results["AABB"]])
+
+    def test_rebuild_drops_deleted_values(self):
+        self.bloom_filter.mark_complete()
+        self.assertTrue(self.bloom_filter.might_contain("aabb"))
+        self.attributes = []
+        self.bloom_filter.rebuild(SearchPaginator(self._search, 10))
+        self.assertFalse(self.bloom_filter.might_contain("aabb"))
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "index.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    @staticmethod
+    def _paginator(*attributes):
+        def search(**kwargs):
+            return {"response": {"Attribute": list(attributes)}}
+        return SearchPaginator(search, 10)
+
+    def test_index_snapshot(self):
+        index = IndicatorIndex(types={"md5", "domain"})
+        index.load(self._paginator(
+            _attribute(1, "md5", "AABB", timestamp="10"),
+            _attribute(2, "domain", "example.com", event_id=2,
+                       timestamp="20")))
+        index.apply_notification({"Attribute": _attribute(
+            3, "md5", "CCDD", timestamp="30"), "action": "add"})
+        # An index which has not been fully loaded is not saved.
+        self.assertIsNone(index.save_snapshot(self.path))
+        index.mark_complete()
+        self.assertEqual(3, index.save_snapshot(self.path))
+
+        restored = IndicatorIndex(types={"domain", "md5"})
+        self.assertEqual(3, restored.restore_snapshot(self.path))
+        self.assertFalse(restored.complete)
+        # The delta load starts from the last load, not from the latest
+        # notification, since earlier notifications may have been dropped.
+        self.assertEqual(20, restored.last_timestamp)
+        self.assertEqual(
+            index.lookup_values(["aabb", "ccdd", "example.com"]),
+            restored.lookup_values(["aabb", "ccdd", "example.com"]))
+        restored.remove_event(2)
+        self.assertEqual([], restored.lookup("example.com"))
+        self.assertEqual(
+            {"type_attribute": ["domain", "md5"], "timestamp": 20},
+            restored.delta_search_params())
+
+    def test_restore_skips_attributes_changed_by_notifications(self):
+        index = IndicatorIndex()
+        index.load(self._paginator(
+            _attribute(1, "md5", "aabb"),
+            _attribute(2, "md5", "ccdd", event_id=2),
+            _attribute(3, "md5", "eeff", event_id=3)))
+        index.mark_complete()
+        index.save_snapshot(self.path)
+
+        restored = IndicatorIndex()
+        original_add = restored._add_attribute
+
+        def add_attribute(attribute, restoring=False):
+            if attribute["id"] == "1":
+                # Apply notifications while the snapshot is restored.
+                restored.apply_notification({"Attribute": _attribute(
+                    2, "md5", "0011", event_id=2), "action": "edit"})
+                restored.apply_notification({"Event": {"id": "3"},
+                                             "action": "delete"})
+            return original_add(attribute, restoring)
+        restored._add_attribute = add_attribute
+        restored.restore_snapshot(self.path)
+        self.assertEqual(1, len(restored.lookup("aabb")))
+        self.assertEqual([], restored.lookup("ccdd"))
+        self.assertEqual(1, len(restored.lookup("0011")))
+        self.assertEqual([], restored.lookup("eeff"))
+        # Notifications applied after the restore are not tracked.
+        restored.add_attribute(_attribute(3, "md5", "eeff", event_id=3))
+        self.assertEqual(1, len(restored.lookup("eeff")))
+
+    def test_snapshot_with_different_settings_not_restored(self):
+        index = IndicatorIndex(types={"md5"})
+        index.mark_complete()
+        index.save_snapshot(self.path)
+        with self.assertRaises(ValueError):
+            IndicatorIndex(types={"sha1"}).restore_snapshot(self.path)
+        with self.assertRaises(ValueError):
+            IndicatorFilter(None, 100, 0.001,
+                            types={"md5"}).restore_snapshot(self.path)
+        with self.assertRaises(ValueError):
+            IndicatorIndex().restore_snapshot(
+                os.path.join(self.temp_dir, "missing.db"))
+
+    def test_filter_snapshot(self):
+        bloom_filter = IndicatorFilter(None, 100, 0.001)
+        bloom_filter.load(self._paginator(
+            _attribute(1, "md5", "AABB", timestamp="30")))
+        bloom_filter.mark_complete()
+        self.assertEqual(1, bloom_filter.save_snapshot(self.path))
+
+        restored = IndicatorFilter(None, 100, 0.001)
+        self.assertEqual(1, restored.restore_snapshot(self.path))
+        self.assertEqual(30, restored.last_timestamp)
+        restored.mark_complete()
+        self.assertTrue(restored.might_contain("aabb"))
+        self.assertFalse(restored.might_contain("ccdd"))
+        # A snapshot of a smaller filter than configured is not restored.
+        with self.assertRaises(ValueError):
+            IndicatorFilter(None, 1000, 0.001).restore_snapshot(self.path)
+
+
+class LookupRequestCallbackTest(unittest.TestCase):
+    def setUp(self):
+        self.app = FakeApp()
+        self.index = IndicatorIndex()
+        self.index.add_attribute(_attribute(1, "md5", "abc"))
+        self.callback = MispServiceLookupRequestCallback(self.app,
+                                                         self.index, 2)
+
+    def _lookup(self, request_dict):
+        request = Request("/lookup")
+        request.payload = json.dumps(request_dict).encode("utf-8")
+        self.callback.on_request(request)
+        return self.app.client.responses.pop()
+
+    def test_lookup_values(self):
+        response = self._lookup({"values": ["ABC", "def"]})
+        payload = json.loads(response.payload.decode("utf-8"))
+        self.assertFalse(payload["complete"])
+        self.assertEqual(["1"], [match["id"] for match in
+                                 payload["results"]["ABC"]])
+        self.assertEqual([], payload["results"]["def"])
+
+        self.index.mark_complete()
+        response = self._lookup({"value": "abc"})
+        payload = json.loads(response.payload.decode("utf-8"))
+        self.assertTrue(payload["complete"])
+        self.assertEqual(1, len(payload["results"]["abc"]))
+
+    def test_invalid_requests(self):
+        for request_dict in ({}, {"values": []}, {"values": ["a", "b", "c"]},
+                             {"value": 1}):
+            self.assertIsInstance(self._lookup(request_dict), ErrorResponse)
@@ -0,0 +1,66 @@
+from __future__ import absolute_import
+import unittest
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen  # pylint: disable=import-error
+
+from dxlmispservice._metrics import MetricsHttpServer, MetricsRegistry
+
+
+class MetricsRegistryTest(unittest.TestCase):
+    def test_counter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests.", ("api",))
+        counter.inc("search")
+        counter.inc("search", amount=2)
+        self.assertIs(counter, registry.counter("requests_total", "Requests.",
+                                                ("api",)))
+        self.assertEqual(3, counter.value("search"))
+        self.assertIn('requests_total{api="search"} 3\n', registry.render())
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("duration_seconds", "Duration.",
+                                       ("phase",), buckets=(0.1, 1))
+        histogram.observe(0.05, "call")
+        histogram.observe(0.5, "call")
+        histogram.observe(5, "call")
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE duration_seconds histogram", lines)
+        self.assertIn('duration_seconds_bucket{phase="call",le="0.1"} 1',
+                      lines)
+        self.assertIn('duration_seconds_bucket{phase="call",le="1"} 2',
+                      lines)
+        self.assertIn('duration_seconds_bucket{phase="call",le="+Inf"} 3',
+                      lines)
+        self.assertIn('duration_seconds_sum{phase="call"} 5.55', lines)
+        self.assertIn('duration_seconds_count{phase="call"} 3', lines)
+
+    def test_gauge(self):
+        registry = MetricsRegistry()
+        registry.gauge("queue_depth", "Depth.", lambda: 7)
+        self.assertIn("queue_depth 7\n", registry.render())
+
+    def test_label_values_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter("c", "C.", ("topic",)).inc('a"b\\c')
+        self.assertIn('c{topic="a\\"b\\\\c"} 1', registry.render())
+
+    def test_wrong_label_count_rejected(self):
+        counter = MetricsRegistry().counter("c", "C.", ("topic",))
+        self.assertRaises(ValueError, counter.inc)
+
+
+class MetricsHttpServerTest(unittest.TestCase):
+    def test_scrape(self):
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Requests.").inc()
+        server = MetricsHttpServer(registry, "127.0.0.1", 0)
+        try:
+            response = urlopen(
+                "http://127.0.0.1:{}/metrics".format(server.port), timeout=5)
+            self.assertIn(b"requests_total 1", response.read())
+        finally:
+            server.close()
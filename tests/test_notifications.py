@@ -0,0 +1,461 @@
+from __future__ import absolute_import
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+import zmq
+
+try:
+    from configparser import ConfigParser
+except ImportError:
+    from ConfigParser import ConfigParser  # pylint: disable=import-error
+
+from dxlmispservice import MispService
+from dxlmispservice._executor import ApiExecutor
+from dxlmispservice._notifications import NotificationBatcher, \
+    NotificationDispatcher, NotificationFilter, NotificationGapDetector, \
+    NotificationRoute, join_json_payloads, split_notification
+
+
+class SplitNotificationTest(unittest.TestCase):
+    def test_split(self):
+        topic, payload = split_notification(
+            zmq.Frame(b'misp_json {"Event": {"id": "1"}}'), 9)
+        self.assertEqual(b"misp_json", topic)
+        self.assertIsInstance(payload, memoryview)
+        self.assertEqual(b'{"Event": {"id": "1"}}', payload.tobytes())
+
+    def test_topic_longer_than_max_ignored(self):
+        self.assertIsNone(
+            split_notification(zmq.Frame(b"misp_json_self {}"), 9))
+
+    def test_join_memoryviews(self):
+        payloads = [memoryview(b'{"id": 1}'), memoryview(b'{"id": 2}')]
+        self.assertEqual(b'[{"id": 1},{"id": 2}]',
+                         join_json_payloads(payloads))
+
+
+class NotificationFilterTest(unittest.TestCase):
+    EVENT = {"Event": {"id": "1", "threat_level_id": "1", "distribution": "3",
+                       "Orgc": {"id": "2", "name": "CIRCL"},
+                       "Tag": [{"name": "tlp:white"}],
+                       "Attribute": [{"id": "10", "type": "ip-dst",
+                                      "distribution": "5"}]}}
+    ATTRIBUTE = {"Attribute": {"id": "11", "type": "md5",
+                               "distribution": "1",
+                               "Event": {"id": "1", "orgc_id": "2"}}}
+
+    def test_empty_filter_matches_everything(self):
+        notification_filter = NotificationFilter()
+        self.assertFalse(notification_filter)
+        self.assertTrue(notification_filter.matches(self.EVENT))
+
+    def test_all_criteria_must_match(self):
+        self.assertTrue(NotificationFilter(
+            orgs=["CIRCL"], tags=["tlp:white"],
+            attribute_types=["ip-dst"]).matches(self.EVENT))
+        self.assertFalse(NotificationFilter(
+            orgs=["CIRCL"], tags=["tlp:red"]).matches(self.EVENT))
+
+    def test_org_matched_by_id(self):
+        self.assertTrue(NotificationFilter(orgs=[2]).matches(self.ATTRIBUTE))
+
+    def test_missing_value_does_not_match(self):
+        self.assertTrue(NotificationFilter(
+            threat_levels=["1"]).matches(self.EVENT))
+        self.assertFalse(NotificationFilter(
+            threat_levels=["1"]).matches(self.ATTRIBUTE))
+
+    def test_attribute_distribution(self):
+        notification_filter = NotificationFilter(distributions=["1"])
+        self.assertTrue(notification_filter.matches(self.ATTRIBUTE))
+        self.assertFalse(notification_filter.matches(self.EVENT))
+
+
+class NotificationBatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.sent_event = threading.Event()
+
+    def send(self, topic, payload):
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8")
+        self.sent.append((topic, json.loads(payload)))
+        self.sent_event.set()
+
+    def test_full_batch_sent_immediately(self):
+        batcher = NotificationBatcher(self.send, 2, 60)
+        try:
+            batcher.add("/a", '{"id": 1}')
+            batcher.add("/b", '{"id": 2}')
+            batcher.add("/a", '{"id": 3}')
+            self.assertEqual([("/a", [{"id": 1}, {"id": 3}])], self.sent)
+        finally:
+            batcher.close()
+        self.assertEqual(("/b", [{"id": 2}]), self.sent[1])
+
+    def test_batch_sent_when_window_elapses(self):
+        batcher = NotificationBatcher(self.send, 100, 0.1)
+        try:
+            batcher.add("/a", b'{"id": 1}')
+            self.assertTrue(self.sent_event.wait(5))
+            self.assertEqual([("/a", [{"id": 1}])], self.sent)
+        finally:
+            batcher.close()
+
+    def test_empty_payloads_not_batched(self):
+        batcher = NotificationBatcher(self.send, 2, 60)
+        try:
+            batcher.add("/a", b'{"id": 1}')
+            batcher.add("/a", b"")
+            batcher.add("/a", memoryview(b" \n"))
+            batcher.add("/a", memoryview(b'{"id": 2}'))
+            self.assertEqual([("/a", [{"id": 1}, {"id": 2}])], self.sent)
+        finally:
+            batcher.close()
+
+
+class NotificationDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.handled = []
+        self.dropped = []
+
+    def handle(self, value):
+        self.started.set()
+        self.release.wait(5)
+        self.handled.append(value)
+
+    def drop(self, value):
+        self.dropped.append(value)
+
+    def _fill(self, policy):
+        dispatcher = NotificationDispatcher(self.handle, 2, 1, policy,
+                                            self.drop)
+        # The first notification is held by the worker, the next two fill
+        # the queue, and the last two overflow it.
+        dispatcher.put(0)
+        self.started.wait(5)
+        for value in range(1, 5):
+            dispatcher.put(value)
+        self.release.set()
+        dispatcher.close()
+        return dispatcher.counters
+
+    def test_drop_newest(self):
+        counters = self._fill(NotificationDispatcher.OVERFLOW_DROP_NEWEST)
+        self.assertEqual([0, 1, 2], self.handled)
+        self.assertEqual([3, 4], self.dropped)
+        self.assertEqual(2, counters["dropped_newest"])
+        self.assertEqual(3, counters["handled"])
+
+    def test_drop_oldest(self):
+        counters = self._fill(NotificationDispatcher.OVERFLOW_DROP_OLDEST)
+        self.assertEqual([0, 3, 4], self.handled)
+        self.assertEqual([1, 2], self.dropped)
+        self.assertEqual(2, counters["dropped_oldest"])
+
+    def test_block_until_space_available(self):
+        dispatcher = NotificationDispatcher(self.handle, 1, 1)
+        dispatcher.put(0)
+        self.started.wait(5)
+        dispatcher.put(1)
+        threading.Timer(0.2, self.release.set).start()
+        dispatcher.put(2)
+        dispatcher.close()
+        self.assertEqual([0, 1, 2], self.handled)
+        self.assertEqual(1, dispatcher.counters["blocked"])
+
+    def test_invalid_overflow_policy_rejected(self):
+        self.assertRaises(ValueError, NotificationDispatcher, self.handle, 1,
+                          1, "drop-everything")
+
+
+class NotificationGapDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.detector = NotificationGapDetector(30, lambda: self.now)
+
+    def test_no_gap(self):
+        for _ in range(5):
+            self.now += 10
+            self.detector.heartbeat({"uptime": self.now})
+        self.detector.received()
+        self.assertFalse(self.detector.stalled)
+        self.assertIsNone(self.detector.take_gap())
+
+    def test_stall(self):
+        self.now += 10
+        self.detector.received()
+        self.now += 60
+        self.assertTrue(self.detector.stalled)
+        # The gap is only reported once messages are received again.
+        self.assertIsNone(self.detector.take_gap())
+        self.detector.heartbeat({"status": "ok"})
+        self.assertFalse(self.detector.stalled)
+        self.assertEqual(1010, self.detector.take_gap())
+        self.assertIsNone(self.detector.take_gap())
+
+    def test_restart(self):
+        self.detector.heartbeat({"uptime": 500})
+        self.now += 10
+        self.detector.heartbeat({"uptime": 2})
+        self.assertEqual(1000, self.detector.take_gap())
+
+    def test_added_gaps_are_merged(self):
+        self.detector.add_gap()
+        self.detector.add_gap(900)
+        self.now += 5
+        self.detector.add_gap()
+        self.assertEqual(900, self.detector.take_gap())
+
+    def test_invalid_stall_timeout(self):
+        with self.assertRaises(ValueError):
+            NotificationGapDetector(0)
+
+
+class NotificationRoutesTest(unittest.TestCase):
+    def setUp(self):
+        config_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, config_dir)
+        self.app = MispService(config_dir)
+        self.app._zeromq_notification_topics = {"misp_json",
+                                                "misp_json_attribute"}
+        self.app._response_cache_invalidation_topics = {"misp_json",
+                                                        "misp_json_event"}
+        self.app._indicator_index_update_topics = {"misp_json_attribute"}
+
+    def _event_topic(self, topic):
+        # How the event topic was built for each notification before the
+        # routes were built at configuration time.
+        return "{}{}/{}".format(
+            MispService._ZEROMQ_NOTIFICATIONS_EVENT_TOPIC,
+            "/{}".format(self.app._service_unique_id)
+            if self.app._service_unique_id else "", topic)
+
+    def test_configured_topics_routed(self):
+        self.app._build_zeromq_notification_routes()
+        routes = self.app._zeromq_notification_routes
+        self.assertEqual(
+            {b"misp_json", b"misp_json_attribute", b"misp_json_event"},
+            set(routes))
+        self.assertEqual(
+            NotificationRoute(
+                "misp_json",
+                "/opendxl-misp/event/zeromq-notifications/misp_json",
+                True, False),
+            routes[b"misp_json"])
+        self.assertEqual(
+            NotificationRoute(
+                "misp_json_attribute",
+                "/opendxl-misp/event/zeromq-notifications/"
+                "misp_json_attribute",
+                False, True),
+            routes[b"misp_json_attribute"])
+        # Only evicts cached responses, so is not forwarded to the fabric.
+        self.assertEqual(
+            NotificationRoute("misp_json_event", None, True, False),
+            routes[b"misp_json_event"])
+        self.assertEqual(len(b"misp_json_attribute"),
+                         self.app._zeromq_max_topic_length)
+
+    def test_unconfigured_topics_not_routed(self):
+        self.app._build_zeromq_notification_routes()
+        routes = self.app._zeromq_notification_routes
+        self.assertNotIn(b"misp_json_sighting", routes)
+        self.assertNotIn(b"misp_json_self", routes)
+
+    def test_no_topics_configured(self):
+        self.app._zeromq_notification_topics = set()
+        self.app._response_cache_invalidation_topics = set()
+        self.app._indicator_index_update_topics = set()
+        self.app._build_zeromq_notification_routes()
+        self.assertEqual({}, self.app._zeromq_notification_routes)
+        self.assertEqual(0, self.app._zeromq_max_topic_length)
+
+    def test_event_topics_match_per_message_topics(self):
+        for service_unique_id in (None, "myservice"):
+            self.app._service_unique_id = service_unique_id
+            self.app._build_zeromq_notification_routes()
+            for topic in self.app._zeromq_notification_topics:
+                self.assertEqual(
+                    self._event_topic(topic),
+                    self.app._zeromq_notification_routes[
+                        topic.encode("utf-8")].event_topic)
+
+    def test_compressed_event_topics(self):
+        self.app._notification_compression = "zlib"
+        self.app._build_zeromq_notification_routes()
+        self.assertEqual(
+            self._event_topic("misp_json") + "/zlib",
+            self.app._zeromq_notification_routes[b"misp_json"].event_topic)
+
+
+class _FakeApiClient(object):
+    def __init__(self, failures=0):
+        self.searches = []
+        self.failures = failures
+
+    def search(self, **kwargs):
+        self.searches.append(kwargs)
+        if self.failures:
+            self.failures -= 1
+            raise Exception("search failed")
+        if kwargs["controller"] == "events":
+            return {"response": [{"Event": {"id": "1"}}]}
+        return {"response": {"Attribute": [{"id": "2"}, {"id": "3"}]}}
+
+    def close(self):
+        pass
+
+
+class _FakeDispatcher(object):
+    def __init__(self):
+        self.puts = []
+        self.put_event = threading.Event()
+
+    def put(self, *args):
+        self.puts.append(args)
+        self.put_event.set()
+        return True
+
+    def close(self):
+        pass
+
+
+class _FakeCounter(object):
+    def __init__(self):
+        self.counts = []
+
+    def inc(self, *labels):
+        self.counts.append(labels)
+
+
+class NotificationCatchUpTest(unittest.TestCase):
+    def setUp(self):
+        config_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, config_dir)
+        self.app = MispService(config_dir)
+        self.app._NOTIFICATION_GAP_CHECK_INTERVAL = 0.01
+        self.app._notification_catch_up_max_results = 5
+        self.app._notification_dispatcher = _FakeDispatcher()
+        self.app._api_client = _FakeApiClient()
+        self.routes = {}
+        for topic in ("misp_json", "misp_json_attribute"):
+            self.routes[topic] = NotificationRoute(
+                topic, "/event/" + topic, False, False)
+            self.app._zeromq_notification_routes[
+                topic.encode("utf-8")] = self.routes[topic]
+
+    def test_republish_changes_since(self):
+        self.app._republish_changes_since(1000.5)
+        self.assertEqual(
+            [{"controller": "events", "timestamp": 1000, "limit": 5,
+              "page": 1},
+             {"controller": "attributes", "timestamp": 1000, "limit": 5,
+              "page": 1}],
+            self.app._api_client.searches)
+        puts = self.app._notification_dispatcher.puts
+        self.assertEqual(
+            [self.routes["misp_json"], self.routes["misp_json_attribute"],
+             self.routes["misp_json_attribute"]],
+            [put[0] for put in puts])
+        self.assertEqual(
+            [{"Event": {"id": "1"}, "action": "catch-up"},
+             {"Attribute": {"id": "2"}, "action": "catch-up"},
+             {"Attribute": {"id": "3"}, "action": "catch-up"}],
+            [json.loads(put[1].decode("utf-8")) for put in puts])
+        self.assertTrue(all(put[2] for put in puts))
+
+    def test_processed_catch_up_notifications_counted(self):
+        self.app._notification_counter = _FakeCounter()
+        route = NotificationRoute("misp_json", None, False, False)
+        self.app._process_zeromq_misp_message(route, b"{}", True)
+        self.app._process_zeromq_misp_message(route, b"{}")
+        self.assertEqual([("misp_json", "caught_up")],
+                         self.app._notification_counter.counts)
+
+    def test_unrouted_topics_not_searched(self):
+        del self.app._zeromq_notification_routes[b"misp_json"]
+        self.app._republish_changes_since(1000)
+        self.assertEqual(["attributes"],
+                         [search["controller"] for search in
+                          self.app._api_client.searches])
+
+    def test_catch_up_searches_queued_on_executor(self):
+        threads = []
+        search = self.app._api_client.search
+
+        def search_on_worker(**kwargs):
+            threads.append(threading.current_thread())
+            return search(**kwargs)
+
+        self.app._api_client.search = search_on_worker
+        self.app._api_executor = ApiExecutor(1, 1)
+        self.addCleanup(self.app._api_executor.close)
+        self.app._republish_changes_since(1000)
+        self.assertEqual(2, len(threads))
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertEqual(3, len(self.app._notification_dispatcher.puts))
+        self.assertEqual(
+            (0, 0), self.app._api_executor.stats()[
+                self.app._NOTIFICATION_CATCH_UP_API_NAME])
+
+    def test_catch_up_searches_have_lowest_priority(self):
+        config = ConfigParser()
+        config.optionxform = str
+        config.add_section("RequestExecution")
+        config.set("RequestExecution", "workerCount", "4")
+        config.set("RequestExecution", "priorities", "sighting:10,search:-2")
+        self.app._config = config
+        self.app._load_request_execution_configuration()
+        self.addCleanup(self.app._api_executor.close)
+        name = self.app._NOTIFICATION_CATCH_UP_API_NAME
+        self.assertEqual(-3, self.app._api_executor._priorities[name])
+        self.assertEqual(1, self.app._api_executor._limits[name])
+
+    def test_catch_up_search_failure_raised_from_executor(self):
+        self.app._api_client.failures = 1
+        self.app._api_executor = ApiExecutor(1, 1)
+        self.addCleanup(self.app._api_executor.close)
+        self.assertRaises(Exception, self.app._republish_changes_since, 1000)
+        self.assertEqual([], self.app._notification_dispatcher.puts)
+
+    def test_stopped_catch_up_not_searched(self):
+        self.app._notification_catch_up_stop.set()
+        self.app._republish_changes_since(1000)
+        self.assertEqual([], self.app._api_client.searches)
+
+    def test_catch_up_retried_on_failure(self):
+        self.app._api_client.failures = 1
+        detector = NotificationGapDetector(60)
+        detector.add_gap(2000.0)
+        self.app._notification_gap_detector = detector
+        thread = threading.Thread(
+            target=self.app._catch_up_lost_notifications)
+        thread.start()
+        try:
+            self.assertTrue(
+                self.app._notification_dispatcher.put_event.wait(5))
+        finally:
+            self.app._notification_catch_up_stop.set()
+            thread.join()
+        searches = self.app._api_client.searches
+        # The failed search for events is retried from the same gap.
+        self.assertEqual(["events", "events"],
+                         [search["controller"] for search in searches[:2]])
+        self.assertTrue(all(search["timestamp"] == 1940
+                            for search in searches))
+        self.assertIsNone(detector.take_gap())
+
+    def test_dropped_catch_up_notification_not_recorded_as_gap(self):
+        detector = NotificationGapDetector(60)
+        self.app._notification_gap_detector = detector
+        route = self.routes["misp_json"]
+        self.app._on_zeromq_misp_message_dropped(route, b"{}", True)
+        self.assertIsNone(detector.take_gap())
+        self.app._on_zeromq_misp_message_dropped(route, b"{}")
+        self.assertIsNotNone(detector.take_gap())
@@ -0,0 +1,157 @@
+from __future__ import absolute_import
+import threading
+import time
+import unittest
+
+from dxlbootstrap.util import MessageUtils
+from dxlclient.message import ErrorResponse, Request
+
+from dxlmispservice._pagination import SearchPaginator
+from dxlmispservice._requesthandlers import MispServiceRequestCallback
+from tests._fakes import FakeApp
+
+
+class _FakeSearch(object):
+    """
+    Search function which returns pages of events from a fixed list of
+    results.
+    """
+    def __init__(self, total, attributes=False, delay=0, fail_page=None):
+        self.total = total
+        self.attributes = attributes
+        self.delay = delay
+        self.fail_page = fail_page
+        self.calls = []
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+            self._concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self._concurrent)
+        try:
+            time.sleep(self.delay)
+            if self.fail_page is not None and \
+                    kwargs.get("page") == self.fail_page:
+                raise Exception("page failed")
+            limit = kwargs.get("limit", self.total)
+            start = (kwargs.get("page", 1) - 1) * limit
+            items = [{"id": str(index)} for index in
+                     range(start, min(start + limit, self.total))]
+            if self.attributes:
+                return {"response": {"Attribute": items}}
+            return {"response": items}
+        finally:
+            with self._lock:
+                self._concurrent -= 1
+
+
+class SearchPaginatorTest(unittest.TestCase):
+    def test_merges_pages(self):
+        search = _FakeSearch(25)
+        result = SearchPaginator(search, 10).search({"tags": "apt"})
+        self.assertEqual([str(index) for index in range(25)],
+                         [item["id"] for item in result["response"]])
+        self.assertEqual([1, 2, 3], [call["page"] for call in search.calls])
+        self.assertTrue(all(call["limit"] == 10 and call["tags"] == "apt"
+                            for call in search.calls))
+
+    def test_merges_attribute_pages(self):
+        search = _FakeSearch(20, attributes=True)
+        result = SearchPaginator(search, 10).search({})
+        self.assertEqual(20, len(result["response"]["Attribute"]))
+        # The last page was full, so one more (empty) page is requested.
+        self.assertEqual(3, len(search.calls))
+
+    def test_max_pages(self):
+        search = _FakeSearch(100)
+        result = SearchPaginator(search, 10, max_pages=2).search({})
+        self.assertEqual(20, len(result["response"]))
+        self.assertEqual(2, len(search.calls))
+        self.assertTrue(result["truncated"])
+
+    def test_max_pages_not_truncated(self):
+        search = _FakeSearch(15)
+        result = SearchPaginator(search, 10, max_pages=2).search({})
+        self.assertEqual(15, len(result["response"]))
+        self.assertNotIn("truncated", result)
+
+    def test_parallel_pages(self):
+        search = _FakeSearch(35, delay=0.05)
+        pages = list(SearchPaginator(search, 10, parallel_pages=3).pages({}))
+        self.assertEqual([10, 10, 10, 5],
+                         [len(page["response"]) for page in pages])
+        self.assertEqual(3, search.max_concurrent)
+        # The second batch requests pages 4 to 6, of which only page 4 is
+        # used.
+        self.assertEqual(6, len(search.calls))
+
+    def test_failed_page_after_first(self):
+        search = _FakeSearch(100, fail_page=2)
+        result = SearchPaginator(search, 10, parallel_pages=3).search({})
+        self.assertEqual(["page failed"], result["errors"])
+
+    def test_failed_first_page(self):
+        search = _FakeSearch(100, fail_page=1)
+        with self.assertRaises(Exception):
+            SearchPaginator(search, 10, parallel_pages=2).search({})
+
+    def test_applies_to(self):
+        self.assertTrue(SearchPaginator.applies_to({"tags": "apt"}))
+        self.assertFalse(SearchPaginator.applies_to({"limit": 5}))
+        self.assertFalse(SearchPaginator.applies_to({"page": 2}))
+
+    def test_invalid_arguments(self):
+        search = _FakeSearch(0)
+        with self.assertRaises(ValueError):
+            SearchPaginator(search, 0)
+        with self.assertRaises(ValueError):
+            SearchPaginator(search, 10, parallel_pages=0)
+        with self.assertRaises(ValueError):
+            SearchPaginator(search, 10, max_pages=-1)
+
+
+class PagedStreamTest(unittest.TestCase):
+    def test_failed_page_after_chunks_published(self):
+        fake_search = _FakeSearch(100, fail_page=3)
+
+        def search(**kwargs):
+            return fake_search(**kwargs)
+
+        app = FakeApp()
+        callback = MispServiceRequestCallback(
+            app, search, stream_topic_prefix="/stream",
+            paginator=SearchPaginator(search, 10))
+        request = Request("/misp/search")
+        MessageUtils.dict_to_json_payload(
+            request, {"dxl_stream_id": "s1", "dxl_chunk_size": 15})
+        callback.on_request(request)
+        response = app.client.responses[0]
+        self.assertIsInstance(response, ErrorResponse)
+        summary = MessageUtils.json_payload_to_dict(response)
+        # The pending items of the second page are published before the
+        # error is reported.
+        self.assertEqual(["page failed"], summary["errors"])
+        self.assertEqual(2, summary["chunks"])
+        self.assertEqual(20, summary["items"])
+        self.assertEqual(2, len(app.client.events))
+
+    def test_truncated_stream(self):
+        fake_search = _FakeSearch(100)
+
+        def search(**kwargs):
+            return fake_search(**kwargs)
+
+        app = FakeApp()
+        callback = MispServiceRequestCallback(
+            app, search, stream_topic_prefix="/stream",
+            paginator=SearchPaginator(search, 10, max_pages=3))
+        request = Request("/misp/search")
+        MessageUtils.dict_to_json_payload(
+            request, {"dxl_stream_id": "s1", "dxl_chunk_size": 10})
+        callback.on_request(request)
+        summary = MessageUtils.json_payload_to_dict(app.client.responses[0])
+        self.assertEqual(30, summary["items"])
+        self.assertTrue(summary["truncated"])
@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+import unittest
+
+# pylint: disable=wrong-import-position
+from mock import patch
+from dxlmispservice import _responsecache
+from dxlmispservice._responsecache import ResponseCache, \
+    extract_data_references, extract_request_references
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_key_ignores_payload_member_order(self):
+        self.assertEqual(
+            ResponseCache.make_key("/topic", {"a": 1, "b": [1, 2]}),
+            ResponseCache.make_key("/topic", {"b": [1, 2], "a": 1}))
+        self.assertNotEqual(
+            ResponseCache.make_key("/topic", {"a": 1}),
+            ResponseCache.make_key("/other", {"a": 1}))
+
+    def test_entries_expire_after_ttl(self):
+        with patch.object(_responsecache, "_now", return_value=100.0) as now:
+            cache = ResponseCache(10, 5)
+            cache.put("key", b"value")
+            now.return_value = 104.9
+            self.assertEqual(b"value", cache.get("key"))
+            now.return_value = 105.0
+            self.assertIsNone(cache.get("key"))
+            self.assertEqual(0, len(cache))
+
+    def test_least_recently_used_entry_evicted(self):
+        cache = ResponseCache(2, 60)
+        cache.put("first", 1)
+        cache.put("second", 2)
+        self.assertEqual(1, cache.get("first"))
+        cache.put("third", 3)
+        self.assertIsNone(cache.get("second"))
+        self.assertEqual(1, cache.get("first"))
+        self.assertEqual(3, cache.get("third"))
+
+    def test_invalid_settings_rejected(self):
+        self.assertRaises(ValueError, ResponseCache, 0, 60)
+        self.assertRaises(ValueError, ResponseCache, 10, 0)
+
+    def test_invalidate_evicts_entries_with_matching_references(self):
+        cache = ResponseCache(10, 60)
+        cache.put("event", 1, {"event:1"})
+        cache.put("tag", 2, {"tag:tlp:white", "event:2"})
+        cache.put("other", 3, {"event:3"})
+        self.assertEqual(2, cache.invalidate({"event:1", "tag:tlp:white"}))
+        self.assertIsNone(cache.get("event"))
+        self.assertIsNone(cache.get("tag"))
+        self.assertEqual(3, cache.get("other"))
+
+    def test_put_rejected_after_concurrent_invalidation(self):
+        cache = ResponseCache(10, 60)
+        generation = cache.generation
+        cache.invalidate({"event:1"})
+        self.assertFalse(cache.put("stale", 1, {"event:1"}, generation))
+        self.assertTrue(cache.put("fresh", 2, {"event:2"}, generation))
+        self.assertIsNone(cache.get("stale"))
+        self.assertEqual(2, cache.get("fresh"))
+
+
+class ReferenceExtractionTest(unittest.TestCase):
+    def test_request_references(self):
+        self.assertEqual(
+            {"event:12", "tag:tlp:white", "value:1.2.3.4",
+             "event:abc", "attribute:abc"},
+            extract_request_references({
+                "eventid": 12,
+                "tags": ["!tlp:white"],
+                "values": "1.2.3.4",
+                "uuid": "abc",
+                "limit": 10
+            }))
+
+    def test_data_references(self):
+        self.assertEqual(
+            {"event:12", "event:event-uuid", "tag:tlp:white",
+             "attribute:7", "attribute:attr-uuid", "value:evil.com"},
+            extract_data_references({
+                "response": [{
+                    "Event": {
+                        "id": "12",
+                        "uuid": "event-uuid",
+                        "Tag": [{"name": "tlp:white"}],
+                        "Attribute": [{
+                            "id": "7",
+                            "uuid": "attr-uuid",
+                            "event_id": "12",
+                            "value": "evil.com"
+                        }]
+                    }
+                }]
+            }))
@@ -0,0 +1,72 @@
+from __future__ import absolute_import
+import datetime
+import json
+import unittest
+
+import requests
+from dxlclient.message import Request
+
+from dxlmispservice import _serialization
+from dxlmispservice._serialization import dumps, loads, payload_to_dict, \
+    response_json
+
+
+class SerializationTest(unittest.TestCase):
+    def test_round_trip(self):
+        data = {"Event": {"id": "1", "info": u"café ☃",
+                          "Attribute": [{"value": "1.2.3.4",
+                                         "to_ids": True,
+                                         "comment": None,
+                                         "score": 0.5}]}}
+        encoded = dumps(data)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(data, json.loads(encoded.decode("utf-8")))
+        self.assertEqual(data, loads(encoded))
+        self.assertEqual(data, loads(memoryview(encoded)))
+        self.assertEqual(data, loads(encoded.decode("utf-8")))
+
+    def test_same_values_as_standard_library(self):
+        for value in ({1: "a", None: "b"}, [2 ** 70, -1, 1e16], "\ud800"):
+            self.assertEqual(json.loads(json.dumps(value)),
+                             json.loads(dumps(value).decode("utf-8")))
+
+    def test_unsupported_values_fail_as_standard_library(self):
+        with self.assertRaises(TypeError):
+            dumps({"date": datetime.datetime(2020, 1, 1)})
+        with self.assertRaises(ValueError):
+            loads(b"{")
+
+    def test_standard_library_extensions(self):
+        self.assertEqual([2 ** 70], loads(b"[1180591620717411303424]"))
+        value = loads(b"[NaN]")[0]
+        self.assertNotEqual(value, value)
+
+    def test_non_finite_floats_encoded_as_null(self):
+        value = {"a": float("nan"), "b": [float("inf"), -float("inf"), 1.5],
+                 "c": (float("nan"),)}
+        expected = {"a": None, "b": [None, None, 1.5], "c": [None]}
+        self.assertEqual(expected, json.loads(dumps(value).decode("utf-8")))
+        # The standard library backend encodes them in the same way.
+        orjson = _serialization.orjson
+        _serialization.orjson = None
+        try:
+            self.assertEqual(expected,
+                             json.loads(dumps(value).decode("utf-8")))
+        finally:
+            _serialization.orjson = orjson
+
+    def test_payload_to_dict(self):
+        request = Request("/topic")
+        request.payload = b'{"event": "1"}\0'
+        self.assertEqual({"event": "1"}, payload_to_dict(request))
+
+    def test_response_json(self):
+        response = requests.Response()
+        response._content = b'{"response": []}'  # pylint: disable=protected-access
+        self.assertEqual({"response": []}, response_json(response))
+        response._content = b"Not JSON"  # pylint: disable=protected-access
+        with self.assertRaises(ValueError):
+            response_json(response)
+
+    def test_backend(self):
+        self.assertIn(_serialization.BACKEND, ("json", "orjson"))
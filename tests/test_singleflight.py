@@ -0,0 +1,70 @@
+from __future__ import absolute_import
+import threading
+import time
+import unittest
+
+from dxlmispservice._singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_concurrent_calls_coalesced(self):
+        single_flight = SingleFlight()
+        leader_started = threading.Event()
+        release_leader = threading.Event()
+        calls = []
+        results = []
+
+        def slow_call():
+            calls.append(1)
+            leader_started.set()
+            release_leader.wait(5)
+            return "result"
+
+        def run():
+            results.append(single_flight.do("key", slow_call))
+
+        leader = threading.Thread(target=run)
+        leader.start()
+        leader_started.wait(5)
+        followers = [threading.Thread(target=run) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        # Give the followers time to block on the in-flight call.
+        time.sleep(0.5)
+        release_leader.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(4, len(results))
+        self.assertEqual({"result"}, set(result for result, _ in results))
+        self.assertEqual(1, len([shared for _, shared in results
+                                 if not shared]))
+        self.assertEqual(0, len(single_flight))
+
+    def test_exception_propagated_and_key_released(self):
+        single_flight = SingleFlight()
+
+        def failing_call():
+            raise ValueError("failed")
+
+        self.assertRaises(ValueError, single_flight.do, "key", failing_call)
+        self.assertEqual(("ok", False),
+                         single_flight.do("key", lambda: "ok"))
+
+    def test_done_callback(self):
+        single_flight = SingleFlight()
+        call, leader = single_flight.begin("key")
+        self.assertTrue(leader)
+        follower_call, leader = single_flight.begin("key")
+        self.assertFalse(leader)
+        results = []
+        follower_call.add_done_callback(
+            lambda completed: results.append(completed.result()))
+        single_flight.finish("key", call, "result")
+        self.assertEqual(["result"], results)
+        # Callbacks added after completion are invoked immediately.
+        call.add_done_callback(
+            lambda completed: results.append(completed.result()))
+        self.assertEqual(["result", "result"], results)
+        self.assertEqual(0, len(single_flight))
@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+import json
+import unittest
+
+from dxlmispservice._streaming import StreamPublisher, find_stream_items, \
+    pop_stream_options
+
+
+class StreamOptionsTest(unittest.TestCase):
+    def test_options_removed_from_request(self):
+        request_dict = {"value": "1.2.3.4", "dxl_stream_id": "abc-1",
+                        "dxl_chunk_size": "10"}
+        self.assertEqual(("abc-1", 10), pop_stream_options(request_dict))
+        self.assertEqual({"value": "1.2.3.4"}, request_dict)
+
+    def test_no_options(self):
+        self.assertIsNone(pop_stream_options({"value": "1.2.3.4"}))
+
+    def test_invalid_options_rejected(self):
+        for request_dict in ({"dxl_chunk_size": 10},
+                             {"dxl_stream_id": "a/#", "dxl_chunk_size": 10},
+                             {"dxl_stream_id": "abc", "dxl_chunk_size": 0}):
+            self.assertRaises(ValueError, pop_stream_options, request_dict)
+
+
+class StreamPublisherTest(unittest.TestCase):
+    def test_find_stream_items(self):
+        self.assertEqual([1], find_stream_items({"response": [1]}))
+        self.assertEqual([1], find_stream_items(
+            {"response": {"Attribute": [1]}}))
+        self.assertIsNone(find_stream_items({"Event": {"id": "1"}}))
+
+    def test_items_published_in_chunks(self):
+        sent = []
+        publisher = StreamPublisher(
+            lambda topic, payload: sent.append(
+                (topic, json.loads(payload.decode("utf-8")))),
+            "/stream/abc", "abc", 2)
+        publisher.add([1, 2, 3])
+        publisher.add([4, 5])
+        summary = publisher.close()
+        self.assertEqual(
+            [[1, 2], [3, 4], [5]],
+            [payload["response"] for _, payload in sent])
+        self.assertEqual([0, 1, 2],
+                         [payload["sequence"] for _, payload in sent])
+        self.assertEqual({"stream_id": "abc", "topic": "/stream/abc",
+                          "chunks": 3, "items": 5}, summary)
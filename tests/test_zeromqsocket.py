@@ -0,0 +1,139 @@
+from __future__ import absolute_import
+import shutil
+import tempfile
+import unittest
+
+import zmq
+
+try:
+    from configparser import ConfigParser
+except ImportError:
+    from ConfigParser import ConfigParser  # pylint: disable=import-error
+
+from dxlmispservice import MispService
+
+
+class ZeroMqSocketOptionsTest(unittest.TestCase):
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.config_dir)
+        self.context = zmq.Context()
+        # Cleanups run in reverse order, so sockets are closed before the
+        # context is terminated.
+        self.addCleanup(self.context.term)
+
+    def _socket(self, **settings):
+        config = ConfigParser()
+        config.optionxform = str
+        config.add_section("ZeroMqConnection")
+        for name, value in settings.items():
+            config.set("ZeroMqConnection", name, value)
+        app = MispService(self.config_dir)
+        app._config = config
+        app._load_zeromq_connection_configuration()
+        socket, _ = app._create_zeromq_socket(
+            self.context, "127.0.0.1", zmq.SUB, "MISP", port=5555,
+            options=app._zeromq_socket_options)
+        self.addCleanup(socket.close)
+        return socket
+
+    def test_defaults(self):
+        socket = self._socket()
+        self.assertEqual(0, socket.getsockopt(zmq.LINGER))
+        self.assertEqual(100000, socket.getsockopt(zmq.RCVHWM))
+        self.assertEqual(1, socket.getsockopt(zmq.TCP_KEEPALIVE))
+        self.assertEqual(60, socket.getsockopt(zmq.TCP_KEEPALIVE_IDLE))
+        self.assertEqual(30000, socket.getsockopt(zmq.RECONNECT_IVL_MAX))
+
+    def test_settings(self):
+        socket = self._socket(receiveHighWaterMark="0",
+                              receiveBufferSize="1048576",
+                              tcpKeepalive="no",
+                              reconnectInterval="0.5",
+                              heartbeatInterval="5",
+                              heartbeatTimeout="15")
+        self.assertEqual(0, socket.getsockopt(zmq.RCVHWM))
+        self.assertEqual(1048576, socket.getsockopt(zmq.RCVBUF))
+        self.assertEqual(0, socket.getsockopt(zmq.TCP_KEEPALIVE))
+        self.assertEqual(500, socket.getsockopt(zmq.RECONNECT_IVL))
+        self.assertEqual(5000, socket.getsockopt(zmq.HEARTBEAT_IVL))
+        self.assertEqual(15000, socket.getsockopt(zmq.HEARTBEAT_TIMEOUT))
+
+    def test_negative_setting(self):
+        with self.assertRaises(ValueError):
+            self._socket(reconnectIntervalMax="-1")
+
+
+class _FakeSocket(object):
+    def __init__(self, messages, error=None):
+        self.messages = list(messages)
+        self.error = error
+        self.recv_calls = 0
+
+    def recv(self, flags=0, copy=True):
+        del flags, copy
+        self.recv_calls += 1
+        if self.messages:
+            return self.messages.pop(0)
+        raise self.error or zmq.Again()
+
+
+class _FakePoller(object):
+    """
+    Poller which reports the socket as readable on each of the first
+    `wakeups` polls, and then destroys the application.
+    """
+    def __init__(self, app, socket, wakeups):
+        self.app = app
+        self.socket = socket
+        self.wakeups = wakeups
+        self.polls = 0
+
+    def poll(self, timeout=None):
+        del timeout
+        self.polls += 1
+        if self.polls > self.wakeups:
+            self.app._MispService__destroyed = True
+            return []
+        return [(self.socket, zmq.POLLIN)]
+
+
+class ZeroMqReceiveTest(unittest.TestCase):
+    def setUp(self):
+        config_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, config_dir)
+        self.app = MispService(config_dir)
+        self.queued = []
+        self.app._queue_zeromq_misp_message = self.queued.append
+
+    def _receive(self, socket, wakeups, burst_limit=10):
+        self.app._zeromq_receive_burst_limit = burst_limit
+        self.app._zeromq_misp_sub_socket = socket
+        poller = _FakePoller(self.app, socket, wakeups)
+        self.app._zeromq_poller = poller
+        try:
+            self.app._process_zeromq_misp_messages()
+        finally:
+            self.app._zeromq_misp_sub_socket = None
+            self.app._zeromq_poller = None
+        return poller
+
+    def test_pending_messages_drained_on_one_wakeup(self):
+        socket = _FakeSocket([b"a", b"b", b"c"])
+        poller = self._receive(socket, 1)
+        self.assertEqual([b"a", b"b", b"c"], self.queued)
+        # Draining stops when no more messages are pending.
+        self.assertEqual(4, socket.recv_calls)
+        self.assertEqual(2, poller.polls)
+
+    def test_burst_limit(self):
+        socket = _FakeSocket([b"a", b"b", b"c"])
+        self._receive(socket, 1, burst_limit=2)
+        self.assertEqual([b"a", b"b"], self.queued)
+        self.assertEqual(2, socket.recv_calls)
+
+    def test_draining_stops_on_socket_error(self):
+        socket = _FakeSocket([b"a"], zmq.ZMQError(zmq.ENOTSOCK))
+        self._receive(socket, 1)
+        self.assertEqual([b"a"], self.queued)
+        self.assertEqual(2, socket.recv_calls)